@@ -1,20 +1,47 @@
 # === Imports ===
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 import requests
 import os
 import logging
 import json
-from oauth2client.service_account import ServiceAccountCredentials
-from gspread import authorize, Worksheet
 import datetime
+import atexit
+import functools
+import hmac
+import sqlite3
+import threading
+import time
+from event_queue import EventQueue
+from dedup import DedupIndex, event_key
+from sheets_sink import SheetsSink, GspreadBackend
+import dialogue
+from sessions import Session, create_session_store
+from http_client import HttpClient
+from cache import RefreshingCache
+from inventory_cache import InventoryCache
+from catalog import ProductCatalog
+from leads_store import LeadStore, FILTERS as LEAD_FILTERS
+from outbound import OutboundDispatcher, PrebuiltMessage, JSON_HEADERS, json_body, message_body
+from startup import Startup, Disabled
+from shutdown import AdmissionGate, Shutdown
+from tenants import Tenant, RouteCache, load_tenants
+import metrics
+import tracing
+from logging_setup import configure_logging
 
 # === App Initialization ===
 app = Flask(__name__)
+metrics.instrument_flask(app, "bot")
 
 # === Logging Setup ===
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
+# === Metrics ===
+WEBHOOK_SECONDS = metrics.histogram("bot_webhook_seconds", "Time to handle a webhook delivery.", ("mode",))
+DISPATCH_SECONDS = metrics.histogram("bot_dispatch_seconds", "Time to handle one message, by session state and route.",
+                                     ("state", "route"))
+
 # === Configuration ===
 # Credentials (Use environment variables or local defaults for testing)
 FB_PAGE_TOKEN = os.environ.get("FB_PAGE_TOKEN", "")
@@ -34,16 +61,104 @@ RETURN_POLICY_DAYS = os.environ.get("RETURN_POLICY_DAYS", "30")
 PROMO_CODE = os.environ.get("PROMO_CODE", "CHAT20")
 PRODUCT_CATALOG_LINK = os.environ.get("PRODUCT_CATALOG_LINK", "https://automatedbusiness.com/products")
 
-# User Data Storage (In-memory; use a DB in production)
-user_data = {}
+# Conversation Sessions (SESSION_BACKEND=memory|sqlite|redis, idle expiry after SESSION_TTL seconds)
+sessions = create_session_store()
+
+# Extra Facebook Pages served by this process (JSON registry, see tenants.py); unset serves FB_PAGE_ID only
+TENANTS_FILE = os.environ.get("TENANTS_FILE", "")
 
 # Service URLs (Update for deployment)
 INVENTORY_URL = os.environ.get("INVENTORY_URL", "http://localhost:10001")
 SCHEDULING_URL = os.environ.get("SCHEDULING_URL", "http://localhost:10002")
+GRAPH_API_URL = os.environ.get("GRAPH_API_URL", "https://graph.facebook.com/v20.0")
+WECHAT_API_URL = os.environ.get("WECHAT_API_URL", "https://api.wechat.com/cgi-bin")
+
+# Scheduling offers the first SCHEDULE_OFFER_DATES dates with a free slot among the next SCHEDULE_OFFER_DAYS days
+SCHEDULE_OFFER_DAYS = int(os.environ.get("SCHEDULE_OFFER_DAYS", 30))
+SCHEDULE_OFFER_DATES = int(os.environ.get("SCHEDULE_OFFER_DATES", 6))
+
+# Outbound HTTP (shared keep-alive pools; timeouts in seconds, breaker opens after N straight failures)
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 3.05))
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 10))
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", 2))
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 20))
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_TIMEOUT = float(os.environ.get("CIRCUIT_RESET_TIMEOUT", 30))
+
+http = HttpClient(connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT, retries=HTTP_RETRIES,
+                  pool_size=HTTP_POOL_SIZE, failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+                  reset_timeout=CIRCUIT_RESET_TIMEOUT)
+
+# Cached credentials/metadata (page info lifetime in seconds; refresh once this fraction of a lifetime remains)
+PAGE_INFO_TTL = int(os.environ.get("PAGE_INFO_TTL", 3600))
+CACHE_REFRESH_AHEAD = float(os.environ.get("CACHE_REFRESH_AHEAD", 0.1))
+
+# Inventory lookups are cached for INVENTORY_CACHE_TTL seconds and refreshed by the inventory change feed
+INVENTORY_CACHE_TTL = float(os.environ.get("INVENTORY_CACHE_TTL", 30))
+INVENTORY_WATCH = os.environ.get("INVENTORY_WATCH", "true").lower() == "true"
+# Product names, slugs and aliases -> ids, loaded from the same feed (extra aliases: PRODUCT_ALIASES='{"alias": "id"}')
+catalog = ProductCatalog(aliases=json.loads(os.environ.get("PRODUCT_ALIASES", "{}")))
+# The change feed long-polls through a client of its own (no retries: the watcher backs off by itself)
+inventory_feed_http = HttpClient(connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT, retries=0,
+                                 pool_size=1, failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+                                 reset_timeout=CIRCUIT_RESET_TIMEOUT, name="inventory_feed")
+inventory_cache = InventoryCache(http, INVENTORY_URL, ttl=INVENTORY_CACHE_TTL, watch=INVENTORY_WATCH, catalog=catalog,
+                                 feed_http=inventory_feed_http)
+inventory_cache.start()
+
+# Outbound Replies ("direct" posts each reply as it is produced, "batch" queues them for a dispatcher
+# that sends up to OUTBOUND_BATCH_SIZE per Graph batch request, at most OUTBOUND_RATE calls/second per page)
+OUTBOUND_MODE = os.environ.get("OUTBOUND_MODE", "direct")
+OUTBOUND_BATCH_SIZE = int(os.environ.get("OUTBOUND_BATCH_SIZE", 50))
+OUTBOUND_WORKERS = int(os.environ.get("OUTBOUND_WORKERS", 2))
+OUTBOUND_RATE = float(os.environ.get("OUTBOUND_RATE", 250))
+outbound = OutboundDispatcher(http, GRAPH_API_URL, PAGE_ID, FB_PAGE_TOKEN, max_batch=OUTBOUND_BATCH_SIZE,
+                              workers=OUTBOUND_WORKERS, rate=OUTBOUND_RATE) if OUTBOUND_MODE == "batch" else None
+
+# Webhook Ingest ("inline" processes events before acknowledging, "queue" acknowledges first
+# and hands events to a background worker pool)
+WEBHOOK_MODE = os.environ.get("WEBHOOK_MODE", "inline")
+WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", 4))
+WEBHOOK_QUEUE_SIZE = int(os.environ.get("WEBHOOK_QUEUE_SIZE", 10000))
+
+# Admission control: at most WEBHOOK_MAX_IN_FLIGHT deliveries are handled at once; more get a fast 503
+# (Meta redelivers them later) instead of piling up threads blocked on Graph or Sheets. 0 means no limit
+WEBHOOK_MAX_IN_FLIGHT = int(os.environ.get("WEBHOOK_MAX_IN_FLIGHT", 64))
+admission = AdmissionGate(WEBHOOK_MAX_IN_FLIGHT)
+
+# Seconds a graceful shutdown (SIGTERM) may spend draining events, replies, sheet rows and sessions
+SHUTDOWN_TIMEOUT = float(os.environ.get("SHUTDOWN_TIMEOUT", 10))
+
+# Redelivered events are dropped by message id for DEDUP_WINDOW seconds (at most DEDUP_MAX_KEYS remembered)
+DEDUP_WINDOW = int(os.environ.get("DEDUP_WINDOW", 86400))
+DEDUP_MAX_KEYS = int(os.environ.get("DEDUP_MAX_KEYS", 100000))
+dedup = DedupIndex(window=DEDUP_WINDOW, max_keys=DEDUP_MAX_KEYS)
 
 # Google Sheets Configuration
 SPREADSHEET_ID = os.environ.get("GOOGLE_SPREADSHEET_ID", "1PPK-cYGb75IH9uKaUf4IACtpAnINwK-n_TAxj86BRlY")
 SHEET_NAME = "Lead and Issue Tracker"
+SHEETS_BATCH_SIZE = int(os.environ.get("SHEETS_BATCH_SIZE", 50))
+SHEETS_FLUSH_INTERVAL = float(os.environ.get("SHEETS_FLUSH_INTERVAL", 5))
+SHEETS_SPOOL_PATH = os.environ.get("SHEETS_SPOOL_PATH", "sheets_spool.jsonl")
+SHEETS_MAX_HELD = int(os.environ.get("SHEETS_MAX_HELD", 1000))
+
+# Every sheet row is also kept in a local SQLite file, queried and exported through /leads
+LEADS_DB_PATH = os.environ.get("LEADS_DB_PATH", "leads.db")
+LEADS_MAX_PAGE_SIZE = 500
+lead_store = LeadStore(LEADS_DB_PATH)
+
+# Bearer token for the admin endpoints (/leads, /traces); unset disables them
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+# Tracing: each delivery is a trace (id sent downstream as X-Trace-Id); traces of TRACE_SLOW_MS or more
+# are kept, the last TRACE_BUFFER of them, for GET /traces
+TRACING = os.environ.get("TRACING", "true").lower() == "true"
+TRACE_SLOW_MS = float(os.environ.get("TRACE_SLOW_MS", 500))
+TRACE_BUFFER = int(os.environ.get("TRACE_BUFFER", 200))
+tracing.configure(enabled=TRACING, slow_ms=TRACE_SLOW_MS, capacity=TRACE_BUFFER)
+
+# Seconds before a failed background startup step (Sheets, token check) is retried; doubles each time
+STARTUP_RETRY_INTERVAL = float(os.environ.get("STARTUP_RETRY_INTERVAL", 5))
 
 # Required Facebook Permissions (for reference only)
 REQUIRED_PERMISSIONS = [
@@ -62,15 +177,19 @@ def authenticate_google_sheets():
         credentials_dict = json.loads(google_credentials_json)
     except json.JSONDecodeError as e:
         raise ValueError(f"Invalid JSON in GOOGLE_CREDENTIALS: {str(e)}")
+    # Imported here, on the startup thread: the Google client libraries take a few hundred ms to load
+    from oauth2client.service_account import ServiceAccountCredentials
     scope = ['https://www.googleapis.com/auth/spreadsheets']
     creds = ServiceAccountCredentials.from_json_keyfile_dict(credentials_dict, scope)
     logger.info("Successfully authenticated with Google Sheets")
     return creds
 
-# Initialize Google Sheets client
-try:
-    gc = authorize(authenticate_google_sheets())
-    sh = gc.open_by_key(SPREADSHEET_ID)
+def open_worksheet(creds, spreadsheet_id=SPREADSHEET_ID):
+    from gspread import authorize
+    gc = authorize(creds)
+    # A hung Sheets call would otherwise hold the flush thread (and a shutdown waiting on it) indefinitely
+    gc.set_timeout((HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    sh = gc.open_by_key(spreadsheet_id)
     try:
         worksheet = sh.worksheet(SHEET_NAME)
     except Exception as e:
@@ -78,10 +197,46 @@ try:
         worksheet = sh.add_worksheet(title=SHEET_NAME, rows="100", cols="20")
         worksheet.append_row(["Sender ID", "Category", "User Name", "Order Number", "Urgency", "Website",
                               "Issue Description", "Email", "Phone", "Company", "Timestamp"])
-except Exception as e:
-    logger.error("Failed to initialize Google Sheets: %s", str(e))
-    gc = None
-    worksheet = None
+    return worksheet
+
+# Rows are written behind the conversation in batches; see sheets_sink.py. Until the
+# worksheet is open they are held in memory (up to SHEETS_MAX_HELD, the rest spooled)
+sheet_sink = SheetsSink(None, max_batch=SHEETS_BATCH_SIZE, max_delay=SHEETS_FLUSH_INTERVAL,
+                        spool_path=SHEETS_SPOOL_PATH, waiting=True, max_held=SHEETS_MAX_HELD)
+
+def init_google_sheets(sink=sheet_sink, spreadsheet_id=SPREADSHEET_ID):
+    try:
+        creds = authenticate_google_sheets()
+    except ValueError as e:
+        sink.stop_waiting()
+        raise Disabled(str(e))
+    sink.set_backend(GspreadBackend(open_worksheet(creds, spreadsheet_id)))
+
+# Tenants with a spreadsheet of their own get a sink for it on their first row; its worksheet is
+# opened in the background like the default one (progress under "tenant_sheets" in /stats)
+_tenant_sinks = {}  # spreadsheet id -> SheetsSink
+_tenant_sinks_lock = threading.Lock()
+
+def sheet_sink_for(tenant):
+    if tenant is None or tenant.spreadsheet_id == SPREADSHEET_ID:
+        return sheet_sink
+    sink = _tenant_sinks.get(tenant.spreadsheet_id)
+    if sink is None:
+        with _tenant_sinks_lock:
+            sink = _tenant_sinks.get(tenant.spreadsheet_id)
+            if sink is None:
+                root, ext = os.path.splitext(SHEETS_SPOOL_PATH)
+                sink = SheetsSink(None, max_batch=SHEETS_BATCH_SIZE, max_delay=SHEETS_FLUSH_INTERVAL,
+                                  spool_path=f"{root}-{tenant.spreadsheet_id}{ext}", waiting=True,
+                                  max_held=SHEETS_MAX_HELD)
+                _tenant_sinks[tenant.spreadsheet_id] = sink
+                tenant_sheets.add(tenant.spreadsheet_id,
+                                  functools.partial(init_google_sheets, sink, tenant.spreadsheet_id))
+    return sink
+
+def all_sheet_sinks():
+    with _tenant_sinks_lock:
+        return [sheet_sink] + list(_tenant_sinks.values())
 
 # === Permission Verification Function ===
 def verify_page_token():
@@ -92,21 +247,42 @@ def verify_page_token():
     if not PAGE_ID:
         logger.error("No PAGE_ID provided.")
         return False
-    # Test the token by fetching basic page info
-    url = f"https://graph.facebook.com/v20.0/{PAGE_ID}?fields=id,name&access_token={FB_PAGE_TOKEN}"
+    # Test the token by fetching basic page info (cached, so this also warms the 'page_info' reply)
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            page_data = response.json()
-            logger.info(f"Page Access Token validated for Page: {page_data.get('name')} (ID: {page_data.get('id')})")
-            return True
-        else:
-            logger.error(f"Failed to validate Page Access Token: {response.text}")
-            return False
+        page_data = get_page_info()
+        logger.info("Page Access Token validated for Page: %s (ID: %s)", page_data.get('name'), page_data.get('id'))
+        return True
+    except PageTokenError as e:
+        logger.error("Failed to validate Page Access Token: %s", str(e))
+        return False
     except requests.exceptions.RequestException as e:
-        logger.error(f"Error validating Page Access Token: {str(e)}")
+        logger.error("Error validating Page Access Token: %s", str(e))
         return False
 
+def check_page_token():
+    if not FB_PAGE_TOKEN or not PAGE_ID:
+        raise Disabled("FB_PAGE_TOKEN or FB_PAGE_ID not set")
+    if not verify_page_token():
+        raise PageTokenError("Page Access Token validation failed")
+
+# === Credential and Metadata Cache ===
+class PageTokenError(Exception):
+    """The Graph API rejected the Page Access Token or lacks permission for the page."""
+
+credential_cache = RefreshingCache(refresh_ahead=CACHE_REFRESH_AHEAD)
+
+def get_page_info(tenant=None):
+    """Page id/name/about, fetched once per PAGE_INFO_TTL seconds."""
+    tenant = tenant or default_tenant
+    return credential_cache.get(f"page_info:{tenant.page_id}", functools.partial(_fetch_page_info, tenant))
+
+def _fetch_page_info(tenant):
+    url = f"{GRAPH_API_URL}/{tenant.page_id}?fields=id,name,about&access_token={tenant.page_token}"
+    response = http.get(url)
+    if response.status_code != 200:
+        raise PageTokenError(response.text)
+    return response.json(), PAGE_INFO_TTL
+
 # === Webhook Endpoints ===
 @app.route('/webhook', methods=['GET', 'POST'])
 def fb_webhook():
@@ -118,396 +294,527 @@ def fb_webhook():
         return "Verification failed", 403
 
     elif request.method == 'POST':
-        data = request.json
-        logger.info("Received Meta Webhook Data: %s", data)
-        if 'entry' in data:
-            for entry in data['entry']:
-                if 'messaging' in entry:
-                    for messaging_event in entry['messaging']:
-                        sender_id = messaging_event['sender']['id']
-                        if 'message' in messaging_event:
-                            if 'quick_reply' in messaging_event['message']:
-                                payload = messaging_event['message']['quick_reply'].get('payload', '').lower().strip()
-                                logger.info("Processing quick reply payload: %s for sender_id: %s", payload, sender_id)
-                                process_message(sender_id, payload, platform="meta")
-                            else:
-                                message_text = messaging_event['message'].get('text', '').lower().strip()
-                                logger.info("Processing message text: %s for sender_id: %s", message_text, sender_id)
-                                process_message(sender_id, message_text, platform="meta")
-                        elif 'postback' in messaging_event:
-                            payload = messaging_event['postback'].get('payload', '').lower().strip()
-                            logger.info("Processing postback payload: %s for sender_id: %s", payload, sender_id)
-                            process_message(sender_id, payload, platform="meta")
-        return "EVENT_RECEIVED", 200
+        if not admission.try_enter():
+            # Meta redelivers on non-2xx; answering now keeps a spike from tying up more threads
+            return ("SHUTTING_DOWN" if admission.closed else "OVERLOADED"), 503
+        try:
+            trace_id = request.headers.get(tracing.TRACE_HEADER)
+            with WEBHOOK_SECONDS.time(WEBHOOK_MODE), tracing.trace("webhook", trace_id, mode=WEBHOOK_MODE):
+                return handle_webhook_delivery(request.json)
+        finally:
+            admission.leave()
+
+def handle_webhook_delivery(data):
+    logger.debug("Received webhook delivery with %d entries", len(data.get("entry", [])) if data else 0)
+    for key, page_id, sender_id, message in iter_messaging_events(data):
+        tenant = tenants.get(page_id)
+        if tenant is None:
+            logger.warning("Dropping event for unknown page %s", page_id)
+            continue
+        if key is not None and dedup.seen(key):
+            logger.info("Dropping redelivered event %s for sender_id: %s", key, sender_id)
+            continue
+        if event_queue is None:
+            try:
+                process_message(sender_id, message, platform="meta", tenant=tenant)
+            except Exception:
+                # The 500 makes Meta redeliver; let that copy through
+                dedup.forget(key)
+                raise
+        elif not event_queue.submit(sender_id, message, platform="meta", tenant=tenant,
+                                    trace_id=tracing.current_id()):
+            # Meta redelivers on non-2xx, so a full queue defers the batch instead of losing it
+            dedup.forget(key)
+            logger.warning("Webhook queue full, rejecting delivery for sender_id: %s", sender_id)
+            return "QUEUE_FULL", 503
+    return "EVENT_RECEIVED", 200
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify({"status": "ok"}), 200
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    ready = startup.ready() and not shutdown.draining
+    return jsonify({"ready": ready, "components": startup.stats()}), 200 if ready else 503
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify({
+        "webhook_mode": WEBHOOK_MODE,
+        "startup": startup.stats(),
+        "admission": admission.stats(),
+        "queue": event_queue.stats() if event_queue is not None else None,
+        "dedup": dedup.stats(),
+        "outbound": outbound.stats() if outbound is not None else None,
+        "sheets": sheet_sink.stats(),
+        "tenant_sheets": tenant_sheets.stats(),
+        "tenants": dict(tenants.stats(), route_tables=len(route_cache)),
+        "sessions": sessions.stats(),
+        "http": http.stats(),
+        "cache": credential_cache.stats(),
+        "inventory_cache": inventory_cache.stats(),
+        "catalog": catalog.stats(),
+        "leads": lead_store.stats(),
+        "tracing": tracing.stats()
+    }), 200
+
+def iter_messaging_events(data):
+    """Yield (dedup key, page id, sender_id, normalized text or payload) for every messaging event in a webhook body."""
+    if not data or 'entry' not in data:
+        return
+    for entry in data['entry']:
+        page_id = str(entry.get('id', ''))
+        if 'messaging' in entry:
+            for messaging_event in entry['messaging']:
+                sender_id = messaging_event['sender']['id']
+                key = event_key(messaging_event)
+                if 'message' in messaging_event:
+                    if 'quick_reply' in messaging_event['message']:
+                        payload = messaging_event['message']['quick_reply'].get('payload', '').lower().strip()
+                        logger.debug("Processing quick reply payload: %s for sender_id: %s", payload, sender_id)
+                        yield key, page_id, sender_id, payload
+                    else:
+                        message_text = messaging_event['message'].get('text', '').lower().strip()
+                        logger.debug("Processing message text: %s for sender_id: %s", message_text, sender_id)
+                        yield key, page_id, sender_id, message_text
+                elif 'postback' in messaging_event:
+                    payload = messaging_event['postback'].get('payload', '').lower().strip()
+                    logger.debug("Processing postback payload: %s for sender_id: %s", payload, sender_id)
+                    yield key, page_id, sender_id, payload
+
+# === Admin Endpoints ===
+def admin_denied():
+    """Error response unless the request carries "Authorization: Bearer <ADMIN_TOKEN>"; None when it does."""
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Admin endpoints are disabled (ADMIN_TOKEN not set)"}), 403
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {ADMIN_TOKEN}"):
+        return jsonify({"error": "Unauthorized"}), 401
+    return None
+
+def page_limit(value, default, maximum):
+    """Page size from a query parameter; raises ValueError unless it is an integer from 1 to `maximum`."""
+    limit = int(value) if value else default
+    if not 1 <= limit <= maximum:
+        raise ValueError(f"limit must be between 1 and {maximum}")
+    return limit
+
+def lead_filters(args):
+    return {name: args[name] for name in LEAD_FILTERS + ("from", "to") if args.get(name)}
+
+# Filterable, paginated listing (?category=&urgency=&page_id=&sender_id=&from=&to=&limit=N&after=<last id>)
+@app.route('/leads', methods=['GET'])
+def list_leads():
+    denied = admin_denied()
+    if denied:
+        return denied
+    try:
+        limit = page_limit(request.args.get("limit"), 50, LEADS_MAX_PAGE_SIZE)
+        after = int(request.args["after"]) if request.args.get("after") else None
+        leads = lead_store.query(lead_filters(request.args), after=after, limit=limit)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameter: {e}"}), 400
+    return jsonify({"leads": leads, "next": leads[-1]["id"] if len(leads) == limit else None}), 200
+
+# Streaming export of every matching row (same filters, ?format=ndjson|csv), read in chunks as it is sent
+@app.route('/leads/export', methods=['GET'])
+def export_leads():
+    denied = admin_denied()
+    if denied:
+        return denied
+    fmt = request.args.get("format", "ndjson")
+    try:
+        chunks = lead_store.export(lead_filters(request.args), fmt=fmt)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameter: {e}"}), 400
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename=leads.{fmt}"})
+
+# Recent slow traces, newest first (?limit=N&min_ms=&trace_id=)
+@app.route('/traces', methods=['GET'])
+def list_traces():
+    denied = admin_denied()
+    if denied:
+        return denied
+    try:
+        limit = page_limit(request.args.get("limit"), 50, TRACE_BUFFER)
+        min_ms = float(request.args.get("min_ms", 0))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameter: {e}"}), 400
+    return jsonify({"traces": tracing.slow_traces(limit, min_ms, request.args.get("trace_id")),
+                    "stats": tracing.stats()}), 200
 
 # === Message Processing ===
-def process_message(sender_id, message, platform="meta"):
+def process_message(sender_id, message, platform="meta", tenant=None):
+    tenant = tenant or default_tenant
     # Reset state for certain commands
-    if message in ['start', 'get_started', 'welcome_message', 'back to main menu']:
-        if sender_id in user_data:
-            del user_data[sender_id]
-
-    # Main Menu and Non-Stateful Responses
-    if message in ['hi', 'hello', 'start', 'get_started', 'welcome_message']:
-        send_message(sender_id, f"Hey there! Welcome to {BUSINESS_NAME}! How can I help?",
-                     quick_replies=[{"title": "Services", "payload": "services"},
-                                    {"title": "FAQs", "payload": "faq"},
-                                    {"title": "Support", "payload": "support"},
-                                    {"title": "Sales", "payload": "sales"},
-                                    {"title": "Contact Us", "payload": "contact"},
-                                    {"title": "Page Info", "payload": "page_info"}],
-                     platform=platform)
-    elif message in ['services', 'service']:
-        send_message(sender_id, f"We offer automated chatbots for businesses! How can we assist you?",
-                     quick_replies=[{"title": "Learn More", "payload": "learn_more"},
-                                    {"title": "Back to Main Menu", "payload": "start"}],
-                     platform=platform)
-    elif message in ['learn_more', 'learn more']:
-        send_message(sender_id,
-                     f"Learn more about our services: We provide 24/7 customer support, inventory management, and scheduling solutions for businesses like {BUSINESS_NAME}. Visit {PRODUCT_CATALOG_LINK} for details or contact us at {SUPPORT_EMAIL}!",
-                     quick_replies=[{"title": "Back to Main Menu", "payload": "start"}],
-                     platform=platform)
-    elif message in ['faq', 'faqs']:
-        send_message(sender_id,
-                     f"Here are some FAQs:\n1. What services do you offer?\n2. How much does it cost?\n3. Shipping info?",
-                     quick_replies=[{"title": "Services", "payload": "services_info"},
-                                    {"title": "Cost", "payload": "cost"},
-                                    {"title": "Shipping", "payload": "shipping"},
-                                    {"title": "Back to Main Menu", "payload": "start"}],
-                     platform=platform)
-    elif message in ['services_info', 'services', 'what services do you offer']:
+    if message in dialogue.RESET_KEYWORDS:
+        tenant.sessions.delete(sender_id)
+        session = None
+    else:
+        with tracing.span("session.get"):
+            session = tenant.sessions.get(sender_id)
+    state = session.state if session else None
+    message, kind, target = route_cache.get(tenant).route(message, state)
+    with DISPATCH_SECONDS.time(state or "none", kind), tracing.span("dispatch", state=state, route=kind):
+        ROUTE_EXECUTORS[kind](sender_id, message, session, target, platform, tenant)
+
+def process_queued(sender_id, message, platform="meta", tenant=None, trace_id=None):
+    """process_message on a queue worker, traced under the id of the delivery that queued it."""
+    with tracing.trace("event", trace_id, mode="queue"):
+        process_message(sender_id, message, platform=platform, tenant=tenant)
+
+def send_reply(sender_id, message, session, reply, platform, tenant):
+    send_message(sender_id, reply.text, quick_replies=reply.quick_replies, platform=platform, tenant=tenant,
+                 prebuilt=reply.prebuilt)
+
+def start_form(sender_id, message, session, step, platform, tenant):
+    send_message(sender_id, step.reply.text, quick_replies=step.reply.quick_replies, platform=platform,
+                 tenant=tenant, prebuilt=step.reply.prebuilt)
+    tenant.sessions.save(sender_id, Session(step.next_state, category=step.category))
+
+def advance_form(sender_id, message, session, step, platform, tenant):
+    session.data[step.field] = message
+    if step.next_state:
+        send_message(sender_id, step.reply.text, quick_replies=step.reply.quick_replies, platform=platform,
+                     tenant=tenant, prebuilt=step.reply.prebuilt)
+        session.state = step.next_state
+        tenant.sessions.save(sender_id, session)
+    else:
+        write_to_google_sheet(sender_id, step.category, session.data, tenant=tenant)
+        send_message(sender_id, step.done.text, quick_replies=step.done.quick_replies, platform=platform,
+                     tenant=tenant, prebuilt=step.done.prebuilt)
+        tenant.sessions.delete(sender_id)
+
+def run_handler(sender_id, message, session, handler, platform, tenant):
+    handler(sender_id, message, session, platform, tenant)
+
+# === Dynamic Handlers ===
+def product_choices():
+    """Inventory menu quick replies: the live catalog, or the default products until it has loaded."""
+    products = catalog.quick_replies(dialogue.MAX_QUICK_REPLIES - len(dialogue.BACK_TO_MAIN))
+    return (products or dialogue.DEFAULT_PRODUCT_CHOICES) + dialogue.BACK_TO_MAIN
+
+def resolve_product(message):
+    """Product id for a check_<...> payload or a typed name, slug or alias; None if unknown."""
+    product_id = catalog.resolve(message)
+    if product_id is None and not len(catalog):
+        # Catalog not loaded yet (feed off or still connecting): load it now
+        try:
+            inventory_cache.poll_changes()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error("Product catalog load failed: %s", str(e))
+        product_id = catalog.resolve(message)
+    return product_id
+
+def handle_inventory_menu(sender_id, message, session, platform, tenant):
+    send_message(sender_id, dialogue.INVENTORY_PROMPT, quick_replies=product_choices(),
+                 platform=platform, tenant=tenant)
+    tenant.sessions.save(sender_id, Session("waiting_product"))
+
+def handle_inventory_check(sender_id, message, session, platform, tenant):
+    if session is not None:
+        tenant.sessions.delete(sender_id)
+    product_id = resolve_product(message)
+    if product_id is None:
+        send_message(sender_id, dialogue.INVENTORY_UNKNOWN, quick_replies=product_choices(),
+                     platform=platform, tenant=tenant)
+        return
+    try:
+        data = inventory_cache.get(product_id)
+    except requests.exceptions.RequestException as e:
+        logger.error("Inventory lookup failed: %s", str(e))
+        data = None
+    if data is not None:
+        availability = "in stock" if data["available"] else "out of stock"
         send_message(sender_id,
-                     f"We offer automated chatbots for businesses, providing 24/7 customer support, inventory management, and scheduling solutions.",
-                     quick_replies=[{"title": "Back to FAQs", "payload": "faq"},
-                                    {"title": "Back to Main Menu", "payload": "start"}],
-                     platform=platform)
-    elif message in ['cost', 'how much does it cost']:
-        send_message(sender_id, f"Our chatbot setup starts at {BASE_PRICE}. Subscription plans available.",
-                     quick_replies=[{"title": "Back to FAQs", "payload": "faq"},
-                                    {"title": "Back to Main Menu", "payload": "start"}],
-                     platform=platform)
-    elif message in ['shipping', 'ship', 'shipping info']:
-        send_message(sender_id, f"Shipping takes {SHIPPING_DAYS} days. Free over {FREE_SHIPPING_THRESHOLD}!",
-                     quick_replies=[{"title": "Back to FAQs", "payload": "faq"},
-                                    {"title": "Back to Main Menu", "payload": "start"}],
-                     platform=platform)
-    elif message in ['support', 'help']:
-        send_message(sender_id, "Let’s solve your issue! What’s the problem?",
-                     quick_replies=[{"title": "Order Issue", "payload": "order_issue"},
-                                    {"title": "Technical Issue", "payload": "tech_issue"},
-                                    {"title": "Back to Main Menu", "payload": "start"}],
-                     platform=platform)
-    elif message in ['order_issue', 'order issue']:
-        send_message(sender_id, "Please provide your order number.", platform=platform)
-        user_data[sender_id] = {"state": "order_number", "category": "Order Issue", "data": {}}
-    elif message in ['tech_issue', 'technical_issue', 'technical issues']:
-        send_message(sender_id, "Please provide your name.", platform=platform)
-        user_data[sender_id] = {"state": "tech_name", "category": "Technical Issue", "data": {}}
-    elif message in ['contact', 'contact us']:
-        send_message(sender_id, f"Email: {SUPPORT_EMAIL}\nPhone: {SUPPORT_PHONE}",
-                     quick_replies=[{"title": "Back to Main Menu", "payload": "start"}],
-                     platform=platform)
-    elif message == 'sales':
-        send_message(sender_id, "Interested in our products? What can I help with?",
-                     quick_replies=[{"title": "Products", "payload": "products"},
-                                    {"title": "Offers", "payload": "offers"},
-                                    {"title": "Lead Capture", "payload": "lead"},
-                                    {"title": "Back to Main Menu", "payload": "start"}],
-                     platform=platform)
-    elif message == 'products':
-        send_message(sender_id, f"Check our products: {PRODUCT_CATALOG_LINK}",
-                     quick_replies=[{"title": "Back to Sales", "payload": "sales"},
-                                    {"title": "Back to Main Menu", "payload": "start"}],
-                     platform=platform)
-    elif message == 'offers':
-        send_message(sender_id, f"Get 20% off with code {PROMO_CODE}!",
-                     quick_replies=[{"title": "Back to Sales", "payload": "sales"},
-                                    {"title": "Back to Main Menu", "payload": "start"}],
-                     platform=platform)
-    elif message == 'lead':
-        send_message(sender_id, "Please provide your name.", platform=platform)
-        user_data[sender_id] = {"state": "lead_name", "category": "Lead Capture", "data": {}}
-    elif message == 'inventory':
-        send_message(sender_id, "Which product would you like to check? (e.g., chatbot_basic, chatbot_pro)",
-                     quick_replies=[{"title": "Basic Chatbot", "payload": "check_basic"},
-                                    {"title": "Pro Chatbot", "payload": "check_pro"},
-                                    {"title": "Enterprise Chatbot", "payload": "check_enterprise"},
-                                    {"title": "Back to Main Menu", "payload": "start"}],
-                     platform=platform)
-    elif message in ['check_basic', 'check_pro', 'check_enterprise']:
-        product_id = message.replace("check_", "")
-        response = requests.get(f"{INVENTORY_URL}/inventory/{product_id}")
-        if response.status_code == 200:
-            data = response.json()
-            availability = "in stock" if data["available"] else "out of stock"
-            send_message(sender_id,
-                         f"{data['product']}: {data['quantity']} available ({availability}), Price: {data['price']}",
-                         quick_replies=[{"title": "Back to Main Menu", "payload": "start"}],
-                         platform=platform)
+                     dialogue.INVENTORY_STATUS.format(product=data["product"], quantity=data["quantity"],
+                                                      availability=availability, price=data["price"]),
+                     quick_replies=dialogue.BACK_TO_MAIN,
+                     platform=platform, tenant=tenant)
+    else:
+        send_message(sender_id, dialogue.INVENTORY_ERROR,
+                     quick_replies=dialogue.BACK_TO_MAIN,
+                     platform=platform, tenant=tenant)
+
+def handle_schedule(sender_id, message, session, platform, tenant):
+    # One range lookup covers every date we offer, instead of the user guessing dates one at a time
+    try:
+        response = http.get(f"{SCHEDULING_URL}/scheduling/available",
+                            params={"from": datetime.date.today().isoformat(), "days": SCHEDULE_OFFER_DAYS})
+    except requests.exceptions.RequestException as e:
+        logger.error("Scheduling range lookup failed: %s", str(e))
+        response = None
+    if response is not None and response.status_code == 200:
+        choices = dialogue.date_choices(response.json()["available"], SCHEDULE_OFFER_DATES)
+        if len(choices) > len(dialogue.BACK_TO_MAIN):
+            send_message(sender_id, dialogue.SCHEDULE_PICK_DATE, quick_replies=choices,
+                         platform=platform, tenant=tenant)
         else:
-            send_message(sender_id, "Sorry, couldn’t check inventory. Try again later.",
-                         quick_replies=[{"title": "Back to Main Menu", "payload": "start"}],
-                         platform=platform)
-    elif message == 'schedule':
-        send_message(sender_id, "When would you like to schedule a consultation? Enter a date (YYYY-MM-DD).",
-                     quick_replies=[{"title": "Back to Main Menu", "payload": "start"}],
-                     platform=platform)
-        user_data[sender_id] = {"state": "waiting_schedule_date", "schedule_date": None}
-    elif message and sender_id in user_data and user_data[sender_id]["state"] == "waiting_schedule_date":
-        date = message
-        response = requests.get(f"{SCHEDULING_URL}/scheduling/available/{date}")
-        if response.status_code == 200:
-            slots = response.json()["available_slots"]
-            if slots:
-                send_message(sender_id, f"Available slots on {date}: {', '.join(slots)}. Pick a time (HH:MM).",
-                             quick_replies=[{"title": "Back to Main Menu", "payload": "start"}],
-                             platform=platform)
-                user_data[sender_id]["state"] = "waiting_schedule_time"
-                user_data[sender_id]["schedule_date"] = date
-            else:
-                send_message(sender_id, "No slots available on that date. Try another.",
-                             quick_replies=[{"title": "Back to Main Menu", "payload": "start"}],
-                             platform=platform)
-                del user_data[sender_id]
+            send_message(sender_id, dialogue.SCHEDULE_NO_DATES.format(days=SCHEDULE_OFFER_DAYS),
+                         quick_replies=dialogue.BACK_TO_MAIN,
+                         platform=platform, tenant=tenant)
+    else:
+        send_message(sender_id, dialogue.SCHEDULE_PROMPT,
+                     quick_replies=dialogue.BACK_TO_MAIN,
+                     platform=platform, tenant=tenant)
+    tenant.sessions.save(sender_id, Session("waiting_schedule_date"))
+
+def handle_schedule_date(sender_id, message, session, platform, tenant):
+    date = message
+    try:
+        response = http.get(f"{SCHEDULING_URL}/scheduling/available/{date}")
+    except requests.exceptions.RequestException as e:
+        logger.error("Scheduling availability lookup failed: %s", str(e))
+        response = None
+    if response is not None and response.status_code == 200:
+        slots = response.json()["available_slots"]
+        if slots:
+            send_message(sender_id, dialogue.SCHEDULE_SLOTS.format(date=date, slots=", ".join(slots)),
+                         quick_replies=dialogue.time_choices(slots),
+                         platform=platform, tenant=tenant)
+            session.state = "waiting_schedule_time"
+            session.schedule_date = date
+            tenant.sessions.save(sender_id, session)
         else:
-            send_message(sender_id, "Invalid date or error. Use YYYY-MM-DD.",
-                         quick_replies=[{"title": "Back to Main Menu", "payload": "start"}],
-                         platform=platform)
-            del user_data[sender_id]
-    elif message and sender_id in user_data and user_data[sender_id]["state"] == "waiting_schedule_time":
-        time = message
-        response = requests.post(f"{SCHEDULING_URL}/scheduling", json={
+            send_message(sender_id, dialogue.SCHEDULE_NO_SLOTS,
+                         quick_replies=dialogue.BACK_TO_MAIN,
+                         platform=platform, tenant=tenant)
+            tenant.sessions.delete(sender_id)
+    else:
+        send_message(sender_id, dialogue.SCHEDULE_BAD_DATE,
+                     quick_replies=dialogue.BACK_TO_MAIN,
+                     platform=platform, tenant=tenant)
+        tenant.sessions.delete(sender_id)
+
+def handle_schedule_time(sender_id, message, session, platform, tenant):
+    time = message
+    try:
+        response = http.post(f"{SCHEDULING_URL}/scheduling", json={
             "customer_id": sender_id,
-            "date": user_data[sender_id]["schedule_date"],
+            "date": session.schedule_date,
             "time": time,
             "service": "Chatbot Consultation"
         })
-        if response.status_code == 201:
-            data = response.json()
-            send_message(sender_id, f"Appointment booked for {data['details']['date']}. Anything else?",
-                         quick_replies=[{"title": "Back to Main Menu", "payload": "start"}],
-                         platform=platform)
-        else:
-            send_message(sender_id, "Couldn’t book. Slot unavailable or invalid time. Try again.",
-                         quick_replies=[{"title": "Back to Main Menu", "payload": "start"}],
-                         platform=platform)
-        del user_data[sender_id]
-
-    # Reverted 'page_info' branch (original version)
-    elif message == 'page_info':
-        if verify_page_token():
-            # Use the PAGE_ID directly since we have a Page Access Token
-            url = f"https://graph.facebook.com/v20.0/{PAGE_ID}?fields=name,about&access_token={FB_PAGE_TOKEN}"
-            try:
-                response = requests.get(url)
-                if response.status_code == 200:
-                    page_data = response.json()
-                    page_name = page_data.get("name", "Unknown Page")
-                    page_about = page_data.get("about", "No description available.")
-                    send_message(sender_id,
-                                 f"Page Info:\nName: {page_name}\nAbout: {page_about}",
-                                 quick_replies=[{"title": "Back to Main Menu", "payload": "start"}],
-                                 platform=platform)
-                else:
-                    logger.error(f"Failed to fetch page info: {response.text}")
-                    send_message(sender_id, "Couldn’t fetch page info. Try again later.",
-                                 quick_replies=[{"title": "Back to Main Menu", "payload": "start"}],
-                                 platform=platform)
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Error fetching page info: {str(e)}")
-                send_message(sender_id, "Error fetching page info.",
-                             quick_replies=[{"title": "Back to Main Menu", "payload": "start"}],
-                             platform=platform)
-        else:
-            send_message(sender_id, "Bot lacks necessary permissions or token is invalid to fetch page info.",
-                         quick_replies=[{"title": "Back to Main Menu", "payload": "start"}],
-                         platform=platform)
-
-    # Order Issue Flow: Order number, Name, Email, Phone, Urgency, Business Name, Website
-    elif sender_id in user_data and user_data[sender_id]["category"] == "Order Issue":
-        state = user_data[sender_id]["state"]
-        data = user_data[sender_id]["data"]
-        if state == "order_number":
-            data["order_number"] = message
-            send_message(sender_id, "Please provide your name.", platform=platform)
-            user_data[sender_id]["state"] = "order_name"
-        elif state == "order_name":
-            data["name"] = message
-            send_message(sender_id, "Please provide your email address.", platform=platform)
-            user_data[sender_id]["state"] = "order_email"
-        elif state == "order_email":
-            data["email"] = message
-            send_message(sender_id, "Please provide your phone number.", platform=platform)
-            user_data[sender_id]["state"] = "order_phone"
-        elif state == "order_phone":
-            data["phone"] = message
-            send_message(sender_id, "How urgent is this? (Urgent/Not Urgent)",
-                         quick_replies=[{"title": "Urgent", "payload": "urgent"},
-                                        {"title": "Not Urgent", "payload": "not_urgent"}],
-                         platform=platform)
-            user_data[sender_id]["state"] = "order_urgency"
-        elif state == "order_urgency":
-            data["urgency"] = message
-            send_message(sender_id, "Please provide your business name.", platform=platform)
-            user_data[sender_id]["state"] = "order_business"
-        elif state == "order_business":
-            data["business_name"] = message
-            send_message(sender_id, "Please provide your website (if applicable).", platform=platform)
-            user_data[sender_id]["state"] = "order_website"
-        elif state == "order_website":
-            data["website"] = message
-            write_to_google_sheet(sender_id, "Order Issue", data)
-            send_message(sender_id, "Thank you! A team member will follow up soon regarding your order issue.",
-                         quick_replies=[{"title": "Back to Main Menu", "payload": "start"}],
-                         platform=platform)
-            del user_data[sender_id]
-
-    # Technical Issue Flow: Name, Email, Phone, Urgency, Business Name, Website, Describe Technical Issue
-    elif sender_id in user_data and user_data[sender_id]["category"] == "Technical Issue":
-        state = user_data[sender_id]["state"]
-        data = user_data[sender_id]["data"]
-        if state == "tech_name":
-            data["name"] = message
-            send_message(sender_id, "Please provide your email address.", platform=platform)
-            user_data[sender_id]["state"] = "tech_email"
-        elif state == "tech_email":
-            data["email"] = message
-            send_message(sender_id, "Please provide your phone number.", platform=platform)
-            user_data[sender_id]["state"] = "tech_phone"
-        elif state == "tech_phone":
-            data["phone"] = message
-            send_message(sender_id, "How urgent is this? (Urgent/Not Urgent)",
-                         quick_replies=[{"title": "Urgent", "payload": "urgent"},
-                                        {"title": "Not Urgent", "payload": "not_urgent"}],
-                         platform=platform)
-            user_data[sender_id]["state"] = "tech_urgency"
-        elif state == "tech_urgency":
-            data["urgency"] = message
-            send_message(sender_id, "Please provide your business name.", platform=platform)
-            user_data[sender_id]["state"] = "tech_business"
-        elif state == "tech_business":
-            data["business_name"] = message
-            send_message(sender_id, "Please provide your website (if applicable).", platform=platform)
-            user_data[sender_id]["state"] = "tech_website"
-        elif state == "tech_website":
-            data["website"] = message
-            send_message(sender_id, "Please describe your technical issue.", platform=platform)
-            user_data[sender_id]["state"] = "tech_description"
-        elif state == "tech_description":
-            data["issue_description"] = message
-            write_to_google_sheet(sender_id, "Technical Issue", data)
-            send_message(sender_id, "Thank you! A team member will follow up soon regarding your technical issue.",
-                         quick_replies=[{"title": "Back to Main Menu", "payload": "start"}],
-                         platform=platform)
-            del user_data[sender_id]
-
-    # Lead Capture Flow: Name, Email, Phone, Business Name, Website
-    elif sender_id in user_data and user_data[sender_id]["category"] == "Lead Capture":
-        state = user_data[sender_id]["state"]
-        data = user_data[sender_id]["data"]
-        if state == "lead_name":
-            data["name"] = message
-            send_message(sender_id, "Please provide your email address.", platform=platform)
-            user_data[sender_id]["state"] = "lead_email"
-        elif state == "lead_email":
-            data["email"] = message
-            send_message(sender_id, "Please provide your phone number.", platform=platform)
-            user_data[sender_id]["state"] = "lead_phone"
-        elif state == "lead_phone":
-            data["phone"] = message
-            send_message(sender_id, "Please provide your business name.", platform=platform)
-            user_data[sender_id]["state"] = "lead_business"
-        elif state == "lead_business":
-            data["business_name"] = message
-            send_message(sender_id, "Please provide your website (if applicable).", platform=platform)
-            user_data[sender_id]["state"] = "lead_website"
-        elif state == "lead_website":
-            data["website"] = message
-            write_to_google_sheet(sender_id, "Lead Capture", data)
-            send_message(sender_id, "Thank you! We’ll reach out soon with more information.",
-                         quick_replies=[{"title": "Back to Main Menu", "payload": "start"}],
-                         platform=platform)
-            del user_data[sender_id]
-
-    # Fallback
+    except requests.exceptions.RequestException as e:
+        logger.error("Scheduling booking failed: %s", str(e))
+        response = None
+    if response is not None and response.status_code == 201:
+        data = response.json()
+        send_message(sender_id, dialogue.SCHEDULE_BOOKED.format(date=data["details"]["date"]),
+                     quick_replies=dialogue.BACK_TO_MAIN,
+                     platform=platform, tenant=tenant)
+    else:
+        send_message(sender_id, dialogue.SCHEDULE_FAILED,
+                     quick_replies=dialogue.BACK_TO_MAIN,
+                     platform=platform, tenant=tenant)
+    tenant.sessions.delete(sender_id)
+
+def handle_page_info(sender_id, message, session, platform, tenant):
+    if not tenant.page_token or not tenant.page_id:
+        page_data = None
+    else:
+        try:
+            page_data = get_page_info(tenant)
+        except PageTokenError as e:
+            logger.error("Failed to fetch page info: %s", str(e))
+            page_data = None
+        except requests.exceptions.RequestException as e:
+            logger.error("Error fetching page info: %s", str(e))
+            send_message(sender_id, dialogue.PAGE_INFO_ERROR,
+                         quick_replies=dialogue.BACK_TO_MAIN,
+                         platform=platform, tenant=tenant)
+            return
+    if page_data is not None:
+        send_message(sender_id,
+                     dialogue.PAGE_INFO.format(name=page_data.get("name", "Unknown Page"),
+                                               about=page_data.get("about", "No description available.")),
+                     quick_replies=dialogue.BACK_TO_MAIN,
+                     platform=platform, tenant=tenant)
     else:
-        send_message(sender_id, "Sorry, I didn’t understand that. Try selecting an option or type 'start'.",
-                     quick_replies=[{"title": "Services", "payload": "services"},
-                                    {"title": "FAQs", "payload": "faq"},
-                                    {"title": "Support", "payload": "support"},
-                                    {"title": "Sales", "payload": "sales"},
-                                    {"title": "Contact Us", "payload": "contact"},
-                                    {"title": "Page Info", "payload": "page_info"}],
-                     platform=platform)
+        send_message(sender_id, dialogue.PAGE_INFO_DENIED,
+                     quick_replies=dialogue.BACK_TO_MAIN,
+                     platform=platform, tenant=tenant)
+
+# === Dialogue Tables ===
+# Compiled once per tenant variables on first use; see dialogue.py for the menus and form flows.
+# Every fixed reply is serialized for the Send API at the same time (outbound.PrebuiltMessage)
+BUSINESS_VARS = {
+    "business_name": BUSINESS_NAME,
+    "support_email": SUPPORT_EMAIL,
+    "support_phone": SUPPORT_PHONE,
+    "base_price": BASE_PRICE,
+    "shipping_days": SHIPPING_DAYS,
+    "free_shipping_threshold": FREE_SHIPPING_THRESHOLD,
+    "return_policy_days": RETURN_POLICY_DAYS,
+    "promo_code": PROMO_CODE,
+    "product_catalog_link": PRODUCT_CATALOG_LINK,
+}
+route_cache = RouteCache({
+    "inventory_menu": handle_inventory_menu,
+    "inventory_check": handle_inventory_check,
+    "schedule": handle_schedule,
+    "page_info": handle_page_info,
+    "schedule_date": handle_schedule_date,
+    "schedule_time": handle_schedule_time,
+}, prebuild=PrebuiltMessage)
+ROUTE_EXECUTORS = {
+    dialogue.REPLY: send_reply,
+    dialogue.FORM_START: start_form,
+    dialogue.FORM_STEP: advance_form,
+    dialogue.HANDLER: run_handler,
+}
+
+# === Tenants ===
+# This deployment's own page (FB_PAGE_ID, FB_PAGE_TOKEN, BUSINESS_*); TENANTS_FILE adds more
+default_tenant = Tenant(PAGE_ID, FB_PAGE_TOKEN, BUSINESS_VARS, SPREADSHEET_ID, sessions)
+tenants = load_tenants(TENANTS_FILE, default_tenant, sessions)
+route_cache.get(default_tenant)  # a broken dialogue table fails here, at startup
 
 # === Helper Functions ===
-def write_to_google_sheet(sender_id, category, data):
-    if gc and worksheet:
+def write_to_google_sheet(sender_id, category, data, tenant=None):
+    row = [
+        sender_id,  # Sender ID
+        category,  # Category
+        data.get("name", ""),  # User Name
+        data.get("order_number", ""),  # Order Number
+        data.get("urgency", ""),  # Urgency
+        data.get("website", ""),  # Website
+        data.get("issue_description", ""),  # Issue Description
+        data.get("email", ""),  # Email
+        data.get("phone", ""),  # Phone
+        data.get("business_name", ""),  # Company
+        datetime.datetime.now().isoformat()  # Timestamp
+    ]
+    with tracing.span("sheets.queue_row", category=category):
+        sheet_sink_for(tenant).add(row)
         try:
-            row = [
-                sender_id,  # Sender ID
-                category,  # Category
-                data.get("name", ""),  # User Name
-                data.get("order_number", ""),  # Order Number
-                data.get("urgency", ""),  # Urgency
-                data.get("website", ""),  # Website
-                data.get("issue_description", ""),  # Issue Description
-                data.get("email", ""),  # Email
-                data.get("phone", ""),  # Phone
-                data.get("business_name", ""),  # Company
-                datetime.datetime.now().isoformat()  # Timestamp
-            ]
-            worksheet.append_row(row)
-            logger.info("Data written to Google Sheet for sender_id: %s, category: %s", sender_id, category)
-        except Exception as e:
-            logger.error("Failed to write to Google Sheet: %s", str(e))
-
-def send_message(sender_id, text, quick_replies=None, platform="meta"):
-    if platform == "meta" and FB_PAGE_TOKEN:
-        url = f"https://graph.facebook.com/v20.0/{PAGE_ID}/messages?access_token={FB_PAGE_TOKEN}"
-        payload = {"recipient": {"id": sender_id}, "message": {"text": text}}
-        if quick_replies:
-            payload["message"]["quick_replies"] = [
-                {"content_type": "text", "title": qr["title"], "payload": qr["payload"]} for qr in quick_replies
-            ]
-        headers = {"Content-Type": "application/json"}
+            lead_store.add(row, page_id=tenant.page_id if tenant is not None else PAGE_ID)
+        except sqlite3.Error as e:
+            # The sheet still gets the row; only the local report copy misses it
+            logger.error("Failed to record lead locally: %s", str(e))
+    logger.info("Queued Google Sheet row for sender_id: %s, category: %s", sender_id, category)
+
+def meta_message_payload(sender_id, text, quick_replies=None):
+    return {"recipient": {"id": sender_id}, "message": message_body(text, quick_replies)}
+
+def wechat_message_payload(sender_id, text, quick_replies=None):
+    payload = {
+        "touser": sender_id,
+        "msgtype": "text",
+        "text": {"content": text}
+    }
+    if quick_replies:
+        payload["msgtype"] = "news"
+        payload["news"] = {"articles": [{"title": qr["title"], "url": "https://your.link"} for qr in quick_replies]}
+    return payload
+
+def send_message(sender_id, text, quick_replies=None, platform="meta", tenant=None, prebuilt=None):
+    """Send a reply; `prebuilt` is the reply's PrebuiltMessage when it came from the dialogue tables."""
+    tenant = tenant or default_tenant
+    if platform == "meta" and tenant.page_token and outbound is not None:
+        outbound.send(sender_id, prebuilt or meta_message_payload(sender_id, text, quick_replies),
+                      page_id=tenant.page_id, access_token=tenant.page_token)
+    elif platform == "meta" and tenant.page_token:
+        url = f"{GRAPH_API_URL}/{tenant.page_id}/messages?access_token={tenant.page_token}"
+        body = json_body(sender_id, prebuilt or meta_message_payload(sender_id, text, quick_replies))
         try:
-            logger.info(f"Sending message to {sender_id} with payload: {payload}")
-            response = requests.post(url, json=payload, headers=headers)
-            logger.info(f"Meta API Response: {response.json()}")
+            response = http.post(url, data=body, headers=JSON_HEADERS)
+            logger.debug("Meta API responded %d for sender_id: %s", response.status_code, sender_id)
         except requests.exceptions.RequestException as e:
-            logger.error(f"Failed to send Meta message: {str(e)}")
+            logger.error("Failed to send Meta message: %s", str(e))
     elif platform == "wechat" and WECHAT_APP_ID and WECHAT_APP_SECRET:
-        url = f"https://api.wechat.com/cgi-bin/message/custom/send?access_token={get_wechat_access_token()}"
-        payload = {
-            "touser": sender_id,
-            "msgtype": "text",
-            "text": {"content": text}
-        }
-        if quick_replies:
-            payload["msgtype"] = "news"
-            payload["news"] = {"articles": [{"title": qr["title"], "url": "https://your.link"} for qr in quick_replies]}
+        payload = wechat_message_payload(sender_id, text, quick_replies)
         headers = {"Content-Type": "application/json"}
         try:
-            response = requests.post(url, json=payload, headers=headers)
-            logger.info("WeChat API Response: %s", response.json())
-        except requests.exceptions.RequestException as e:
+            url = f"{WECHAT_API_URL}/message/custom/send?access_token={get_wechat_access_token()}"
+            response = http.post(url, json=payload, headers=headers)
+            result = response.json()
+            logger.debug("WeChat API responded errcode %s for sender_id: %s", result.get("errcode"), sender_id)
+            if result.get("errcode") in WECHAT_TOKEN_ERRORS:
+                # Token revoked or expired early; fetch a fresh one on the next send
+                credential_cache.invalidate("wechat_access_token")
+        except (requests.exceptions.RequestException, ValueError) as e:
             logger.error("Failed to send WeChat message: %s", str(e))
 
+# WeChat errcodes meaning the access token is invalid or expired
+WECHAT_TOKEN_ERRORS = (40001, 40014, 42001)
+
 def get_wechat_access_token():
     if not WECHAT_APP_ID or not WECHAT_APP_SECRET:
         raise ValueError("WeChat credentials not set")
-    url = f"https://api.wechat.com/cgi-bin/token?grant_type=client_credential&appid={WECHAT_APP_ID}&secret={WECHAT_APP_SECRET}"
-    response = requests.get(url)
-    return response.json()["access_token"]
+    return credential_cache.get("wechat_access_token", _fetch_wechat_access_token)
+
+def _fetch_wechat_access_token():
+    url = f"{WECHAT_API_URL}/token?grant_type=client_credential&appid={WECHAT_APP_ID}&secret={WECHAT_APP_SECRET}"
+    data = http.get(url).json()
+    if "access_token" not in data:
+        raise ValueError(f"WeChat token request failed: {data.get('errmsg', data)}")
+    return data["access_token"], int(data.get("expires_in", 7200))
+
+# === Webhook Worker Pool ===
+event_queue = EventQueue(process_queued, workers=WEBHOOK_WORKERS,
+                         maxsize=WEBHOOK_QUEUE_SIZE) if WEBHOOK_MODE == "queue" else None
+
+# === Background Startup ===
+# Opening the sheet and validating the Page token happen off the import path, so webhooks are
+# accepted at once; /readyz turns 200 when both have finished their first attempt
+startup = Startup(retry_interval=STARTUP_RETRY_INTERVAL)
+startup.add("google_sheets", init_google_sheets)
+startup.add("page_token", check_page_token)
+# Tenant spreadsheets are opened as they are first written to; they do not gate readiness
+tenant_sheets = Startup(retry_interval=STARTUP_RETRY_INTERVAL)
+
+# === Graceful Shutdown ===
+# Stop accepting, drain in order, report what was dropped. Runs at exit, on SIGTERM under `python app.py`
+# (other servers stop their workers with a normal exit) and from the ASGI app's lifespan shutdown
+def drain_webhooks(timeout):
+    admission.close()
+    return admission.wait_idle(timeout)
+
+def drain_queue(timeout):
+    if event_queue is None:
+        return 0
+    if not event_queue.join(timeout):
+        return event_queue.depth()
+    event_queue.stop(timeout=1)
+    return 0
+
+def drain_outbound(timeout):
+    if outbound is None:
+        return 0
+    outbound.close(timeout)
+    return outbound.pending()
+
+def flush_sheets(timeout):
+    # Rows the sheet does not take in time are spooled to disk (and replayed on the next start), not lost
+    deadline = time.monotonic() + timeout
+    sinks = all_sheet_sinks()
+    spooled = sum(sink.close(max(0.0, deadline - time.monotonic())) for sink in sinks)
+    if spooled:
+        logger.warning("Shutdown: spooled %d sheet rows to disk instead of writing them", spooled)
+    return {"dropped": sum(sink.pending() for sink in sinks), "spooled": spooled}
+
+def close_stores(timeout):
+    inventory_cache.stop()
+    lead_store.close()
+
+shutdown = Shutdown(deadline=SHUTDOWN_TIMEOUT)
+shutdown.add("webhooks", drain_webhooks)
+shutdown.add("queue", drain_queue)
+shutdown.add("outbound", drain_outbound)
+shutdown.add("sheets", flush_sheets)
+shutdown.add("sessions", lambda timeout: sessions.close())
+shutdown.add("stores", close_stores)
+atexit.register(shutdown.run)
 
 # === Main Execution ===
 if __name__ == '__main__':
-    logger.info(f"Starting with FB_PAGE_TOKEN: {'[REDACTED]' if FB_PAGE_TOKEN else 'NOT SET'}")
-    logger.info(f"Using PAGE_ID: {PAGE_ID}")
-    if verify_page_token():
-        logger.info("Startup: Page Access Token validated successfully.")
-    else:
-        logger.warning("Startup: Page Access Token validation failed. Check FB_PAGE_TOKEN and PAGE_ID.")
+    logger.info("Starting with FB_PAGE_TOKEN: %s", "[REDACTED]" if FB_PAGE_TOKEN else "NOT SET")
+    logger.info("Using PAGE_ID: %s", PAGE_ID)
+    shutdown.install()
     port = int(os.environ.get("PORT", 10000))
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    # No reloader: its watcher process would import this module too, restoring (and deleting) the session
+    # snapshot the serving child never sees, and it kills that child on SIGTERM before it can save one
+    app.run(host='0.0.0.0', port=port, debug=True, use_reloader=False)
\ No newline at end of file
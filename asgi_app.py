@@ -0,0 +1,542 @@
+"""asyncio (ASGI) server for the bot, with non-blocking outbound I/O.
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 10000
+
+Serves the same routes as app.py (/webhook GET verification and POST, /healthz,
+/readyz, /stats, /metrics, /leads, /leads/export and /traces) and reuses its configuration, dialogue tables,
+session store and Sheets sink.
+The difference is that Graph, WeChat, inventory and scheduling calls go through
+one pooled AsyncHttpClient, so a conversation waiting on the network holds a
+coroutine rather than a worker thread and one process can carry thousands of
+them. Events from the same sender are still handled one at a time, in order.
+
+WEBHOOK_MODE works as in app.py: "inline" answers Meta once the delivery's
+events are handled, "queue" answers first and handles them in background tasks
+(at most WEBHOOK_QUEUE_SIZE in flight, 503 beyond that). WEBHOOK_MAX_IN_FLIGHT
+admission control and the graceful shutdown drain are app.py's too; the
+lifespan shutdown runs the drain. So is tracing: a delivery is one trace, and a
+queued event continues it in a trace of its own.
+"""
+# === Imports ===
+import asyncio
+import datetime
+import hmac
+import json
+import logging
+import time
+from urllib.parse import parse_qs
+
+import requests
+
+import app as bot
+import dialogue
+import metrics
+import tracing
+from http_client import AsyncHttpClient
+from outbound import PrebuiltMessage, JSON_HEADERS, json_body
+from sessions import MemorySessionStore, Session
+from tenants import RouteCache
+
+try:
+    import httpx
+except ImportError:
+    raise ImportError("asgi_app requires httpx; install it with: pip install httpx uvicorn")
+
+logger = logging.getLogger(__name__)
+
+# === Configuration ===
+# Errors an outbound call can raise: httpx failures, plus requests-based ones from the
+# shared caches (CircuitOpenError and the inventory cache's HTTPError included)
+OUTBOUND_ERRORS = (httpx.HTTPError, requests.exceptions.RequestException)
+
+# The in-memory store never blocks; file and network backends run in the default thread pool
+SESSIONS_INLINE = isinstance(bot.sessions, MemorySessionStore)
+
+_http = None
+_sender_locks = {}  # (page id, sender_id) -> [asyncio.Lock, events waiting or running]
+_tasks = set()
+_counters = {"processed": 0, "failed": 0, "rejected": 0}
+
+
+def outbound():
+    global _http
+    if _http is None:
+        _http = AsyncHttpClient(connect_timeout=bot.HTTP_CONNECT_TIMEOUT, read_timeout=bot.HTTP_READ_TIMEOUT,
+                                retries=bot.HTTP_RETRIES, pool_size=bot.HTTP_POOL_SIZE,
+                                failure_threshold=bot.CIRCUIT_FAILURE_THRESHOLD,
+                                reset_timeout=bot.CIRCUIT_RESET_TIMEOUT)
+    return _http
+
+
+async def session_call(method, *args):
+    if SESSIONS_INLINE:
+        return method(*args)
+    return await asyncio.to_thread(method, *args)
+
+
+# === ASGI Entry Point ===
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    path, method = scope["path"], scope["method"]
+    if path == "/webhook" and method == "GET":
+        query = parse_qs(scope["query_string"].decode("latin-1"))
+        if query.get("hub.verify_token", [None])[0] == bot.VERIFY_TOKEN:
+            await respond(send, 200, query.get("hub.challenge", [""])[0])
+        else:
+            await respond(send, 403, "Verification failed")
+    elif path == "/webhook" and method == "POST":
+        if not bot.admission.try_enter():
+            await respond(send, 503, "SHUTTING_DOWN" if bot.admission.closed else "OVERLOADED")
+            return
+        trace_id = dict(scope["headers"]).get(tracing.TRACE_HEADER.lower().encode(), b"").decode("latin-1")
+        try:
+            with bot.WEBHOOK_SECONDS.time(bot.WEBHOOK_MODE), tracing.trace("webhook", trace_id, mode=bot.WEBHOOK_MODE):
+                status, body = await fb_webhook(await read_body(receive))
+        finally:
+            bot.admission.leave()
+        await respond(send, status, body)
+    elif path == "/stats" and method == "GET":
+        await respond(send, 200, json.dumps(stats()), content_type=b"application/json")
+    elif path == "/healthz" and method == "GET":
+        await respond(send, 200, json.dumps({"status": "ok"}), content_type=b"application/json")
+    elif path == "/readyz" and method == "GET":
+        ready = bot.startup.ready() and not bot.shutdown.draining
+        await respond(send, 200 if ready else 503, json.dumps({"ready": ready, "components": bot.startup.stats()}),
+                      content_type=b"application/json")
+    elif path == "/metrics" and method == "GET":
+        await respond(send, 200, metrics.render(), content_type=metrics.CONTENT_TYPE.encode())
+    elif path in ("/leads", "/leads/export") and method == "GET":
+        await leads(scope, send, export=path == "/leads/export")
+    elif path == "/traces" and method == "GET":
+        await traces(scope, send)
+    elif path in ("/webhook", "/healthz", "/readyz", "/stats", "/metrics", "/leads", "/leads/export", "/traces"):
+        await respond(send, 405, "Method Not Allowed")
+    else:
+        await respond(send, 404, "Not Found")
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            outbound()
+            logger.info("ASGI bot started (webhook mode: %s, session backend inline: %s)",
+                        bot.WEBHOOK_MODE, SESSIONS_INLINE)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def shutdown():
+    # Background (queue mode) events are tasks on this loop, so they are drained here; the rest of the
+    # drain is app.py's and shares the same SHUTDOWN_TIMEOUT deadline
+    bot.admission.close()
+    started = time.monotonic()
+    pending = ()
+    if _tasks:
+        logger.info("Waiting for %d in-flight events", len(_tasks))
+        _, pending = await asyncio.wait(list(_tasks), timeout=bot.SHUTDOWN_TIMEOUT)
+    bot.shutdown.record("background_events", len(pending), time.monotonic() - started)
+    await asyncio.to_thread(bot.shutdown.run)
+    if _http is not None:
+        await _http.aclose()
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def respond(send, status, body, content_type=b"text/html; charset=utf-8"):
+    body = body.encode("utf-8") if isinstance(body, str) else body
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def respond_json(send, status, payload):
+    await respond(send, status, json.dumps(payload), content_type=b"application/json")
+
+
+# === Admin Endpoints ===
+async def admin_denied(scope, send):
+    """Send the error response unless the request carries the admin bearer token; True when it was sent."""
+    if not bot.ADMIN_TOKEN:
+        await respond_json(send, 403, {"error": "Admin endpoints are disabled (ADMIN_TOKEN not set)"})
+        return True
+    authorization = dict(scope["headers"]).get(b"authorization", b"").decode("latin-1")
+    if not hmac.compare_digest(authorization, f"Bearer {bot.ADMIN_TOKEN}"):
+        await respond_json(send, 401, {"error": "Unauthorized"})
+        return True
+    return False
+
+
+def query_args(scope):
+    return {name: values[0] for name, values in parse_qs(scope["query_string"].decode("latin-1")).items()}
+
+
+async def leads(scope, send, export):
+    if await admin_denied(scope, send):
+        return
+    args = query_args(scope)
+    fmt = args.get("format", "ndjson")
+    try:
+        if export:
+            chunks = bot.lead_store.export(bot.lead_filters(args), fmt=fmt)
+        else:
+            limit = bot.page_limit(args.get("limit"), 50, bot.LEADS_MAX_PAGE_SIZE)
+            after = int(args["after"]) if args.get("after") else None
+            rows = await asyncio.to_thread(bot.lead_store.query, bot.lead_filters(args), after, limit)
+    except ValueError as e:
+        await respond_json(send, 400, {"error": f"Invalid parameter: {e}"})
+        return
+    if not export:
+        await respond_json(send, 200, {"leads": rows, "next": rows[-1]["id"] if len(rows) == limit else None})
+        return
+    # Chunked response: each chunk is read from SQLite off the event loop, then sent
+    content_type = b"text/csv; charset=utf-8" if fmt == "csv" else b"application/x-ndjson"
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", content_type),
+                            (b"content-disposition", f"attachment; filename=leads.{fmt}".encode())]})
+    try:
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                break
+            await send({"type": "http.response.body", "body": chunk.encode("utf-8"), "more_body": True})
+    finally:
+        await asyncio.to_thread(chunks.close)
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def traces(scope, send):
+    if await admin_denied(scope, send):
+        return
+    args = query_args(scope)
+    try:
+        limit = bot.page_limit(args.get("limit"), 50, bot.TRACE_BUFFER)
+        min_ms = float(args.get("min_ms", 0))
+    except ValueError as e:
+        await respond_json(send, 400, {"error": f"Invalid parameter: {e}"})
+        return
+    await respond_json(send, 200, {"traces": tracing.slow_traces(limit, min_ms, args.get("trace_id")),
+                                   "stats": tracing.stats()})
+
+
+# === Webhook ===
+async def fb_webhook(raw):
+    try:
+        data = json.loads(raw) if raw else None
+    except ValueError:
+        return 400, "Bad Request"
+    events = []
+    for key, page_id, sender_id, message in bot.iter_messaging_events(data):
+        tenant = bot.tenants.get(page_id)
+        if tenant is None:
+            logger.warning("Dropping event for unknown page %s", page_id)
+        elif key is not None and bot.dedup.seen(key):
+            logger.info("Dropping redelivered event %s for sender_id: %s", key, sender_id)
+        else:
+            events.append((key, tenant, sender_id, message))
+    if bot.WEBHOOK_MODE != "queue":
+        await asyncio.gather(*(process_once(key, sender_id, message, "meta", tenant)
+                               for key, tenant, sender_id, message in events))
+        return 200, "EVENT_RECEIVED"
+    if len(_tasks) + len(events) > bot.WEBHOOK_QUEUE_SIZE:
+        # Meta redelivers on non-2xx, so a full backlog defers the batch instead of losing it
+        for key, _, _, _ in events:
+            bot.dedup.forget(key)
+        _counters["rejected"] += 1
+        logger.warning("Webhook backlog full (%d events in flight), rejecting delivery", len(_tasks))
+        return 503, "QUEUE_FULL"
+    for key, tenant, sender_id, message in events:
+        task = asyncio.create_task(process_logged(sender_id, message, "meta", tenant))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+    return 200, "EVENT_RECEIVED"
+
+
+async def process_once(key, sender_id, message, platform, tenant):
+    try:
+        await process_in_order(sender_id, message, platform, tenant)
+    except Exception:
+        # The 500 makes Meta redeliver; let that copy through
+        bot.dedup.forget(key)
+        raise
+
+
+async def process_in_order(sender_id, message, platform, tenant):
+    # asyncio.Lock wakes waiters first-come first-served, so a sender's events run in arrival order
+    lock_key = (tenant.page_id, sender_id)
+    entry = _sender_locks.get(lock_key)
+    if entry is None:
+        entry = _sender_locks[lock_key] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            await process_message(sender_id, message, platform, tenant)
+        _counters["processed"] += 1
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _sender_locks[lock_key]
+
+
+async def process_logged(sender_id, message, platform, tenant):
+    # The task inherited the delivery's context; the event gets a trace of its own under the same id
+    try:
+        with tracing.trace("event", tracing.current_id(), mode="queue"):
+            await process_in_order(sender_id, message, platform, tenant)
+    except Exception:
+        _counters["failed"] += 1
+        logger.exception("Failed to process event for sender_id: %s", sender_id)
+
+
+def stats():
+    return {
+        "server": "asgi",
+        "webhook_mode": bot.WEBHOOK_MODE,
+        "startup": bot.startup.stats(),
+        "admission": bot.admission.stats(),
+        "events": dict(_counters, in_flight=len(_tasks), active_senders=len(_sender_locks)),
+        "dedup": bot.dedup.stats(),
+        "outbound": bot.outbound.stats() if bot.outbound is not None else None,
+        "sheets": bot.sheet_sink.stats(),
+        "tenant_sheets": bot.tenant_sheets.stats(),
+        "tenants": dict(bot.tenants.stats(), route_tables=len(route_cache)),
+        "sessions": bot.sessions.stats(),
+        "http": _http.stats() if _http is not None else {},
+        "cache": bot.credential_cache.stats(),
+        "inventory_cache": bot.inventory_cache.stats(),
+        "catalog": bot.catalog.stats(),
+        "tracing": tracing.stats(),
+    }
+
+
+# === Message Processing ===
+async def process_message(sender_id, message, platform="meta", tenant=None):
+    tenant = tenant or bot.default_tenant
+    if message in dialogue.RESET_KEYWORDS:
+        await session_call(tenant.sessions.delete, sender_id)
+        session = None
+    else:
+        with tracing.span("session.get"):
+            session = await session_call(tenant.sessions.get, sender_id)
+    state = session.state if session else None
+    message, kind, target = route_cache.get(tenant).route(message, state)
+    with bot.DISPATCH_SECONDS.time(state or "none", kind), tracing.span("dispatch", state=state, route=kind):
+        await ROUTE_EXECUTORS[kind](sender_id, message, session, target, platform, tenant)
+
+
+async def send_reply(sender_id, message, session, reply, platform, tenant):
+    await send_message(sender_id, reply.text, quick_replies=reply.quick_replies, platform=platform,
+                       tenant=tenant, prebuilt=reply.prebuilt)
+
+
+async def start_form(sender_id, message, session, step, platform, tenant):
+    await send_message(sender_id, step.reply.text, quick_replies=step.reply.quick_replies,
+                       platform=platform, tenant=tenant, prebuilt=step.reply.prebuilt)
+    await session_call(tenant.sessions.save, sender_id, Session(step.next_state, category=step.category))
+
+
+async def advance_form(sender_id, message, session, step, platform, tenant):
+    session.data[step.field] = message
+    if step.next_state:
+        await send_message(sender_id, step.reply.text, quick_replies=step.reply.quick_replies,
+                           platform=platform, tenant=tenant, prebuilt=step.reply.prebuilt)
+        session.state = step.next_state
+        await session_call(tenant.sessions.save, sender_id, session)
+    else:
+        # Buffers the row for the sink's flush thread (which does the Sheets I/O) and inserts it into the
+        # lead store, a blocking SQLite write: off the event loop
+        await asyncio.to_thread(bot.write_to_google_sheet, sender_id, step.category, session.data, tenant=tenant)
+        await send_message(sender_id, step.done.text, quick_replies=step.done.quick_replies,
+                           platform=platform, tenant=tenant, prebuilt=step.done.prebuilt)
+        await session_call(tenant.sessions.delete, sender_id)
+
+
+async def run_handler(sender_id, message, session, handler, platform, tenant):
+    await handler(sender_id, message, session, platform, tenant)
+
+
+# === Dynamic Handlers ===
+async def handle_inventory_menu(sender_id, message, session, platform, tenant):
+    await send_message(sender_id, dialogue.INVENTORY_PROMPT, quick_replies=bot.product_choices(),
+                       platform=platform, tenant=tenant)
+    await session_call(tenant.sessions.save, sender_id, Session("waiting_product"))
+
+
+async def handle_inventory_check(sender_id, message, session, platform, tenant):
+    if session is not None:
+        await session_call(tenant.sessions.delete, sender_id)
+    product_id = bot.catalog.resolve(message)
+    if product_id is None and not len(bot.catalog):
+        # Catalog not loaded yet: the blocking feed read runs off the event loop
+        product_id = await asyncio.to_thread(bot.resolve_product, message)
+    if product_id is None:
+        await send_message(sender_id, dialogue.INVENTORY_UNKNOWN, quick_replies=bot.product_choices(),
+                           platform=platform, tenant=tenant)
+        return
+    try:
+        found, data = bot.inventory_cache.peek(product_id)
+        if not found:
+            response = await outbound().get(f"{bot.INVENTORY_URL}/inventory/{product_id}")
+            data = bot.inventory_cache.put(product_id, response)
+    except OUTBOUND_ERRORS as e:
+        logger.error("Inventory lookup failed: %s", str(e))
+        data = None
+    if data is not None:
+        availability = "in stock" if data["available"] else "out of stock"
+        await send_message(sender_id,
+                           dialogue.INVENTORY_STATUS.format(product=data["product"], quantity=data["quantity"],
+                                                            availability=availability, price=data["price"]),
+                           quick_replies=dialogue.BACK_TO_MAIN, platform=platform, tenant=tenant)
+    else:
+        await send_message(sender_id, dialogue.INVENTORY_ERROR, quick_replies=dialogue.BACK_TO_MAIN,
+                           platform=platform, tenant=tenant)
+
+
+async def handle_schedule(sender_id, message, session, platform, tenant):
+    try:
+        response = await outbound().get(f"{bot.SCHEDULING_URL}/scheduling/available",
+                                        params={"from": datetime.date.today().isoformat(),
+                                                "days": bot.SCHEDULE_OFFER_DAYS})
+    except OUTBOUND_ERRORS as e:
+        logger.error("Scheduling range lookup failed: %s", str(e))
+        response = None
+    if response is not None and response.status_code == 200:
+        choices = dialogue.date_choices(response.json()["available"], bot.SCHEDULE_OFFER_DATES)
+        if len(choices) > len(dialogue.BACK_TO_MAIN):
+            await send_message(sender_id, dialogue.SCHEDULE_PICK_DATE, quick_replies=choices, platform=platform,
+                               tenant=tenant)
+        else:
+            await send_message(sender_id, dialogue.SCHEDULE_NO_DATES.format(days=bot.SCHEDULE_OFFER_DAYS),
+                               quick_replies=dialogue.BACK_TO_MAIN, platform=platform, tenant=tenant)
+    else:
+        await send_message(sender_id, dialogue.SCHEDULE_PROMPT, quick_replies=dialogue.BACK_TO_MAIN,
+                           platform=platform, tenant=tenant)
+    await session_call(tenant.sessions.save, sender_id, Session("waiting_schedule_date"))
+
+
+async def handle_schedule_date(sender_id, message, session, platform, tenant):
+    date = message
+    try:
+        response = await outbound().get(f"{bot.SCHEDULING_URL}/scheduling/available/{date}")
+    except OUTBOUND_ERRORS as e:
+        logger.error("Scheduling availability lookup failed: %s", str(e))
+        response = None
+    if response is not None and response.status_code == 200:
+        slots = response.json()["available_slots"]
+        if slots:
+            await send_message(sender_id, dialogue.SCHEDULE_SLOTS.format(date=date, slots=", ".join(slots)),
+                               quick_replies=dialogue.time_choices(slots), platform=platform, tenant=tenant)
+            session.state = "waiting_schedule_time"
+            session.schedule_date = date
+            await session_call(tenant.sessions.save, sender_id, session)
+            return
+        await send_message(sender_id, dialogue.SCHEDULE_NO_SLOTS, quick_replies=dialogue.BACK_TO_MAIN,
+                           platform=platform, tenant=tenant)
+    else:
+        await send_message(sender_id, dialogue.SCHEDULE_BAD_DATE, quick_replies=dialogue.BACK_TO_MAIN,
+                           platform=platform, tenant=tenant)
+    await session_call(tenant.sessions.delete, sender_id)
+
+
+async def handle_schedule_time(sender_id, message, session, platform, tenant):
+    try:
+        response = await outbound().post(f"{bot.SCHEDULING_URL}/scheduling", json={
+            "customer_id": sender_id,
+            "date": session.schedule_date,
+            "time": message,
+            "service": "Chatbot Consultation"
+        })
+    except OUTBOUND_ERRORS as e:
+        logger.error("Scheduling booking failed: %s", str(e))
+        response = None
+    if response is not None and response.status_code == 201:
+        data = response.json()
+        await send_message(sender_id, dialogue.SCHEDULE_BOOKED.format(date=data["details"]["date"]),
+                           quick_replies=dialogue.BACK_TO_MAIN, platform=platform, tenant=tenant)
+    else:
+        await send_message(sender_id, dialogue.SCHEDULE_FAILED, quick_replies=dialogue.BACK_TO_MAIN,
+                           platform=platform, tenant=tenant)
+    await session_call(tenant.sessions.delete, sender_id)
+
+
+async def handle_page_info(sender_id, message, session, platform, tenant):
+    page_data = None
+    if tenant.page_token and tenant.page_id:
+        # Cached for PAGE_INFO_TTL; only a miss does the (blocking) fetch in the thread
+        try:
+            page_data = await asyncio.to_thread(bot.get_page_info, tenant)
+        except bot.PageTokenError as e:
+            logger.error("Failed to fetch page info: %s", str(e))
+        except requests.exceptions.RequestException as e:
+            logger.error("Error fetching page info: %s", str(e))
+            await send_message(sender_id, dialogue.PAGE_INFO_ERROR, quick_replies=dialogue.BACK_TO_MAIN,
+                               platform=platform, tenant=tenant)
+            return
+    if page_data is not None:
+        await send_message(sender_id,
+                           dialogue.PAGE_INFO.format(name=page_data.get("name", "Unknown Page"),
+                                                     about=page_data.get("about", "No description available.")),
+                           quick_replies=dialogue.BACK_TO_MAIN, platform=platform, tenant=tenant)
+    else:
+        await send_message(sender_id, dialogue.PAGE_INFO_DENIED, quick_replies=dialogue.BACK_TO_MAIN,
+                           platform=platform, tenant=tenant)
+
+
+# === Dialogue Tables ===
+route_cache = RouteCache({
+    "inventory_menu": handle_inventory_menu,
+    "inventory_check": handle_inventory_check,
+    "schedule": handle_schedule,
+    "page_info": handle_page_info,
+    "schedule_date": handle_schedule_date,
+    "schedule_time": handle_schedule_time,
+}, prebuild=PrebuiltMessage)
+ROUTE_EXECUTORS = {
+    dialogue.REPLY: send_reply,
+    dialogue.FORM_START: start_form,
+    dialogue.FORM_STEP: advance_form,
+    dialogue.HANDLER: run_handler,
+}
+route_cache.get(bot.default_tenant)
+
+
+# === Outbound Messages ===
+async def send_message(sender_id, text, quick_replies=None, platform="meta", tenant=None, prebuilt=None):
+    tenant = tenant or bot.default_tenant
+    if platform == "meta" and tenant.page_token and bot.outbound is not None:
+        # Only queues; the dispatcher's threads do the batched sends
+        bot.outbound.send(sender_id, prebuilt or bot.meta_message_payload(sender_id, text, quick_replies),
+                          page_id=tenant.page_id, access_token=tenant.page_token)
+    elif platform == "meta" and tenant.page_token:
+        url = f"{bot.GRAPH_API_URL}/{tenant.page_id}/messages?access_token={tenant.page_token}"
+        body = json_body(sender_id, prebuilt or bot.meta_message_payload(sender_id, text, quick_replies))
+        try:
+            response = await outbound().post(url, content=body, headers=JSON_HEADERS)
+            logger.debug("Meta API responded %d for sender_id: %s", response.status_code, sender_id)
+        except OUTBOUND_ERRORS as e:
+            logger.error("Failed to send Meta message: %s %s", type(e).__name__, e)
+    elif platform == "wechat" and bot.WECHAT_APP_ID and bot.WECHAT_APP_SECRET:
+        try:
+            token = await asyncio.to_thread(bot.get_wechat_access_token)
+            response = await outbound().post(f"{bot.WECHAT_API_URL}/message/custom/send?access_token={token}",
+                                             json=bot.wechat_message_payload(sender_id, text, quick_replies))
+            result = response.json()
+            logger.debug("WeChat API responded errcode %s for sender_id: %s", result.get("errcode"), sender_id)
+            if result.get("errcode") in bot.WECHAT_TOKEN_ERRORS:
+                bot.credential_cache.invalidate("wechat_access_token")
+        except OUTBOUND_ERRORS + (ValueError,) as e:
+            logger.error("Failed to send WeChat message: %s %s", type(e).__name__, e)
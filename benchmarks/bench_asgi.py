@@ -0,0 +1,197 @@
+"""Flask (threaded WSGI) vs asyncio (ASGI) serving of the bot under the same load.
+
+The local stack from loadtest.py (inventory and scheduling services, fake
+Graph/WeChat with --graph-latency added to every call) runs in this process;
+the bot under test runs in a subprocess pointed at it, first app.py on
+werkzeug's threaded server, then asgi_app.py on uvicorn, with INFO logging off
+in both. An asyncio load generator replays scripted conversations for --users
+senders with up to --concurrency webhook deliveries open at once. Besides
+latency and throughput the report gives the bot process's peak thread count
+and RSS.
+
+    python benchmarks/bench_asgi.py --users 2000 --concurrency 500 --graph-latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import payloads  # noqa: E402
+from loadtest import PAGE_ID, Stack, percentile  # noqa: E402
+
+
+SERVERS = {
+    "flask": "from werkzeug.serving import run_simple; import app; "
+             "run_simple('127.0.0.1', {port}, app.app, threaded=True)",
+    "asgi": "import uvicorn, asgi_app; "
+            "uvicorn.run(asgi_app.app, host='127.0.0.1', port={port}, log_level='warning', backlog=4096)",
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_bot(name, workdir):
+    port = free_port()
+    code = "import logging; logging.disable(logging.INFO); " + SERVERS[name].format(port=port)
+    env = dict(os.environ, PYTHONPATH=ROOT, SHEETS_SPOOL_PATH=os.path.join(workdir, f"{name}_spool.jsonl"),
+               LEADS_DB_PATH=os.path.join(workdir, f"{name}_leads.db"),
+               SESSION_SNAPSHOT_PATH=os.path.join(workdir, f"{name}_sessions.jsonl"))
+    process = subprocess.Popen([sys.executable, "-c", code], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/stats", timeout=1)
+            return process, port
+        except requests.exceptions.RequestException:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{name} bot did not start")
+
+
+def proc_status(pid):
+    """(threads, RSS kB) of a process, from /proc."""
+    fields = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            fields[key] = value.split()
+    return int(fields["Threads"][0]), int(fields["VmRSS"][0])
+
+
+class Connection:
+    """Minimal keep-alive HTTP/1.1 client, so the load generator costs little CPU next to the bot."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def post_json(self, path, body):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        raw = json.dumps(body).encode("utf-8")
+        self.writer.write(f"POST {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+                          f"Content-Length: {len(raw)}\r\n\r\n".encode("latin-1") + raw)
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        status = int(head.split(b" ", 2)[1])
+        length = 0
+        for line in head.split(b"\r\n")[1:]:
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"content-length":
+                length = int(value)
+            elif name.strip().lower() == b"connection" and value.strip().lower() == b"close":
+                self.close()
+        if self.reader is not None:
+            await self.reader.readexactly(length)
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def replay(port, users, concurrency, scenarios, prefix):
+    """Each user posts its conversation one message at a time; returns [(latency, ok), ...]."""
+    idle = [Connection("127.0.0.1", port) for _ in range(concurrency)]
+    gate = asyncio.Semaphore(concurrency)
+
+    async def user(index):
+        scenario = scenarios[index % len(scenarios)]
+        results = []
+        for body in payloads.conversation(scenario, f"{prefix}-{scenario}-{index}", PAGE_ID, index):
+            async with gate:
+                connection = idle.pop()
+                started = time.perf_counter()
+                try:
+                    ok = await connection.post_json("/webhook", body) < 500
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    connection.close()
+                    ok = False
+                results.append((time.perf_counter() - started, ok))
+                idle.append(connection)
+        return results
+
+    per_user = await asyncio.gather(*(user(i) for i in range(users)))
+    for connection in idle:
+        connection.close()
+    return [r for results in per_user for r in results]
+
+
+def run(stack, name, args, workdir):
+    process, port = start_bot(name, workdir)
+    sends_before = stack.graph.count("/messages")
+    samples = [proc_status(process.pid)]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(0.05):
+            samples.append(proc_status(process.pid))
+
+    threading.Thread(target=sample, daemon=True).start()
+    started = time.perf_counter()
+    results = asyncio.run(replay(port, args.users, args.concurrency, args.scenarios.split(","), name))
+    elapsed = time.perf_counter() - started
+    done.set()
+    process.terminate()
+    process.wait()
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        "requests": len(results),
+        "errors": sum(1 for _, ok in results if not ok),
+        "rps": round(len(results) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "graph_sends": stack.graph.count("/messages") - sends_before,
+        "peak_threads": max(threads for threads, _ in samples),
+        "peak_rss_kb": max(rss for _, rss in samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=300, help="webhook deliveries in flight at once")
+    parser.add_argument("--scenarios", default="menu,order_issue,lead,inventory",
+                        help="comma-separated conversations from payloads.CONVERSATIONS")
+    parser.add_argument("--graph-latency", type=float, default=0.05, help="seconds added to each fake Graph call")
+    parser.add_argument("--servers", default="flask,asgi")
+    args = parser.parse_args()
+    args.mode = "inline"
+    args.outbound = "direct"
+
+    with tempfile.TemporaryDirectory() as workdir:
+        stack = Stack(args, workdir)
+        logging.getLogger().setLevel(logging.ERROR)
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        print(f"{args.users} users, {args.concurrency} concurrent deliveries, "
+              f"graph latency {args.graph_latency * 1000:.0f} ms")
+        print(f"{'server':<8}{'reqs':>7}{'err':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}"
+              f"{'sends':>8}{'threads':>9}{'rss kB':>9}")
+        for name in args.servers.split(","):
+            r = run(stack, name, args, workdir)
+            print(f"{name:<8}{r['requests']:>7}{r['errors']:>6}{r['rps']:>9.1f}{r['p50_ms']:>9.1f}"
+                  f"{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['graph_sends']:>8}{r['peak_threads']:>9}"
+                  f"{r['peak_rss_kb']:>9}")
+        stack.stop()
+
+if __name__ == '__main__':
+    main()
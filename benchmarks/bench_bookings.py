@@ -0,0 +1,58 @@
+"""Benchmark: slot availability and booking at 100k+ existing bookings, index vs. full scan.
+
+The scan variant reproduces the former scheduling.py check
+(`any(schedule["date"] == ... for schedule in schedules.values())` per slot).
+
+    python benchmarks/bench_bookings.py [bookings]
+"""
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bookings import BookingIndex  # noqa: E402
+
+SLOTS = ["09:00", "10:00", "11:00", "14:00", "15:00", "16:00"]
+
+
+def scan_available(schedules, day):
+    return [slot for slot in SLOTS if not any(s["date"] == f"{day} {slot}" for s in schedules.values())]
+
+
+def timed(label, fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f"{label:<38} {elapsed * 1e6:12.1f} us/op")
+    return elapsed
+
+
+def main(total=120000):
+    start = date(2020, 1, 1)
+    index = BookingIndex()
+    legacy = {}
+    started = time.perf_counter()
+    for n in range(total):
+        day = (start + timedelta(days=n // len(SLOTS))).isoformat()
+        slot = SLOTS[n % len(SLOTS)]
+        index.book(f"customer-{n}", day, slot, "Chatbot Consultation")
+        legacy[f"customer-{n}"] = {"date": f"{day} {slot}", "service": "Chatbot Consultation", "status": "booked"}
+    print(f"loaded {len(index)} bookings in {time.perf_counter() - started:.2f}s")
+
+    probe = start + timedelta(days=total // len(SLOTS) // 2)
+    scan = timed("availability, full scan", lambda: scan_available(legacy, probe.isoformat()), 5)
+    indexed = timed("availability, index", lambda: index.free_slots(probe), 20000)
+    print(f"{'speedup':<38} {scan / indexed:12.0f}x")
+    timed("30-day range, index", lambda: index.free_slots_range(start, start + timedelta(days=29)), 2000)
+
+    free_day = start + timedelta(days=total // len(SLOTS) + 1)
+    counter = iter(range(10 ** 9))
+    timed("book (conflict check + insert), index",
+          lambda: index.book(f"bench-{next(counter)}", free_day.isoformat(), "09:00", "Bench"), 20000)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 120000)
@@ -0,0 +1,106 @@
+"""Micro-benchmark: compiled dialogue table vs. the former if/elif chain in process_message.
+
+Only routing is timed (no sends or HTTP). Run from the repository root:
+
+    python benchmarks/bench_dispatch.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dialogue  # noqa: E402
+
+
+def legacy_route(message, state):
+    """Branch order and membership tests of the pre-table process_message chain."""
+    if message in ['hi', 'hello', 'start', 'get_started', 'welcome_message']:
+        return "welcome"
+    elif message in ['services', 'service']:
+        return "services"
+    elif message in ['learn_more', 'learn more']:
+        return "learn_more"
+    elif message in ['faq', 'faqs']:
+        return "faq"
+    elif message in ['services_info', 'services', 'what services do you offer']:
+        return "services_info"
+    elif message in ['cost', 'how much does it cost']:
+        return "cost"
+    elif message in ['shipping', 'ship', 'shipping info']:
+        return "shipping"
+    elif message in ['support', 'help']:
+        return "support"
+    elif message in ['order_issue', 'order issue']:
+        return "order_issue"
+    elif message in ['tech_issue', 'technical_issue', 'technical issues']:
+        return "tech_issue"
+    elif message in ['contact', 'contact us']:
+        return "contact"
+    elif message == 'sales':
+        return "sales"
+    elif message == 'products':
+        return "products"
+    elif message == 'offers':
+        return "offers"
+    elif message == 'lead':
+        return "lead"
+    elif message == 'inventory':
+        return "inventory"
+    elif message in ['check_basic', 'check_pro', 'check_enterprise']:
+        return "inventory_check"
+    elif message == 'schedule':
+        return "schedule"
+    elif message and state == "waiting_schedule_date":
+        return "schedule_date"
+    elif message and state == "waiting_schedule_time":
+        return "schedule_time"
+    elif message == 'page_info':
+        return "page_info"
+    elif state in ("order_number", "order_name", "order_email", "order_phone", "order_urgency",
+                   "order_business", "order_website"):
+        return "Order Issue"
+    elif state in ("tech_name", "tech_email", "tech_phone", "tech_urgency", "tech_business",
+                   "tech_website", "tech_description"):
+        return "Technical Issue"
+    elif state in ("lead_name", "lead_email", "lead_phone", "lead_business", "lead_website"):
+        return "Lead Capture"
+    return "fallback"
+
+
+# (message, state) pairs weighted towards form answers and late-chain keywords, which is
+# where the old chain paid for the most comparisons
+WORKLOAD = [
+    ("hi", None), ("faq", None), ("shipping info", None), ("sales", None), ("page_info", None),
+    ("check_pro", None), ("jane doe", "lead_name"), ("jane@example.com", "lead_email"),
+    ("order 1234", "order_number"), ("urgent", "tech_urgency"), ("2025-03-01", "waiting_schedule_date"),
+    ("what is this", None),
+]
+
+
+def main(number=200000):
+    noop = lambda *args: None  # noqa: E731
+    table = dialogue.compile_routes({
+        "business_name": "Bench", "support_email": "a@b.c", "support_phone": "1", "base_price": "$1",
+        "shipping_days": "1", "free_shipping_threshold": "$1", "return_policy_days": "1",
+        "promo_code": "X", "product_catalog_link": "http://x",
+    }, {name: noop for name in list(dialogue.HANDLER_KEYWORDS) + list(dialogue.HANDLER_STATES.values())})
+
+    def run_legacy():
+        for message, state in WORKLOAD:
+            legacy_route(message, state)
+
+    def run_table():
+        for message, state in WORKLOAD:
+            table.resolve(message, state)
+
+    per_call = number * len(WORKLOAD)
+    legacy = min(timeit.repeat(run_legacy, number=number, repeat=3)) / per_call * 1e9
+    compiled = min(timeit.repeat(run_table, number=number, repeat=3)) / per_call * 1e9
+    print(f"legacy if/elif chain: {legacy:8.1f} ns/message")
+    print(f"compiled table:       {compiled:8.1f} ns/message")
+    print(f"speedup:              {legacy / compiled:8.2f}x")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
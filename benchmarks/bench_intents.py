@@ -0,0 +1,145 @@
+"""Accuracy and latency of free-text intent matching (intents.py) vs exact keywords only.
+
+A labelled set of free-text messages (none of them a keyword or an
+INTENT_PHRASES entry verbatim) is routed through a compiled dialogue table:
+
+    exact    DialogueTable.resolve, exact keywords only (the behaviour before intents.py)
+    intents  DialogueTable.route, which sends unmatched free text through the matcher
+
+"clean" are the messages as written, "typos" the same messages with one random
+edit (insert, delete, substitute or swap) in a word of 5+ letters, and
+"unrelated" messages that should get the fallback reply. A message counts as
+correct when it reaches the same route as its label (or the fallback, for the
+unrelated set). Latency is per routed message, over all sets.
+
+    python benchmarks/bench_intents.py --repeat 200
+"""
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dialogue  # noqa: E402
+
+VARIABLES = {"business_name": "Bench", "product_catalog_link": "https://example.com", "base_price": "$199",
+             "shipping_days": "3-5", "free_shipping_threshold": "$50", "support_email": "help@example.com",
+             "support_phone": "555-0100", "promo_code": "BENCH20"}
+
+LABELLED = [
+    ("hey, is anyone there?", "hi"),
+    ("good morning!", "hi"),
+    ("what kind of services do you provide", "services"),
+    ("what do you guys offer?", "services"),
+    ("can you tell me more about it", "learn_more"),
+    ("i'd like more details", "learn_more"),
+    ("i have some questions", "faq"),
+    ("how much does a chatbot cost?", "cost"),
+    ("what are your prices", "cost"),
+    ("how much is the setup", "cost"),
+    ("what is the pricing for the subscription", "cost"),
+    ("how long does delivery take?", "shipping"),
+    ("do you ship to canada", "shipping"),
+    ("what about shipping costs", "shipping"),
+    ("i need some assistance please", "support"),
+    ("customer service please", "support"),
+    ("what's your email address", "contact"),
+    ("can i talk to a real person", "contact"),
+    ("what is your phone number?", "contact"),
+    ("i want to purchase a bot", "sales"),
+    ("show me your product catalog", "products"),
+    ("any discounts right now?", "offers"),
+    ("do you have a promo code", "offers"),
+    ("what's in stock", "inventory"),
+    ("there is a problem with my order", "order issue"),
+    ("where is my order??", "order issue"),
+    ("i want a refund", "order issue"),
+    ("the bot is not working", "technical issues"),
+    ("i found a bug", "technical issues"),
+    ("i'm getting an error", "technical issues"),
+    ("i'm interested, please get in touch", "lead"),
+    ("can i get a quote", "lead"),
+    ("is the basic chatbot available", "check_basic"),
+    ("check the pro plan", "check_pro"),
+    ("enterprise chatbot stock", "check_enterprise"),
+    ("i'd like to book an appointment", "schedule"),
+    ("can we schedule a call", "schedule"),
+    ("set up a meeting", "schedule"),
+    ("who are you?", "page_info"),
+    ("tell me about this page", "page_info"),
+]
+UNRELATED = ["my name is bob", "asdfgh", "the weather is nice today", "lol", "thanks for nothing", "42",
+             "what is the meaning of life", "blue green red", "ok", "zzzz"]
+
+
+def add_typo(text, rng):
+    words = text.split()
+    candidates = [index for index, word in enumerate(words) if len(word) >= 5 and word.isalpha()]
+    if not candidates:
+        return text
+    index = rng.choice(candidates)
+    word = words[index]
+    at = rng.randrange(1, len(word) - 1)
+    edit = rng.choice(["insert", "delete", "substitute", "swap"])
+    if edit == "insert":
+        word = word[:at] + rng.choice(string.ascii_lowercase) + word[at:]
+    elif edit == "delete":
+        word = word[:at] + word[at + 1:]
+    elif edit == "substitute":
+        word = word[:at] + rng.choice(string.ascii_lowercase.replace(word[at], "")) + word[at + 1:]
+    else:
+        word = word[:at] + word[at + 1] + word[at] + word[at + 2:]
+    words[index] = word
+    return " ".join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200, help="timing passes over all messages")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--verbose", action="store_true", help="print every miss")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    handlers = list(dialogue.HANDLER_KEYWORDS) + list(dialogue.HANDLER_STATES.values())
+    table = dialogue.compile_routes(VARIABLES, {name: name for name in handlers})
+    print(f"compiled table with {len(table.intents)} intent phrases in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    rng = random.Random(args.seed)
+    sets = {
+        "clean": LABELLED,
+        "typos": [(add_typo(text, rng), keyword) for text, keyword in LABELLED],
+        "unrelated": [(text, None) for text in UNRELATED],
+    }
+    print(f"{'set':<10}{'messages':>9}{'exact':>9}{'intents':>9}")
+    for name, messages in sets.items():
+        exact = intents = 0
+        for text, keyword in messages:
+            expected = table.fallback if keyword is None else table.keywords[keyword]
+            exact += table.resolve(text) is expected
+            _, kind, target = table.route(text)
+            hit = (kind, target) == expected
+            intents += hit
+            if args.verbose and not hit:
+                print(f"  miss: {text!r} -> {target if kind != dialogue.REPLY else target.text[:40]!r}")
+        print(f"{name:<10}{len(messages):>9}{exact / len(messages):>9.0%}{intents / len(messages):>9.0%}")
+
+    texts = [text for messages in sets.values() for text, _ in messages]
+    timings = []
+    for _ in range(args.repeat):
+        for text in texts:
+            started = time.perf_counter()
+            table.route(text)
+            timings.append(time.perf_counter() - started)
+    timings.sort()
+    print(f"route() latency over {len(timings)} calls: mean {statistics.mean(timings) * 1e6:.1f}us, "
+          f"p50 {timings[len(timings) // 2] * 1e6:.1f}us, p99 {timings[int(len(timings) * 0.99)] * 1e6:.1f}us, "
+          f"max {timings[-1] * 1e6:.1f}us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Concurrent load test for InventoryStore: proves no overselling and reports ops/sec.
+
+Threads and worker processes race to sell one product (half by direct
+decrement, half by reserve + commit) until it runs out. Afterwards the number
+of units sold must equal the starting stock exactly and the on-hand quantity
+must be zero.
+
+Before the race, a hold on another product is left to lapse: once it expires,
+reads must show the stock as available again and both a direct sale and a
+batch sale must go through.
+
+    python benchmarks/bench_inventory.py [--stock N] [--threads N] [--processes N]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inventory_store import InventoryStore, InsufficientStock  # noqa: E402
+
+PRODUCT = "bench_product"
+
+
+def sell_until_empty(path, worker, threads, results):
+    """Run `threads` sellers against the store at `path`; put (sold, attempts) on results."""
+    store = InventoryStore(path)
+    counts = []
+    lock = threading.Lock()
+
+    def seller(n):
+        sold = attempts = 0
+        while True:
+            attempts += 1
+            try:
+                if (worker + n) % 2:
+                    store.adjust(PRODUCT, -1)
+                else:
+                    store.commit(store.reserve(PRODUCT, 1)["reservation_id"])
+                sold += 1
+            except InsufficientStock:
+                break
+        with lock:
+            counts.append((sold, attempts))
+
+    pool = [threading.Thread(target=seller, args=(n,)) for n in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put((sum(c[0] for c in counts), sum(c[1] for c in counts)))
+
+
+def check_lapsed_hold(store, ttl=0.2):
+    """True when stock held by a reservation that expired can be read as available and sold."""
+    store.add("lapsing_product", "Lapsing Product", 5, 1)
+    store.reserve("lapsing_product", 5, ttl=ttl)
+    if store.get("lapsing_product")["quantity"] != 0:
+        return False
+    time.sleep(ttl * 2)
+    if store.get("lapsing_product")["quantity"] != 5:
+        return False
+    try:
+        store.adjust("lapsing_product", -1)
+        store.apply_batch([("lapsing_product", -1)])
+    except InsufficientStock:
+        return False
+    return store.get("lapsing_product")["on_hand"] == 3
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stock", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--processes", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "inventory.db")
+        store = InventoryStore(path)
+        if not check_lapsed_hold(store):
+            print("FAIL: stock held by an expired reservation could not be sold")
+            sys.exit(1)
+        print("OK: expired holds released on read and sale")
+        store.add(PRODUCT, "Bench Product", args.stock, 1)
+
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=sell_until_empty, args=(path, w, args.threads, results))
+                   for w in range(args.processes)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        totals = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        sold = sum(t[0] for t in totals)
+        attempts = sum(t[1] for t in totals)
+        final = store.get(PRODUCT)
+        print(f"{args.processes} processes x {args.threads} threads, starting stock {args.stock}")
+        print(f"sold {sold}, final on hand {final['on_hand']}, reserved {final['reserved']}")
+        print(f"{attempts} operations in {elapsed:.2f}s = {attempts / elapsed:,.0f} ops/sec")
+        if sold != args.stock or final["on_hand"] != 0 or final["reserved"] != 0:
+            print("FAIL: oversold or lost stock")
+            sys.exit(1)
+        print("OK: no overselling")
+
+
+if __name__ == '__main__':
+    main()
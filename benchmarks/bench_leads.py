@@ -0,0 +1,105 @@
+"""Cost of the local lead store (leads_store.py): recording rows, paging through them and exporting them.
+
+A temporary LeadStore is filled with --rows synthetic sheet rows (three
+categories, three urgencies, timestamps spread over 90 days), then:
+
+    add       time per LeadStore.add, i.e. what write_to_google_sheet pays per row
+    page      time per filtered page of 100 (category + urgency + 30-day range),
+              first page vs the last one: keyset pagination keeps them level
+    export    streaming NDJSON/CSV export vs reading every row at once (fetchall
+              then serialize, what a naive export does): time, and peak memory
+              allocated (tracemalloc, in a second run)
+
+    python benchmarks/bench_leads.py --rows 200000
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from leads_store import LeadStore, COLUMNS  # noqa: E402
+
+CATEGORIES = ["Lead Capture", "Order Issue", "Technical Issue"]
+URGENCIES = ["low", "medium", "high"]
+
+
+def fill(store, rows):
+    start = datetime.datetime(2025, 1, 1)
+    started = time.perf_counter()
+    for index in range(rows):
+        created_at = start + datetime.timedelta(seconds=index * 90 * 86400 // rows)
+        store.add([f"user-{index}", CATEGORIES[index % 3], f"Customer {index}", f"#{index}", URGENCIES[index % 7 % 3],
+                   "https://example.com", "Something went wrong with the order", f"user{index}@example.com",
+                   "555-0100", "Example Co", created_at.isoformat()], page_id="bench-page")
+    return time.perf_counter() - started
+
+
+def pages(store, filters, limit=100):
+    """(first page seconds, last page seconds, pages) walking every page of `filters`."""
+    timings = []
+    after = None
+    while True:
+        started = time.perf_counter()
+        leads = store.query(filters, after=after, limit=limit)
+        timings.append(time.perf_counter() - started)
+        if len(leads) < limit:
+            return timings[0], timings[-1], len(timings)
+        after = leads[-1]["id"]
+
+
+def measure(run):
+    """(seconds, peak bytes allocated, output size); timed in a separate untraced run."""
+    started = time.perf_counter()
+    size = run()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, size
+
+
+def naive_export(store, fmt):
+    conn = store._conn
+    rows = conn.execute(f"SELECT id, {', '.join(COLUMNS)}, page_id FROM leads ORDER BY created_at, id").fetchall()
+    if fmt == "ndjson":
+        body = "".join(json.dumps(store._row_to_lead(row)) + "\n" for row in rows)
+    else:
+        body = "\n".join(",".join(str(value) for value in row) for row in rows)
+    return len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        store = LeadStore(os.path.join(workdir, "leads.db"))
+        elapsed = fill(store, args.rows)
+        print(f"add: {args.rows} rows in {elapsed:.2f}s ({elapsed / args.rows * 1e6:.1f}us/row)")
+
+        filters = {"category": "Order Issue", "urgency": "high", "from": "2025-02-01", "to": "2025-03-02"}
+        first, last, count = pages(store, filters)
+        print(f"page: {count} pages of 100, first {first * 1000:.2f}ms, last {last * 1000:.2f}ms")
+
+        print(f"{'export':<16}{'seconds':>9}{'peak MB':>10}{'MB out':>9}")
+        for fmt in ("ndjson", "csv"):
+            results = {
+                "streaming": lambda: sum(len(chunk) for chunk in store.export(fmt=fmt)),
+                "fetchall": lambda: naive_export(store, fmt),
+            }
+            for name, run in results.items():
+                elapsed, peak, size = measure(run)
+                print(f"{fmt + ' ' + name:<16}{elapsed:>9.2f}{peak / 1e6:>10.1f}{size / 1e6:>9.1f}")
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""Direct Send API calls vs the batching OutboundDispatcher, against the fake Graph server.
+
+A broadcast of --messages replies per recipient to --recipients users is sent
+both ways: "direct" posts every reply from a pool of --threads senders (what
+busy webhook threads do today), "batch" queues them on an OutboundDispatcher.
+With --fail-every N every Nth send fails transiently, exercising retries of
+single calls inside a batch. The report checks that every reply was delivered
+exactly once and in order per recipient.
+
+A second check sends two pages' replies through one rate-limited dispatcher
+(--rate-check calls/second, an HTTP stub standing in for Graph): each page has
+its own token bucket, so both must get their full rate at once, finishing in
+about the time one page alone would take. Exit status is 1 when they do not.
+
+    python benchmarks/bench_outbound.py --recipients 500 --messages 4 --graph-latency 0.05 --fail-every 97
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import FakeGraph  # noqa: E402
+from http_client import HttpClient  # noqa: E402
+from outbound import OutboundDispatcher, classify  # noqa: E402
+
+PAGE_ID = "bench-page"
+
+
+def payload(recipient_id, n):
+    return {"recipient": {"id": recipient_id}, "message": {"text": f"reply {n}"}}
+
+
+def send_direct(http, graph, recipients, messages, threads, max_retries):
+    url = f"{graph.url}/{PAGE_ID}/messages?access_token=bench-token"
+
+    def one_recipient(recipient_id):
+        for n in range(messages):
+            for attempt in range(max_retries + 1):
+                response = http.post(url, json=payload(recipient_id, n))
+                if classify(response.status_code, response.json()) != "retry":
+                    break
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one_recipient, recipients))
+
+
+def send_batched(http, graph, recipients, messages, args):
+    dispatcher = OutboundDispatcher(http, graph.url, PAGE_ID, "bench-token", max_batch=args.batch_size,
+                                    workers=args.workers, rate=args.rate, backoff=0.05)
+    for n in range(messages):
+        for recipient_id in recipients:
+            dispatcher.send(recipient_id, payload(recipient_id, n))
+    dispatcher.close(timeout=300)
+    return dispatcher.stats()
+
+
+class _StubResponse:
+    status_code = 200
+    text = '{"message_id": "m"}'
+
+
+class StubHttp:
+    """Answers every Send API call at once, noting when each page's calls were made."""
+
+    def __init__(self):
+        self.calls = {}
+
+    def post(self, url, data=None, headers=None):
+        page_id = url.split("/")[-2]
+        self.calls.setdefault(page_id, []).append(time.monotonic())
+        return _StubResponse()
+
+
+def check_page_rates(rate):
+    """(seconds for two pages to each send 2 x rate calls, seconds one page's bucket alone allows)."""
+    http = StubHttp()
+    dispatcher = OutboundDispatcher(http, "http://graph.invalid", "page-a", "token-a", max_batch=1, workers=4,
+                                    rate=rate)
+    calls = int(rate * 2)
+    started = time.monotonic()
+    for n in range(calls):
+        dispatcher.send(f"a-{n}", payload(f"a-{n}", 0), page_id="page-a", access_token="token-a")
+        dispatcher.send(f"b-{n}", payload(f"b-{n}", 0), page_id="page-b", access_token="token-b")
+    dispatcher.close(timeout=60)
+    elapsed = max(max(times) for times in http.calls.values()) - started
+    # A full bucket covers `rate` calls at once; the rest come at `rate` per second
+    return elapsed, (calls - rate) / rate
+
+
+def check(graph, recipients, messages):
+    """(messages delivered, recipients whose replies were missing, duplicated or out of order)."""
+    expected = [f"reply {n}" for n in range(messages)]
+    by_recipient = {}
+    for recipient_id, text in graph.delivered:
+        by_recipient.setdefault(recipient_id, []).append(text)
+    bad = sum(1 for recipient_id in recipients if by_recipient.get(recipient_id) != expected)
+    return len(graph.delivered), bad
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recipients", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=4, help="replies per recipient")
+    parser.add_argument("--graph-latency", type=float, default=0.05, help="seconds added to each fake Graph call")
+    parser.add_argument("--fail-every", type=int, default=0, help="fail every Nth send transiently")
+    parser.add_argument("--threads", type=int, default=16, help="concurrent senders in direct mode")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=2, help="dispatcher worker threads")
+    parser.add_argument("--rate", type=float, default=1000.0, help="dispatcher token bucket, calls/second")
+    parser.add_argument("--rate-check", type=float, default=100.0, help="per-page rate for the two-page check")
+    args = parser.parse_args()
+
+    recipients = [f"user-{i}" for i in range(args.recipients)]
+    total = args.recipients * args.messages
+    print(f"{total} replies to {args.recipients} recipients, graph latency {args.graph_latency * 1000:.0f} ms, "
+          f"fail every {args.fail_every or 'never'}")
+    print(f"{'mode':<8}{'seconds':>9}{'msg/s':>9}{'http calls':>12}{'delivered':>11}{'bad order':>11}")
+    for mode in ("direct", "batch"):
+        graph = FakeGraph(page_id=PAGE_ID, latency=args.graph_latency, fail_every=args.fail_every,
+                          record=True).start()
+        http = HttpClient(pool_size=max(args.threads, args.workers))
+        started = time.perf_counter()
+        if mode == "direct":
+            send_direct(http, graph, recipients, args.messages, args.threads, max_retries=3)
+            extra = ""
+        else:
+            stats = send_batched(http, graph, recipients, args.messages, args)
+            extra = (f"  (avg batch {stats['avg_batch_size']}, retries {stats['retries']}, "
+                     f"failed {stats['failed']}, throttled {stats['throttled_s']}s)")
+        elapsed = time.perf_counter() - started
+        delivered, bad = check(graph, recipients, args.messages)
+        calls = stats["requests"] if mode == "batch" else graph.count(f"POST /{PAGE_ID}/messages")
+        print(f"{mode:<8}{elapsed:>9.2f}{total / elapsed:>9.1f}{calls:>12}{delivered:>11}{bad:>11}{extra}")
+        graph.stop()
+        http.close()
+
+    elapsed, expected = check_page_rates(args.rate_check)
+    print(f"two pages at {args.rate_check:.0f} calls/s each: {elapsed:.2f}s (one page alone: {expected:.2f}s)")
+    if elapsed > expected * 1.5:
+        print("FAIL: the pages share one send rate")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Per-message cost of sending static replies: payload rebuilt each time vs prebuilt at compile time.
+
+Static menu replies (welcome, FAQ, shipping, cost, contact, ...) are pushed
+through app.process_message with an HTTP client stub that serializes the body
+the way requests does and returns 200, so only the bot's own work is measured.
+"rebuilt" compiles the dialogue tables without prebuilt payloads, so every send
+builds the payload dict and serializes it; "prebuilt" is the default, where
+only the recipient id is spliced into the reply's serialized JSON.
+
+For each mode the report gives time per message, the peak memory allocated
+while handling one message (tracemalloc) and the request body size, which
+should match.
+
+    python benchmarks/bench_payloads.py --messages 20000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from json import dumps
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.update({"FB_PAGE_TOKEN": "bench-token", "FB_PAGE_ID": "bench-page", "INVENTORY_WATCH": "false",
+                   "LOG_LEVEL": "WARNING", "OUTBOUND_MODE": "direct", "SESSION_SNAPSHOT_PATH": ""})
+
+import app  # noqa: E402
+from tenants import RouteCache  # noqa: E402
+
+STATIC_MESSAGES = ["hi", "faq", "shipping", "cost", "contact", "sales", "services", "offers", "support"]
+
+
+class _Response:
+    status_code = 200
+
+
+class CaptureHttp:
+    """Stands in for HttpClient.post: serializes `json=` like requests and discards the body."""
+
+    def __init__(self):
+        self.sends = 0
+        self.bytes_sent = 0
+
+    def post(self, url, json=None, data=None, headers=None):
+        if json is not None:
+            data = dumps(json, allow_nan=False).encode("utf-8")
+        self.sends += 1
+        self.bytes_sent += len(data)
+        return _Response()
+
+
+def run(messages):
+    for index in range(messages):
+        app.process_message(f"{1000000000000000 + index % 500}", STATIC_MESSAGES[index % len(STATIC_MESSAGES)])
+
+
+def measure(messages):
+    run(min(messages, 1000))  # warm the caches and sessions
+    started = time.perf_counter()
+    run(messages)
+    elapsed = time.perf_counter() - started
+
+    # Peak memory above the starting point while handling one message: everything it allocates at once
+    sample = min(messages, 2000)
+    tracemalloc.start()
+    peaks = 0
+    for index in range(sample):
+        base, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        app.process_message(f"{1000000000000000 + index % 500}", STATIC_MESSAGES[index % len(STATIC_MESSAGES)])
+        peaks += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return elapsed / messages * 1e6, peaks / sample
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    app.http = CaptureHttp()
+    prebuilt_cache = app.route_cache
+    rebuilt_cache = RouteCache(prebuilt_cache.handlers, prebuild=None)
+    print(f"{args.messages} static replies")
+    print(f"{'mode':<10}{'us/msg':>9}{'peak B/msg':>12}{'body B':>9}")
+    for mode, cache in (("rebuilt", rebuilt_cache), ("prebuilt", prebuilt_cache)):
+        app.route_cache = cache
+        app.http.bytes_sent = app.http.sends = 0
+        per_message, peak = measure(args.messages)
+        print(f"{mode:<10}{per_message:>9.2f}{peak:>12.0f}{app.http.bytes_sent / app.http.sends:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Cold-start cost of the bot: import time, time to first 200 and time to ready.
+
+The bot is started in a fresh subprocess for each run. Google Sheets is
+replaced by an in-process fake that takes --google-latency seconds to open the
+spreadsheet, and the Page token is checked against the fake Graph server with
+--graph-latency per call. Two startup orders are compared:
+
+    eager   wait for Sheets and the token check before serving (how app.py started before)
+    lazy    serve at once while they finish in the background (current behaviour)
+
+For each, the report gives the median over --runs of: `import app` time
+(not counting the Google client libraries, which the fake loads up front),
+time from process start to the first 200 on POST /webhook, and to /readyz 200.
+
+    python benchmarks/bench_startup.py --google-latency 2 --graph-latency 0.3 --runs 3
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import FakeGraph  # noqa: E402
+
+PAGE_ID = "bench-page"
+
+
+# === Bot Process ===
+def install_fake_google(latency):
+    """Stand-ins for oauth2client and gspread, patched in before app.py imports them."""
+    import gspread
+    from oauth2client.service_account import ServiceAccountCredentials
+
+    class Worksheet:
+        def append_rows(self, rows):
+            pass
+
+    class Spreadsheet:
+        def worksheet(self, title):
+            return Worksheet()
+
+    class Client:
+        def open_by_key(self, key):
+            time.sleep(latency)
+            return Spreadsheet()
+
+    ServiceAccountCredentials.from_json_keyfile_dict = classmethod(lambda cls, info, scope: object())
+    gspread.authorize = lambda creds: Client()
+
+
+def child(args):
+    install_fake_google(args.google_latency)
+    started = time.perf_counter()
+    import app as bot
+    imported = time.perf_counter() - started
+    if args.mode == "eager":
+        bot.startup.wait()
+    print(json.dumps({"import_s": imported}), flush=True)
+    from werkzeug.serving import run_simple
+    run_simple("127.0.0.1", args.port, bot.app, threaded=True)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def poll(url, deadline, method="GET", **kwargs):
+    """time.monotonic() at the first 200 from url, or None at the deadline."""
+    while time.monotonic() < deadline:
+        try:
+            if requests.request(method, url, timeout=1, **kwargs).status_code == 200:
+                return time.monotonic()
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.005)
+    return None
+
+
+def run_once(mode, args, graph, workdir):
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=ROOT, FB_PAGE_TOKEN="bench-token", FB_PAGE_ID=PAGE_ID,
+               GRAPH_API_URL=graph.url, GOOGLE_CREDENTIALS="{}", INVENTORY_WATCH="false", LOG_LEVEL="WARNING",
+               SHEETS_SPOOL_PATH=os.path.join(workdir, "spool.jsonl"), LEADS_DB_PATH=os.path.join(workdir, "leads.db"),
+               SESSION_SNAPSHOT_PATH="")
+    started = time.monotonic()
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--child", "--mode", mode,
+                                "--port", str(port), "--google-latency", str(args.google_latency)],
+                               cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        deadline = started + 60
+        body = {"object": "page", "entry": [{"id": PAGE_ID, "messaging": [
+            {"sender": {"id": "startup-user"}, "message": {"mid": f"m-{port}", "text": "hi"}}]}]}
+        first_200 = poll(f"http://127.0.0.1:{port}/webhook", deadline, method="POST", json=body)
+        ready = poll(f"http://127.0.0.1:{port}/readyz", deadline)
+        imported = json.loads(process.stdout.readline())["import_s"]
+    finally:
+        process.kill()
+        process.wait()
+    if first_200 is None or ready is None:
+        raise RuntimeError(f"{mode} bot did not become ready")
+    return imported, first_200 - started, ready - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--google-latency", type=float, default=2.0, help="seconds to open the fake spreadsheet")
+    parser.add_argument("--graph-latency", type=float, default=0.3, help="seconds added to each fake Graph call")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", default="lazy", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args)
+        return
+
+    graph = FakeGraph(page_id=PAGE_ID, latency=args.graph_latency).start()
+    print(f"google latency {args.google_latency:.2f}s, graph latency {args.graph_latency:.2f}s, "
+          f"median of {args.runs} runs")
+    print(f"{'mode':<8}{'import s':>10}{'first 200 s':>13}{'ready s':>10}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in ("eager", "lazy"):
+            runs = [run_once(mode, args, graph, workdir) for _ in range(args.runs)]
+            imported, first_200, ready = (statistics.median(column) for column in zip(*runs))
+            print(f"{mode:<8}{imported:>10.3f}{first_200:>13.3f}{ready:>10.3f}")
+    graph.stop()
+
+
+if __name__ == '__main__':
+    main()
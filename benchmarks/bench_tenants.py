@@ -0,0 +1,78 @@
+"""Memory of one multi-tenant bot process vs one process per Facebook Page.
+
+A fresh process imports app.py with --tenants pages registered through
+TENANTS_FILE, each with its own business name (so every tenant compiles its own
+dialogue table) and no page token (so replies are built but not sent). Every
+tenant then handles --users short conversations. The report compares the RSS of
+that process with --tenants times the RSS of a single-tenant process doing the
+same for one page.
+
+    python benchmarks/bench_tenants.py --tenants 200 --users 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CONVERSATION = ["hi", "sales", "lead", "Ann", "ann@example.com", "555 0100", "Ann's Bikes"]
+
+
+def rss_kb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+
+
+def child(args):
+    import app
+    for tenant in app.tenants:
+        for user in range(args.users):
+            for text in CONVERSATION:
+                app.process_message(f"user-{user}", text.lower(), tenant=tenant)
+    print(json.dumps({"rss_kb": rss_kb(), "tenants": len(app.tenants), "route_tables": len(app.route_cache)}))
+
+
+def measure(tenants, users, workdir):
+    env = dict(os.environ, PYTHONPATH=ROOT, FB_PAGE_TOKEN="", FB_PAGE_ID="page-0", INVENTORY_WATCH="false",
+               LOG_LEVEL="ERROR", SESSION_BACKEND="memory", SHEETS_SPOOL_PATH=os.path.join(workdir, "spool.jsonl"),
+               LEADS_DB_PATH=os.path.join(workdir, "leads.db"), SESSION_SNAPSHOT_PATH="")
+    if tenants > 1:
+        path = os.path.join(workdir, f"tenants-{tenants}.json")
+        with open(path, "w") as f:
+            json.dump([{"page_id": f"page-{i}", "variables": {"business_name": f"Business {i}"}}
+                       for i in range(tenants)], f)
+        env["TENANTS_FILE"] = path
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", "--users", str(users)],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenants", type=int, default=200)
+    parser.add_argument("--users", type=int, default=20, help="conversations per tenant")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args)
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        single = measure(1, args.users, workdir)
+        shared = measure(args.tenants, args.users, workdir)
+    separate = single["rss_kb"] * args.tenants
+    print(f"{args.tenants} tenants, {args.users} conversations each")
+    print(f"one process per page : {single['rss_kb']:>8} kB x {args.tenants} = {separate / 1024:>8.1f} MB")
+    print(f"one multi-tenant     : {shared['rss_kb'] / 1024:>8.1f} MB "
+          f"({shared['route_tables']} route tables, "
+          f"{(shared['rss_kb'] - single['rss_kb']) / max(1, args.tenants - 1):.1f} kB per extra tenant)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Cost of request tracing (tracing.py): webhook deliveries with tracing on vs off.
+
+The local stack from loadtest.py (fake Graph, inventory and scheduling services
+on localhost ports, in-memory Sheets) is started once. Scripted conversations
+(menus, an inventory check, scheduling, a lead form) are then posted to the
+bot's webhook through the Flask test client, one delivery at a time, so every
+outbound call, span and X-Trace-Id header is on the measured path. Rounds
+alternate tracing off and on to even out drift; the report gives the median
+time per delivery for each and the overhead.
+
+--slow-ms 0 keeps every trace in the ring buffer, the worst case; the default
+(the bot's own) keeps only slow ones.
+
+    python benchmarks/bench_tracing.py --users 40 --rounds 6
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import payloads  # noqa: E402
+import tracing  # noqa: E402
+from loadtest import PAGE_ID, Stack  # noqa: E402
+
+SCENARIOS = ["menu", "inventory", "scheduling", "lead"]
+
+
+def run_round(client, round_index, users):
+    """Seconds per delivery for `users` conversations of each scenario."""
+    deliveries = 0
+    started = time.perf_counter()
+    for scenario in SCENARIOS:
+        for user in range(users):
+            index = round_index * users + user
+            for body in payloads.conversation(scenario, f"trace-{scenario}-{index}", PAGE_ID, index):
+                response = client.post("/webhook", json=body)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{scenario}: webhook answered {response.status_code}")
+                deliveries += 1
+    return (time.perf_counter() - started) / deliveries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=40, help="conversations per scenario per round")
+    parser.add_argument("--rounds", type=int, default=6, help="rounds per setting, alternating")
+    parser.add_argument("--slow-ms", type=float, default=500.0)
+    args = parser.parse_args()
+    # Stack reads the loadtest options it needs
+    args.mode, args.outbound, args.graph_latency = "inline", "direct", 0.0
+
+    with tempfile.TemporaryDirectory() as workdir:
+        stack = Stack(args, workdir)
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        client = stack.bot.app.test_client()
+        tracing.configure(enabled=False)
+        run_round(client, 0, max(1, args.users // 4))  # warm connections, caches and the catalog
+
+        timings = {False: [], True: []}
+        for round_index in range(args.rounds * 2):
+            enabled = bool(round_index % 2)
+            tracing.configure(enabled=enabled, slow_ms=args.slow_ms, capacity=stack.bot.TRACE_BUFFER)
+            timings[enabled].append(run_round(client, round_index + 1, args.users))
+        traced = tracing.stats()
+        stack.stop()
+
+    off, on = statistics.median(timings[False]), statistics.median(timings[True])
+    print(f"{len(SCENARIOS) * args.users} conversations per round, {args.rounds} rounds each")
+    print(f"{'tracing':<10}{'us/delivery':>13}")
+    print(f"{'off':<10}{off * 1e6:>13.1f}")
+    print(f"{'on':<10}{on * 1e6:>13.1f}")
+    print(f"overhead: {(on - off) / off * 100:+.1f}%  ({traced['traces']} traces, {traced['buffered']} buffered, "
+          f"{traced['spans_dropped']} spans dropped)")
+
+
+if __name__ == '__main__':
+    main()
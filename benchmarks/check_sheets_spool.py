@@ -0,0 +1,85 @@
+"""Failure-path check for the Sheets write-behind sink (sheets_sink.py): which rows are spooled and which quarantined.
+
+Each case runs a SheetsSink against a MemoryBackend that fails in one way, then
+checks where the rows ended up:
+
+    unreachable   ConnectionError / timeouts (no HTTP status): rows are spooled for
+                  replay, never quarantined
+    refused       a 400 for one row: only that row is quarantined, the rest written
+    replay        rows spooled while Sheets was down are written, in order, ahead of
+                  new ones once it is back
+
+Exit status is 1 when a case fails.
+
+    python benchmarks/check_sheets_spool.py
+"""
+import logging
+import os
+import socket
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests  # noqa: E402
+
+from sheets_sink import SheetsSink, MemoryBackend  # noqa: E402
+
+ROWS = [["sender", "Lead Capture", f"Customer {index}"] for index in range(4)]
+
+
+def sink(workdir, name, backend):
+    return SheetsSink(backend, max_batch=50, max_delay=60, spool_path=os.path.join(workdir, f"{name}.jsonl"),
+                      max_retries=1, backoff=0.01)
+
+
+def unreachable(workdir):
+    results = []
+    for error in (requests.exceptions.ConnectionError("Connection refused"),
+                  requests.exceptions.ReadTimeout("Read timed out"), socket.timeout("timed out")):
+        s = sink(workdir, type(error).__name__, MemoryBackend(fail_times=100, error=error))
+        for row in ROWS:
+            s.add(row)
+        s.flush()
+        results.append(s.rows_spooled == len(ROWS) and s.rows_rejected == 0 and not os.path.exists(s.rejected_path))
+        s.close()
+    return all(results)
+
+
+def refused(workdir):
+    backend = MemoryBackend(reject=lambda row: row[2] == "Customer 2")
+    s = sink(workdir, "refused", backend)
+    for row in ROWS:
+        s.add(row)
+    s.flush()
+    s.close()
+    return s.rows_rejected == 1 and s.rows_spooled == 0 and len(backend.rows) == len(ROWS) - 1
+
+
+def replay(workdir):
+    backend = MemoryBackend(fail_times=2, error=requests.exceptions.ConnectionError("Connection reset"))
+    s = sink(workdir, "replay", backend)
+    s.add(ROWS[0])
+    s.add(ROWS[1])
+    s.flush()  # both attempts fail: spooled
+    s.add(ROWS[2])
+    s.add(ROWS[3])
+    s.flush()
+    s.close()
+    return backend.rows == ROWS and not os.path.exists(s.spool_path)
+
+
+def main():
+    logging.basicConfig(level=logging.CRITICAL)
+    failed = False
+    with tempfile.TemporaryDirectory() as workdir:
+        for case in (unreachable, refused, replay):
+            ok = case(workdir)
+            failed = failed or not ok
+            print(f"{case.__name__:<12}{'OK' if ok else 'FAIL'}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""Local stand-ins for the Graph and WeChat APIs, served over real HTTP on localhost.
+
+Point the bot at them with GRAPH_API_URL / WECHAT_API_URL. Each server counts
+and optionally records what it receives and can add a fixed latency to mimic
+the real round trip. For Google Sheets use sheets_sink.MemoryBackend.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class FakeServer:
+    """Threaded HTTP/1.1 (keep-alive) server dispatching to handle(method, path, query, body)."""
+
+    def __init__(self, latency=0.0, record=False):
+        self.latency = latency
+        self.record = record
+        self.received = []
+        self.counts = {}
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _dispatch(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                parts = urlsplit(self.path)
+                status, payload = fake._handle(method, parts.path, parse_qs(parts.query), raw, self.headers)
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            request_queue_size = 1024  # socketserver's default of 5 drops connects under a burst
+
+        self.httpd = Server(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _handle(self, method, path, query, raw, headers):
+        if self.latency:
+            time.sleep(self.latency)
+        key = f"{method} {path}"
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+            if self.record:
+                self.received.append((method, path, query, raw))
+        return self.handle(method, path, query, raw, headers)
+
+    def handle(self, method, path, query, raw, headers):
+        return 404, {"error": "not found"}
+
+    def count(self, suffix=""):
+        with self._lock:
+            return sum(n for key, n in self.counts.items() if key.endswith(suffix))
+
+
+class FakeGraph(FakeServer):
+    """Page info, Send API (POST /{page_id}/messages) and batch requests (POST / with a `batch` form field).
+
+    Every `fail_every`-th message send fails with a transient Graph error, inside a
+    batch or not. Delivered messages are kept in order in `delivered` as
+    (recipient id, text) when recording.
+    """
+
+    def __init__(self, page_id="bench-page", page_name="Fake Page", fail_every=0, **kwargs):
+        super().__init__(**kwargs)
+        self.page_id = page_id
+        self.page_name = page_name
+        self.fail_every = fail_every
+        self.delivered = []
+        self._message_ids = 0
+        self._attempts = 0
+
+    def handle(self, method, path, query, raw, headers):
+        if method == "GET" and path == f"/{self.page_id}":
+            return 200, {"id": self.page_id, "name": self.page_name, "about": "A fake page for benchmarks."}
+        if method == "POST" and path == f"/{self.page_id}/messages":
+            return self._send(json.loads(raw or b"{}"))
+        if method == "POST" and path == "/":
+            form = parse_qs(raw.decode("utf-8"))
+            results = []
+            for call in json.loads(form["batch"][0]):
+                if call["method"] != "POST" or call["relative_url"].split("?")[0] != f"{self.page_id}/messages":
+                    results.append({"code": 404, "body": json.dumps({"error": {"message": "Unknown path",
+                                                                               "code": 803}})})
+                    continue
+                with self._lock:
+                    key = f"POST /{self.page_id}/messages"
+                    self.counts[key] = self.counts.get(key, 0) + 1
+                params = parse_qs(call.get("body", ""))
+                status, body = self._send({name: json.loads(values[0]) for name, values in params.items()})
+                results.append({"code": status, "body": json.dumps(body)})
+            return 200, results
+        return 404, {"error": {"message": "Unknown path", "code": 803}}
+
+    def _send(self, payload):
+        with self._lock:
+            self._attempts += 1
+            if self.fail_every and self._attempts % self.fail_every == 0:
+                return 500, {"error": {"message": "An unexpected error has occurred. Please retry your request "
+                                                  "later.", "type": "OAuthException", "code": 2,
+                                       "is_transient": True}}
+            self._message_ids += 1
+            message_id = f"m_fake_{self._message_ids}"
+            recipient_id = payload.get("recipient", {}).get("id")
+            if self.record:
+                self.delivered.append((recipient_id, payload.get("message", {}).get("text")))
+        return 200, {"recipient_id": recipient_id, "message_id": message_id}
+
+
+class FakeWeChat(FakeServer):
+    """Token endpoint (expires_in honoured by the bot's cache) and custom message send."""
+
+    def __init__(self, expires_in=7200, **kwargs):
+        super().__init__(**kwargs)
+        self.expires_in = expires_in
+        self.tokens_issued = 0
+
+    def handle(self, method, path, query, raw, headers):
+        if method == "GET" and path.endswith("/token"):
+            with self._lock:
+                self.tokens_issued += 1
+                token = f"fake-token-{self.tokens_issued}"
+            return 200, {"access_token": token, "expires_in": self.expires_in}
+        if method == "POST" and path.endswith("/message/custom/send"):
+            return 200, {"errcode": 0, "errmsg": "ok"}
+        return 404, {"errcode": 404, "errmsg": "not found"}
@@ -0,0 +1,274 @@
+"""Replay-based load test for the bot webhook, inventory.py and scheduling.py.
+
+Everything runs locally in this process: the bot (app.py), the inventory and
+scheduling services, and fake Graph/WeChat endpoints, each on its own
+localhost port, with Google Sheets replaced by an in-memory backend. Scripted
+conversations (menus, Order Issue, Tech Issue, Lead, inventory checks,
+scheduling, and Order Issue with every delivery sent twice) are replayed as
+webhook deliveries by many concurrent users, and the inventory and scheduling
+APIs are driven directly.
+
+For every scenario the report gives p50/p95/p99 latency, requests/sec and RSS
+growth. Results can be saved as a JSON baseline and later runs compared with it:
+
+    python benchmarks/loadtest.py --users 200 --concurrency 16 --save benchmarks/baseline.json
+    python benchmarks/loadtest.py --users 200 --concurrency 16 --baseline benchmarks/baseline.json
+
+Exit status is 1 when a scenario regresses beyond --tolerance.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import payloads  # noqa: E402
+from fakes import FakeGraph, FakeWeChat  # noqa: E402
+
+PAGE_ID = "bench-page"
+WEBHOOK_SCENARIOS = ["menu", "order_issue", "tech_issue", "lead", "inventory", "scheduling", "burst", "redelivery"]
+SERVICE_SCENARIOS = ["inventory_api", "scheduling_api"]
+
+
+# === Local Stack ===
+class Stack:
+    def __init__(self, args, workdir):
+        self.graph = FakeGraph(page_id=PAGE_ID, latency=args.graph_latency).start()
+        self.wechat = FakeWeChat(latency=args.graph_latency).start()
+        os.environ.update({
+            "FB_PAGE_TOKEN": "bench-token",
+            "FB_PAGE_ID": PAGE_ID,
+            "GRAPH_API_URL": self.graph.url,
+            "WECHAT_API_URL": self.wechat.url,
+            "WEBHOOK_MODE": args.mode,
+            "OUTBOUND_MODE": args.outbound,
+            "INVENTORY_DB_PATH": os.path.join(workdir, "inventory.db"),
+            "SESSION_DB_PATH": os.path.join(workdir, "sessions.db"),
+            "SHEETS_SPOOL_PATH": os.path.join(workdir, "sheets_spool.jsonl"),
+            "SCHEDULING_JOURNAL_PATH": os.path.join(workdir, "bookings"),
+            "LEADS_DB_PATH": os.path.join(workdir, "leads.db"),
+            "SESSION_SNAPSHOT_PATH": "",
+        })
+        import inventory
+        import scheduling
+        self._servers = []
+        self.inventory_url = self._serve(inventory.app)
+        self.scheduling_url = self._serve(scheduling.app)
+        os.environ["INVENTORY_URL"] = self.inventory_url
+        os.environ["SCHEDULING_URL"] = self.scheduling_url
+        import app as bot
+        from sheets_sink import MemoryBackend
+        bot.sheet_sink.set_backend(MemoryBackend())
+        self.bot = bot
+        self.app_url = self._serve(bot.app)
+
+    def _serve(self, wsgi_app):
+        from werkzeug.serving import make_server
+        server = make_server("127.0.0.1", 0, wsgi_app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self._servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}"
+
+    def drain(self, timeout=60):
+        """Wait for queued webhook events (queue mode), batched replies and buffered sheet rows."""
+        if self.bot.event_queue is not None:
+            self.bot.event_queue.join(timeout)
+        if self.bot.outbound is not None:
+            self.bot.outbound.flush(timeout)
+        self.bot.sheet_sink.flush()
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+        self.graph.stop()
+        self.wechat.stop()
+
+
+# === Measurement ===
+def rss_kb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * (os.sysconf("SC_PAGE_SIZE") // 1024)
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if platform.system() == "Darwin" else peak
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+_local = threading.local()
+
+
+def client():
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
+
+
+def timed_request(method, url, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = client().request(method, url, timeout=30, **kwargs)
+        ok = response.status_code < 500
+    except requests.exceptions.RequestException:
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+# === Scenarios ===
+def webhook_user(stack, scenario, index):
+    """Replay one user's conversation; returns [(latency, ok), ...]."""
+    url = f"{stack.app_url}/webhook"
+    if scenario == "burst":
+        senders = [f"burst-{index}-{n}" for n in range(12)]
+        return [timed_request("POST", url, json=payloads.burst(senders, PAGE_ID)) for _ in range(3)]
+    sender_id = f"{scenario}-{index}"
+    if scenario == "redelivery":
+        # Meta retrying every delivery once: graph_sends should stay at one reply per message
+        return [timed_request("POST", url, json=body)
+                for body in payloads.conversation("order_issue", sender_id, PAGE_ID, index) for _ in range(2)]
+    return [timed_request("POST", url, json=body)
+            for body in payloads.conversation(scenario, sender_id, PAGE_ID, index)]
+
+
+def service_user(stack, scenario, index):
+    if scenario == "inventory_api":
+        base = stack.inventory_url
+        return [
+            timed_request("GET", f"{base}/inventory/chatbot_basic"),
+            timed_request("GET", f"{base}/inventory", params={"ids": "chatbot_basic,chatbot_pro,chatbot_enterprise"}),
+            timed_request("GET", f"{base}/inventory", params={"limit": 50}),
+            timed_request("POST", f"{base}/inventory/batch", json={"changes": [
+                {"product_id": "chatbot_basic", "quantity_change": 1},
+                {"product_id": "chatbot_pro", "quantity_change": 1}]}),
+            timed_request("POST", f"{base}/inventory/batch", json={"changes": [
+                {"product_id": "chatbot_basic", "quantity_change": -1},
+                {"product_id": "chatbot_pro", "quantity_change": -1}]}),
+        ]
+    base = stack.scheduling_url
+    # Far-future dates keep these bookings clear of the webhook scheduling scenario
+    day = (date.today() + timedelta(days=400 + index // 6)).isoformat()
+    return [
+        timed_request("GET", f"{base}/scheduling/available/{day}"),
+        timed_request("GET", f"{base}/scheduling/available", params={"from": day, "days": 14}),
+        timed_request("POST", f"{base}/scheduling", json={
+            "customer_id": f"api-{index}", "date": day, "time": payloads.SLOTS[index % 6]}),
+        timed_request("GET", f"{base}/scheduling/api-{index}"),
+    ]
+
+
+def run_scenario(stack, scenario, users, concurrency):
+    runner = service_user if scenario in SERVICE_SCENARIOS else webhook_user
+    sends_before = stack.graph.count("/messages")
+    rss_before = rss_kb()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = [r for user in pool.map(lambda i: runner(stack, scenario, i), range(users)) for r in user]
+    elapsed = time.perf_counter() - started
+    stack.drain()
+    drained = time.perf_counter() - started
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        "requests": len(results),
+        "errors": sum(1 for _, ok in results if not ok),
+        "rps": round(len(results) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        "elapsed_s": round(elapsed, 3),
+        "drained_s": round(drained, 3),
+        "rss_growth_kb": rss_kb() - rss_before,
+        "graph_sends": stack.graph.count("/messages") - sends_before,
+    }
+
+
+# === Baseline Comparison ===
+def compare(results, baseline, tolerance):
+    """List of human-readable regressions against a saved baseline."""
+    regressions = []
+    for scenario, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(scenario)
+        if not previous:
+            continue
+        for metric in ("p95_ms", "p99_ms"):
+            if previous[metric] and current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f"{scenario}: {metric} {previous[metric]} -> {current[metric]}")
+        if previous["rps"] and current["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{scenario}: rps {previous['rps']} -> {current['rps']}")
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{scenario}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100, help="virtual users per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--scenarios", default="all",
+                        help="comma-separated subset of: " + ", ".join(WEBHOOK_SCENARIOS + SERVICE_SCENARIOS))
+    parser.add_argument("--mode", choices=["inline", "queue"], default="inline", help="WEBHOOK_MODE for the bot")
+    parser.add_argument("--outbound", choices=["direct", "batch"], default="direct",
+                        help="OUTBOUND_MODE for the bot")
+    parser.add_argument("--graph-latency", type=float, default=0.0, help="seconds added to each fake Graph call")
+    parser.add_argument("--save", help="write results JSON here")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    scenarios = WEBHOOK_SCENARIOS + SERVICE_SCENARIOS if args.scenarios == "all" else args.scenarios.split(",")
+    with tempfile.TemporaryDirectory() as workdir:
+        stack = Stack(args, workdir)
+        logging.getLogger().setLevel(args.log_level)
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        results = {
+            "meta": {"python": platform.python_version(), "mode": args.mode, "outbound": args.outbound,
+                     "users": args.users,
+                     "concurrency": args.concurrency, "graph_latency": args.graph_latency,
+                     "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+            "scenarios": {},
+        }
+        print(f"{'scenario':<16}{'reqs':>7}{'err':>5}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'rss+kB':>9}")
+        for scenario in scenarios:
+            r = run_scenario(stack, scenario, args.users, args.concurrency)
+            results["scenarios"][scenario] = r
+            print(f"{scenario:<16}{r['requests']:>7}{r['errors']:>5}{r['rps']:>9.1f}{r['p50_ms']:>9.2f}"
+                  f"{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}{r['rss_growth_kb']:>9}")
+        results["bot_stats"] = stack.bot.app.test_client().get("/stats").get_json()
+        stack.stop()
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"saved {args.save}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            sys.exit(1)
+        print("no regressions against", args.baseline)
+
+
+if __name__ == '__main__':
+    main()
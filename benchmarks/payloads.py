@@ -0,0 +1,93 @@
+"""Generators for realistic Meta webhook payloads and scripted bot conversations."""
+import itertools
+import time
+from datetime import date, timedelta
+
+_mids = itertools.count(1)
+
+SLOTS = ["09:00", "10:00", "11:00", "14:00", "15:00", "16:00"]
+
+
+# === Messaging Events ===
+def _base_event(sender_id, page_id):
+    return {"sender": {"id": sender_id}, "recipient": {"id": page_id}, "timestamp": int(time.time() * 1000)}
+
+
+def text_event(sender_id, text, page_id):
+    event = _base_event(sender_id, page_id)
+    event["message"] = {"mid": f"m_{next(_mids)}", "text": text}
+    return event
+
+
+def quick_reply_event(sender_id, payload, page_id, title=None):
+    event = _base_event(sender_id, page_id)
+    event["message"] = {"mid": f"m_{next(_mids)}", "text": title or payload.replace("_", " ").title(),
+                        "quick_reply": {"payload": payload}}
+    return event
+
+
+def postback_event(sender_id, payload, page_id, title=None):
+    event = _base_event(sender_id, page_id)
+    event["postback"] = {"mid": f"m_{next(_mids)}", "title": title or payload, "payload": payload}
+    return event
+
+
+EVENT_BUILDERS = {"text": text_event, "quick_reply": quick_reply_event, "postback": postback_event}
+
+
+def webhook_body(events, page_id, entries=1):
+    """Wrap messaging events in a page webhook body, spread over `entries` entry objects."""
+    now = int(time.time() * 1000)
+    chunks = [events[i::entries] for i in range(entries)]
+    return {"object": "page",
+            "entry": [{"id": page_id, "time": now, "messaging": chunk} for chunk in chunks if chunk]}
+
+
+# === Conversations ===
+# Each step is (event kind, text or payload). Scripts follow the bot's real menus.
+def _scheduling_steps(index):
+    day = (date.today() + timedelta(days=1 + index // len(SLOTS))).isoformat()
+    return [("postback", "get_started"), ("text", "schedule"), ("text", day), ("text", SLOTS[index % len(SLOTS)])]
+
+
+CONVERSATIONS = {
+    "menu": lambda index: [
+        ("postback", "get_started"), ("quick_reply", "faq"), ("quick_reply", "shipping"),
+        ("quick_reply", "faq"), ("quick_reply", "cost"), ("quick_reply", "start"),
+        ("quick_reply", "contact"), ("text", "what is this"),
+    ],
+    "order_issue": lambda index: [
+        ("postback", "get_started"), ("quick_reply", "support"), ("quick_reply", "order_issue"),
+        ("text", f"A-{1000 + index}"), ("text", "Jane Doe"), ("text", f"jane{index}@example.com"),
+        ("text", "555-0100"), ("quick_reply", "urgent"), ("text", "Acme Ltd"), ("text", "acme.example.com"),
+    ],
+    "tech_issue": lambda index: [
+        ("postback", "get_started"), ("quick_reply", "support"), ("quick_reply", "tech_issue"),
+        ("text", "John Roe"), ("text", f"john{index}@example.com"), ("text", "555-0101"),
+        ("quick_reply", "not_urgent"), ("text", "Roe Inc"), ("text", "roe.example.com"),
+        ("text", "The bot stops replying after the second question"),
+    ],
+    "lead": lambda index: [
+        ("postback", "get_started"), ("quick_reply", "sales"), ("quick_reply", "lead"),
+        ("text", "Sam Lee"), ("text", f"sam{index}@example.com"), ("text", "555-0102"),
+        ("text", "Lee & Co"), ("text", "lee.example.com"),
+    ],
+    "inventory": lambda index: [
+        ("text", "inventory"), ("quick_reply", "check_basic"), ("quick_reply", "check_pro"),
+        ("quick_reply", "check_enterprise"),
+    ],
+    "scheduling": _scheduling_steps,
+}
+
+
+def conversation(name, sender_id, page_id, index=0):
+    """Webhook bodies, one per message, for scripted conversation `name`."""
+    return [webhook_body([EVENT_BUILDERS[kind](sender_id, value, page_id)], page_id)
+            for kind, value in CONVERSATIONS[name](index)]
+
+
+def burst(sender_ids, page_id, entries=3):
+    """One multi-entry delivery carrying a menu message from each sender, as Meta batches under load."""
+    events = [quick_reply_event(sender_id, payload, page_id)
+              for sender_id, payload in zip(sender_ids, itertools.cycle(["faq", "shipping", "cost", "contact"]))]
+    return webhook_body(events, page_id, entries=entries)
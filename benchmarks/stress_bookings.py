@@ -0,0 +1,184 @@
+"""Stress test: concurrent bookings against the journaled scheduling service.
+
+--threads clients book random slots over a small range of dates, so most
+slots are fought over, for --seconds. With --target http they go through
+scheduling.py on a threaded werkzeug server (the Flask path, including its
+validation); --target index calls BookingIndex.book directly. Some clients also
+cancel what they booked, so the journal and snapshots also have to replay
+cancellations.
+
+Afterwards the script checks that:
+  - no slot holds more bookings than the calendar's capacity
+  - every acknowledged booking (201) that was not cancelled is in the index
+  - a second index replayed from the journal directory holds exactly the same bookings
+
+It reports sustained bookings/sec, fsyncs and records per fsync, and the
+replay time.
+
+    python benchmarks/stress_bookings.py --threads 32 --seconds 10 --days 20
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import requests  # noqa: E402
+
+from booking_journal import BookingJournal  # noqa: E402
+from bookings import BookingIndex  # noqa: E402
+from calendars import Calendar  # noqa: E402
+
+
+def start_server(flask_app):
+    import logging
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def client(worker, args, book, cancel, slots, deadline, results):
+    rng = random.Random(worker)
+    acknowledged = {}
+    attempts = cancelled = 0
+    while time.monotonic() < deadline:
+        day, slot = rng.choice(slots)
+        booking_id = book(f"stress-{worker}", day, slot)
+        attempts += 1
+        if booking_id is not None:
+            acknowledged[booking_id] = (day, slot)
+            if rng.random() < args.cancel_rate:
+                cancel(f"stress-{worker}", booking_id)
+                del acknowledged[booking_id]
+                cancelled += 1
+    results[worker] = (attempts, acknowledged, cancelled)
+
+
+def http_target(base):
+    sessions = threading.local()
+
+    def http():
+        if not hasattr(sessions, "session"):
+            sessions.session = requests.Session()
+        return sessions.session
+
+    def book(customer_id, day, slot):
+        response = http().post(f"{base}/scheduling", json={"customer_id": customer_id, "date": day, "time": slot})
+        if response.status_code == 201:
+            return response.json()["details"]["id"]
+        if response.status_code != 400:
+            raise RuntimeError(f"Unexpected response {response.status_code}: {response.text}")
+        return None
+
+    def cancel(customer_id, booking_id):
+        response = http().delete(f"{base}/scheduling/{customer_id}", params={"booking_id": booking_id})
+        response.raise_for_status()
+
+    return book, cancel
+
+
+def index_target(index):
+    def book(customer_id, day, slot):
+        booking = index.book(customer_id, day, slot, "Stress")
+        return booking["id"] if booking else None
+
+    def cancel(customer_id, booking_id):
+        index.cancel(booking_id)
+
+    return book, cancel
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["http", "index"], default="http")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--days", type=int, default=20, help="dates the clients fight over")
+    parser.add_argument("--capacity", type=int, default=1)
+    parser.add_argument("--cancel-rate", type=float, default=0.1)
+    parser.add_argument("--snapshot-every", type=int, default=2000)
+    parser.add_argument("--no-fsync", action="store_true")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="stress-bookings-")
+    journal_path = os.path.join(workdir, "bookings")
+    calendar = Calendar(capacity=args.capacity)
+    if args.target == "http":
+        with open(os.path.join(workdir, "calendar.json"), "w") as f:
+            json.dump({"capacity": args.capacity}, f)
+        os.environ.update({"SCHEDULING_JOURNAL_PATH": journal_path, "SCHEDULING_FSYNC": str(not args.no_fsync),
+                           "SCHEDULING_SNAPSHOT_EVERY": str(args.snapshot_every), "LOG_LEVEL": "WARNING",
+                           "SCHEDULING_CALENDAR": os.path.join(workdir, "calendar.json")})
+        import scheduling
+        index = scheduling.schedules
+        server, base = start_server(scheduling.app)
+        book, cancel = http_target(base)
+    else:
+        index = BookingIndex(calendar, journal=BookingJournal(journal_path, fsync=not args.no_fsync),
+                             snapshot_every=args.snapshot_every)
+        server = None
+        book, cancel = index_target(index)
+
+    start = date.today() + timedelta(days=1)
+    slots = [(day.isoformat(), slot) for day in (start + timedelta(days=n) for n in range(args.days))
+             for slot in calendar.slots(day)]
+    results = {}
+    deadline = time.monotonic() + args.seconds
+    threads = [threading.Thread(target=client, args=(worker, args, book, cancel, slots, deadline, results))
+               for worker in range(args.threads)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    if server is not None:
+        server.shutdown()
+
+    attempts = sum(attempts for attempts, _, _ in results.values())
+    cancelled = sum(cancelled for _, _, cancelled in results.values())
+    acknowledged = {}
+    for _, booked, _ in results.values():
+        acknowledged.update(booked)
+    booked_total = len(acknowledged) + cancelled
+
+    per_slot = {}
+    for booking in index._by_id.values():
+        per_slot[booking["date"]] = per_slot.get(booking["date"], 0) + 1
+    over_capacity = sum(1 for count in per_slot.values() if count > args.capacity)
+    missing = [booking_id for booking_id in acknowledged if index.get(booking_id) is None]
+    journal_stats = index.journal.stats()
+    index.close()
+
+    replay_started = time.perf_counter()
+    replayed = BookingIndex(calendar, journal=BookingJournal(journal_path, fsync=not args.no_fsync))
+    replay_seconds = time.perf_counter() - replay_started
+    same = {b["id"]: b for b in replayed._by_id.values()} == {b["id"]: b for b in index._by_id.values()}
+    replayed.close()
+
+    print(f"target {args.target}, {args.threads} threads, {len(slots)} slots x capacity {args.capacity}, "
+          f"fsync {'off' if args.no_fsync else 'on'}, {elapsed:.1f}s")
+    print(f"attempts            {attempts:>10} ({attempts / elapsed:.0f}/s)")
+    print(f"bookings            {booked_total:>10} ({booked_total / elapsed:.0f}/s), {cancelled} cancelled")
+    print(f"fsyncs              {journal_stats['fsyncs']:>10} "
+          f"({journal_stats['written'] / max(1, journal_stats['fsyncs']):.1f} records per fsync), "
+          f"{journal_stats['snapshots']} snapshots")
+    print(f"over capacity       {over_capacity:>10}")
+    print(f"acknowledged, lost  {len(missing):>10}")
+    print(f"replay              {replay_seconds * 1000:>9.1f}ms, {len(replayed)} bookings, "
+          f"{'identical' if same else 'DIFFERENT'}")
+    if over_capacity or missing or not same:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""Append-only booking journal with group-committed fsyncs, snapshots and replay.
+
+BookingIndex writes every booking and cancellation to the journal as one JSON
+line while it holds its own lock, so the journal order is the order the index
+applied them in, and then waits outside that lock for the record to reach the
+disk. Whichever waiter finds no fsync running issues one for everything written
+so far; the others wait for it. Concurrent bookings therefore share fsyncs
+instead of queueing one each.
+
+The journal is split into numbered segments. Compaction starts a new segment
+and writes a snapshot of the index as of that point; the older segments are
+then deleted. With path "bookings" the files are:
+
+    bookings.snapshot      {"segment": n, "next_id": ..., "bookings": [...]}
+    bookings.journal.<n>   records written since that snapshot (and later segments)
+
+Replay loads the snapshot and applies the segments from its number on. A crash
+mid-write leaves at most a torn last line, which replay drops: that record was
+never acknowledged, because its fsync had not returned.
+"""
+# === Imports ===
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class BookingJournal:
+    def __init__(self, path, fsync=True):
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._synced_cond = threading.Condition(self._lock)
+        self._file = None
+        self.segment = 0
+        self._written = 0   # records written (sequence number of the last one)
+        self._synced = 0    # records known to be on disk
+        self._syncing = False
+        self.records = 0    # records in the current segment
+        self.fsyncs = 0
+        self.snapshots = 0
+
+    @property
+    def snapshot_path(self):
+        return f"{self.path}.snapshot"
+
+    def _segment_path(self, segment):
+        return f"{self.path}.journal.{segment}"
+
+    def _segments(self):
+        directory, prefix = os.path.split(f"{self.path}.journal.")
+        segments = []
+        for name in os.listdir(directory or "."):
+            if name.startswith(prefix) and name[len(prefix):].isdigit():
+                segments.append(int(name[len(prefix):]))
+        return sorted(segments)
+
+    def _fsync_dir(self):
+        if not self.fsync:
+            return
+        fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # === Replay ===
+    def load(self):
+        """The last snapshot (a dict as described above) and the records written after it, in order."""
+        snapshot = {"segment": 0, "next_id": 1, "bookings": []}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+        segments = [segment for segment in self._segments() if segment >= snapshot["segment"]]
+        records = []
+        for segment in segments:
+            records.extend(self._read_segment(segment))
+        self.segment = max(segments + [snapshot["segment"]])
+        return snapshot, records
+
+    def _read_segment(self, segment):
+        path = self._segment_path(segment)
+        records = []
+        with open(path, encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                if not line.endswith("\n"):
+                    logger.warning("Dropping torn record at %s:%d (never acknowledged)", path, number)
+                    break
+                records.append(json.loads(line))
+        return records
+
+    # === Writing ===
+    def write(self, record):
+        """Buffer one record; returns its sequence number for sync().
+
+        Callers serialize write() with the change it records (BookingIndex holds its lock).
+        """
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._written += 1
+            self.records += 1
+            return self._written
+
+    def sync(self, seq):
+        """Block until record `seq` is on disk; one fsync covers every record written before it."""
+        with self._lock:
+            while self._synced < seq:
+                if self._syncing:
+                    self._synced_cond.wait()
+                    continue
+                self._syncing = True
+                target = self._written
+                f = self._file
+                try:
+                    f.flush()
+                    self._lock.release()
+                    try:
+                        if self.fsync:
+                            os.fsync(f.fileno())
+                    finally:
+                        self._lock.acquire()
+                finally:
+                    self._syncing = False
+                    self._synced_cond.notify_all()
+                self._synced = max(self._synced, target)
+                if self.fsync:
+                    self.fsyncs += 1
+
+    def rotate(self):
+        """Sync and close the current segment, open the next one and return its number."""
+        with self._lock:
+            while self._syncing:
+                self._synced_cond.wait()
+            if self._file is not None:
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+                self._file.close()
+                self._synced = self._written
+                self._synced_cond.notify_all()
+            self.segment += 1
+            self._file = open(self._segment_path(self.segment), "a", encoding="utf-8")
+            self.records = 0
+        self._fsync_dir()
+        return self.segment
+
+    def save_snapshot(self, segment, next_id, bookings):
+        """Atomically replace the snapshot with the state as of the start of `segment`; drop older segments."""
+        tmp = f"{self.snapshot_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"segment": segment, "next_id": next_id, "bookings": bookings}, f, separators=(",", ":"))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        self._fsync_dir()
+        for old in self._segments():
+            if old < segment:
+                os.remove(self._segment_path(old))
+        self.snapshots += 1
+        logger.info("Booking snapshot written: %d bookings, journal segment %d", len(bookings), segment)
+
+    def close(self):
+        with self._lock:
+            while self._syncing:
+                self._synced_cond.wait()
+            if self._file is None:
+                return
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+            self._synced = self._written
+
+    def stats(self):
+        return {"segment": self.segment, "records": self.records, "written": self._written,
+                "fsyncs": self.fsyncs, "snapshots": self.snapshots}
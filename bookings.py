@@ -0,0 +1,197 @@
+"""Booking index for the scheduling service.
+
+Bookings are indexed by date -> time slot, so availability and conflict checks
+are dict lookups, with a customer -> bookings reverse index for the customer
+endpoints. A customer may hold any number of bookings, and a slot takes up to
+the calendar's capacity.
+
+Each date with a full slot also has an occupancy bitmap: bit i is set when
+slot i of calendar.slots(date) is at capacity. Free slots for a date, or for a
+whole range of dates, come from the calendar's slot tuple and that one int,
+without touching the bookings themselves.
+
+With a BookingJournal (booking_journal.py) the index is durable: it is rebuilt
+from the journal on creation, every change is journaled under the index lock,
+and book()/cancel() return only once their record is on disk. Once a journal
+segment reaches `snapshot_every` records a background thread compacts it into a
+snapshot.
+"""
+# === Imports ===
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from calendars import Calendar
+
+logger = logging.getLogger(__name__)
+
+ONE_DAY = timedelta(days=1)
+
+
+class BookingIndex:
+    def __init__(self, calendar=None, journal=None, snapshot_every=10000):
+        self.calendar = calendar or Calendar()
+        self.journal = journal
+        self.snapshot_every = snapshot_every
+        self._by_slot = {}      # "YYYY-MM-DD" -> {"HH:MM": [booking, ...]}
+        self._full = {}         # "YYYY-MM-DD" -> bitmap of the slots at capacity
+        self._by_customer = {}  # customer_id -> {booking_id: booking}
+        self._by_id = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._compacting = False
+        if journal is not None:
+            self._restore()
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def free_slots(self, day):
+        """Slots of datetime.date `day` that still take a booking."""
+        return self._free(self.calendar.slots(day), self._full.get(day.isoformat(), 0))
+
+    def free_slots_range(self, start, end):
+        """{date: free slots} for every day from datetime.date `start` through `end`."""
+        available = {}
+        day = start
+        while day <= end:
+            key = day.isoformat()
+            available[key] = self._free(self.calendar.slots(day), self._full.get(key, 0))
+            day += ONE_DAY
+        return available
+
+    @staticmethod
+    def _free(slots, full):
+        if not full:
+            return list(slots)
+        if full == (1 << len(slots)) - 1:
+            return []
+        return [slot for index, slot in enumerate(slots) if not full >> index & 1]
+
+    def book(self, customer_id, date, time, service):
+        """Insert a booking, or return None when the slot is full.
+
+        Raises ValueError when `time` is not a slot of `date` in the calendar.
+        """
+        if self.calendar.position(datetime.fromisoformat(date).date(), time) is None:
+            raise ValueError(f"{date} {time} is not a bookable slot")
+        with self._lock:
+            if len(self._by_slot.get(date, {}).get(time, ())) >= self.calendar.capacity:
+                return None
+            booking = {"id": str(self._next_id), "customer_id": customer_id, "date": f"{date} {time}",
+                       "service": service, "status": "booked",
+                       "created_at": datetime.now().isoformat(timespec="seconds")}
+            self._insert(booking)
+            seq = self.journal.write({"op": "book", "booking": booking}) if self.journal else None
+        self._commit(seq)
+        return booking
+
+    def cancel(self, booking_id):
+        with self._lock:
+            booking = self._remove(booking_id)
+            if booking is None:
+                return None
+            seq = self.journal.write({"op": "cancel", "id": booking_id}) if self.journal else None
+        self._commit(seq)
+        return booking
+
+    def _insert(self, booking):
+        date, time = booking["date"].split(" ")
+        taken = self._by_slot.setdefault(date, {}).setdefault(time, [])
+        taken.append(booking)
+        position = self.calendar.position(datetime.fromisoformat(date).date(), time)
+        # Replayed bookings may sit outside a since-changed calendar; they are kept but have no bit
+        if position is not None and len(taken) >= self.calendar.capacity:
+            self._full[date] = self._full.get(date, 0) | 1 << position
+        self._by_customer.setdefault(booking["customer_id"], {})[booking["id"]] = booking
+        self._by_id[booking["id"]] = booking
+        self._next_id = max(self._next_id, int(booking["id"]) + 1)
+
+    def _remove(self, booking_id):
+        booking = self._by_id.pop(booking_id, None)
+        if booking is None:
+            return None
+        date, time = booking["date"].split(" ")
+        day = self._by_slot[date]
+        taken = day[time]
+        taken.remove(booking)
+        if not taken:
+            del day[time]
+            if not day:
+                del self._by_slot[date]
+        position = self.calendar.position(datetime.fromisoformat(date).date(), time)
+        if position is not None:
+            full = self._full.get(date, 0) & ~(1 << position)
+            if full:
+                self._full[date] = full
+            else:
+                self._full.pop(date, None)
+        customer = self._by_customer[booking["customer_id"]]
+        del customer[booking_id]
+        if not customer:
+            del self._by_customer[booking["customer_id"]]
+        return booking
+
+    # === Durability ===
+    def _commit(self, seq):
+        """Wait for journal record `seq` to be on disk (outside the lock, so waiters share fsyncs)."""
+        if seq is None:
+            return
+        self.journal.sync(seq)
+        if self.journal.records >= self.snapshot_every and not self._compacting:
+            threading.Thread(target=self.compact, name="booking-compaction", daemon=True).start()
+
+    def _restore(self):
+        snapshot, records = self.journal.load()
+        for booking in snapshot["bookings"]:
+            self._insert(booking)
+        self._next_id = max(self._next_id, snapshot["next_id"])
+        for record in records:
+            if record["op"] == "book":
+                self._insert(record["booking"])
+            else:
+                self._remove(record["id"])
+        logger.info("Restored %d bookings (%d snapshotted, %d journal records replayed)",
+                    len(self._by_id), len(snapshot["bookings"]), len(records))
+        # A fresh segment: nothing is ever appended after a torn record, and the next replay starts here
+        self.compact()
+
+    def compact(self):
+        """Snapshot the index and drop the journal segments it covers; False if a compaction is running."""
+        with self._lock:
+            if self._compacting:
+                return False
+            self._compacting = True
+        try:
+            with self._lock:
+                bookings = list(self._by_id.values())
+                next_id = self._next_id
+                segment = self.journal.rotate()
+            self.journal.save_snapshot(segment, next_id, bookings)
+        except OSError as e:
+            # The journal still holds everything; the next compaction tries again
+            logger.error("Booking snapshot failed: %s", str(e))
+            return False
+        finally:
+            self._compacting = False
+        return True
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+    def for_customer(self, customer_id):
+        """The customer's bookings, oldest first."""
+        with self._lock:
+            bookings = list(self._by_customer.get(customer_id, {}).values())
+        return sorted(bookings, key=lambda b: int(b["id"]))
+
+    def get(self, booking_id):
+        with self._lock:
+            return self._by_id.get(booking_id)
+
+    def stats(self):
+        stats = {"bookings": len(self._by_id), "dates": len(self._by_slot)}
+        if self.journal is not None:
+            stats["journal"] = self.journal.stats()
+        return stats
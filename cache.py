@@ -0,0 +1,87 @@
+"""Expiring value cache with single-flight loading and refresh-ahead.
+
+Used for credentials and metadata that are expensive to fetch but change
+rarely (the WeChat access token, Facebook Page info). A loader returns
+(value, ttl_seconds). Concurrent misses for the same key share one load, and a
+value entering the last `refresh_ahead` fraction of its lifetime is refreshed
+in the background while callers keep getting the current value.
+"""
+# === Imports ===
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class RefreshingCache:
+    def __init__(self, refresh_ahead=0.1):
+        self.refresh_ahead = refresh_ahead
+        self._entries = {}  # key -> (value, refresh_at, expires_at)
+        self._flights = {}  # key -> _Flight for the load in progress
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.load_errors = 0
+
+    def get(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now < entry[2]:
+                self.hits += 1
+                if now >= entry[1] and key not in self._flights:
+                    self._flights[key] = _Flight()
+                    self.refreshes += 1
+                    threading.Thread(target=self._load, args=(key, loader), daemon=True).start()
+                return entry[0]
+            self.misses += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if leader:
+            self._load(key, loader)
+        else:
+            flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _load(self, key, loader):
+        with self._lock:
+            flight = self._flights[key]
+        try:
+            value, ttl = loader()
+            now = time.monotonic()
+            with self._lock:
+                self._entries[key] = (value, now + ttl * (1 - self.refresh_ahead), now + ttl)
+            flight.value = value
+        except Exception as e:
+            with self._lock:
+                self.load_errors += 1
+            logger.warning("Cache load failed for %s: %s", key, str(e))
+            flight.error = e
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "refreshes": self.refreshes, "load_errors": self.load_errors}
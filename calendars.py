@@ -0,0 +1,89 @@
+"""Working calendar for the scheduling service.
+
+A Calendar turns per-weekday opening hours, a slot length and blackout dates
+into the bookable "HH:MM" slots of any date, and says how many bookings one
+slot takes (capacity). The slot lists are built once per weekday, so every open
+date maps to one of seven tuples and a slot's position in it is fixed; that is
+what lets BookingIndex keep each date's full slots as a bitmap.
+
+The calendar is read from the JSON file named by SCHEDULING_CALENDAR, e.g.:
+
+    {"slot_minutes": 30, "capacity": 2, "blackouts": ["2025-12-25"],
+     "hours": {"mon": [["09:00", "12:00"], ["13:00", "17:00"]], "sat": [["10:00", "14:00"]]}}
+
+Weekdays left out of "hours" are closed. Without a file every day opens
+09:00-12:00 and 14:00-17:00 with one-hour slots, the former fixed slot list.
+"""
+# === Imports ===
+import json
+import logging
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+DEFAULT_HOURS = {weekday: [("09:00", "12:00"), ("14:00", "17:00")] for weekday in WEEKDAYS}
+
+
+def _minutes(clock):
+    hours, minutes = clock.split(":")
+    value = int(hours) * 60 + int(minutes)
+    if not 0 <= value <= 24 * 60:
+        raise ValueError(f"Invalid time of day: {clock}")
+    return value
+
+
+def _weekday_slots(ranges, slot_minutes):
+    """Start times of the slots that fit entirely inside the opening ranges, in order."""
+    starts = set()
+    for opens, closes in ranges:
+        start, end = _minutes(opens), _minutes(closes)
+        if start >= end:
+            raise ValueError(f"Opening range {opens}-{closes} is empty")
+        for minute in range(start, end - slot_minutes + 1, slot_minutes):
+            starts.add(minute)
+    return tuple(f"{minute // 60:02d}:{minute % 60:02d}" for minute in sorted(starts))
+
+
+class Calendar:
+    def __init__(self, hours=None, slot_minutes=60, capacity=1, blackouts=()):
+        if slot_minutes <= 0 or capacity < 1:
+            raise ValueError("slot_minutes and capacity must be positive")
+        hours = DEFAULT_HOURS if hours is None else hours
+        unknown = set(hours) - set(WEEKDAYS)
+        if unknown:
+            raise ValueError(f"Unknown weekdays in calendar hours: {sorted(unknown)}")
+        self.slot_minutes = slot_minutes
+        self.capacity = capacity
+        self.blackouts = frozenset(blackouts)  # datetime.date
+        self._slots = tuple(_weekday_slots(hours.get(weekday, ()), slot_minutes) for weekday in WEEKDAYS)
+        self._positions = tuple({slot: index for index, slot in enumerate(slots)} for slots in self._slots)
+
+    def slots(self, day):
+        """The bookable slots of datetime.date `day`, empty when closed."""
+        if day in self.blackouts:
+            return ()
+        return self._slots[day.weekday()]
+
+    def position(self, day, time):
+        """Index of `time` in slots(day), or None when it cannot be booked that day."""
+        if day in self.blackouts:
+            return None
+        return self._positions[day.weekday()].get(time)
+
+    def stats(self):
+        return {"slot_minutes": self.slot_minutes, "capacity": self.capacity, "blackouts": len(self.blackouts),
+                "weekly_slots": sum(len(slots) for slots in self._slots)}
+
+
+def load_calendar(path):
+    """The Calendar described by the JSON file at `path` (empty path: the default calendar)."""
+    if not path:
+        return Calendar()
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    calendar = Calendar(hours=config.get("hours"), slot_minutes=int(config.get("slot_minutes", 60)),
+                        capacity=int(config.get("capacity", 1)),
+                        blackouts=[date.fromisoformat(day) for day in config.get("blackouts", [])])
+    logger.info("Loaded scheduling calendar from %s: %s", path, calendar.stats())
+    return calendar
@@ -0,0 +1,91 @@
+"""Product catalog index: every way the bot may refer to a product, mapped to its id.
+
+The inventory service keys products by id ("chatbot_basic"); users and quick
+replies name them in other ways. ProductCatalog resolves all of these with dict
+lookups:
+
+    chatbot_basic, check_chatbot_basic   the id, bare or as a quick-reply payload
+    basic-chatbot, basic chatbot         the slug of the name, or the name itself
+    basic, check_basic                   aliases: configured ones, plus every word of
+                                         the id or name that no other product uses
+
+The catalog is filled from the inventory change feed (see InventoryCache), so
+it is loaded once and then updated product by product as the feed reports
+changes; the inventory menu's quick replies are generated from it.
+"""
+# === Imports ===
+import re
+import threading
+
+CHECK_PREFIX = "check_"
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def slugify(text):
+    return _NON_WORD.sub("-", text.lower()).strip("-")
+
+
+def _words(product_id, name):
+    return set(_NON_WORD.split(f"{product_id} {name}".lower())) - {""}
+
+
+class ProductCatalog:
+    def __init__(self, aliases=None):
+        self.aliases = dict(aliases or {})  # configured alias -> product id; these win over derived ones
+        self._names = {}   # product id -> name, in the order products were first seen
+        self._lookup = {}  # every key above -> product id
+        self._lock = threading.Lock()
+        self.version = 0   # bumped whenever a product is added or renamed
+
+    def __len__(self):
+        return len(self._names)
+
+    def update(self, products):
+        """Add products or record new names from (product id, name) pairs; one rebuild per call at most.
+
+        Stock-only changes (name unchanged) cost a dict lookup each.
+        """
+        changed = [(product_id, name) for product_id, name in products if self._names.get(product_id) != name]
+        if not changed:
+            return
+        with self._lock:
+            self._names.update(changed)
+            self._rebuild()
+
+    def _rebuild(self):
+        # Derived aliases depend on every product's words, so the whole map is rebuilt on a change
+        lookup = {}
+        word_owners = {}
+        for product_id, name in self._names.items():
+            for word in _words(product_id, name):
+                word_owners.setdefault(word, set()).add(product_id)
+        for word, owners in word_owners.items():
+            if len(owners) == 1:
+                lookup[word] = next(iter(owners))
+        for product_id, name in self._names.items():
+            lookup[slugify(name)] = product_id
+            lookup[name.lower()] = product_id
+            lookup[slugify(product_id)] = product_id
+            lookup[product_id.lower()] = product_id
+        lookup.update((alias.lower(), product_id) for alias, product_id in self.aliases.items())
+        self._lookup = lookup
+        self.version += 1
+
+    def resolve(self, text):
+        """The product id `text` refers to (id, payload, name, slug or alias), or None."""
+        key = text.strip().lower()
+        if key.startswith(CHECK_PREFIX):
+            key = key[len(CHECK_PREFIX):]
+        lookup = self._lookup
+        return lookup.get(key) or lookup.get(slugify(key))
+
+    def name(self, product_id):
+        return self._names.get(product_id)
+
+    def quick_replies(self, limit):
+        """Quick replies checking the first `limit` products, titled with their names."""
+        return [{"title": name, "payload": f"{CHECK_PREFIX}{product_id}"}
+                for product_id, name in list(self._names.items())[:limit]]
+
+    def stats(self):
+        return {"products": len(self._names), "lookup_keys": len(self._lookup), "version": self.version}
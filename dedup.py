@@ -0,0 +1,83 @@
+"""Drops webhook events Meta has already delivered.
+
+Meta redelivers a batch when the webhook is slow or answers non-2xx, so the
+same message can arrive twice. Each messaging event gets a key (message.mid,
+or sender + timestamp for postbacks); DedupIndex remembers keys for a time
+window, bounded by a key count, and reports whether a key was seen before.
+
+The index is per process. Run one worker process, or accept that a
+redelivery landing on a different worker gets through.
+"""
+# === Imports ===
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def event_key(messaging_event):
+    """Stable identity of a messaging event, or None when it carries nothing to key on."""
+    message = messaging_event.get("message")
+    if message is not None:
+        mid = message.get("mid")
+        return f"m:{mid}" if mid else None
+    if "postback" in messaging_event:
+        timestamp = messaging_event.get("timestamp")
+        sender_id = messaging_event.get("sender", {}).get("id")
+        return f"p:{sender_id}:{timestamp}" if timestamp and sender_id else None
+    return None
+
+
+class DedupIndex:
+    """Time-windowed LRU of event keys: at most `max_keys`, each forgotten `window` seconds after first seen."""
+
+    def __init__(self, window=86400, max_keys=100000):
+        self.window = window
+        self.max_keys = max_keys
+        # hash(key) -> first seen (monotonic), oldest first. Storing the 64-bit hash instead of the
+        # ~100-char mid keeps an entry small; a collision would need ~4e9 live keys to be likely.
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.duplicates = 0
+        self.evicted = 0
+
+    def seen(self, key):
+        """True if `key` was recorded within the window; otherwise record it and return False."""
+        digest = hash(key)
+        now = time.monotonic()
+        with self._lock:
+            self.checked += 1
+            self._purge_locked(now)
+            if digest in self._seen:
+                self.duplicates += 1
+                return True
+            self._seen[digest] = now
+            if len(self._seen) > self.max_keys:
+                self._seen.popitem(last=False)
+                self.evicted += 1
+            return False
+
+    def forget(self, key):
+        """Un-record a key whose event was not handled, so Meta's redelivery is processed."""
+        with self._lock:
+            self._seen.pop(hash(key), None)
+
+    def _purge_locked(self, now):
+        cutoff = now - self.window
+        while self._seen:
+            digest, first_seen = next(iter(self._seen.items()))
+            if first_seen > cutoff:
+                break
+            del self._seen[digest]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._seen),
+                "checked": self.checked,
+                "duplicates": self.duplicates,
+                "evicted": self.evicted,
+            }
@@ -0,0 +1,309 @@
+"""Menu and form-flow tables for the bot, compiled once into O(1) dispatch maps.
+
+Static replies, the three form flows and the keywords that trigger the dynamic
+handlers (inventory, scheduling, page info) are declared here as data. app.py
+compiles them at startup with the business variables and its handler functions;
+process_message then resolves every message with at most two dict lookups and a
+prefix check (for payloads built at runtime, such as check_<product id>).
+Free text that matches no keyword goes through the intent matcher (intents.py)
+before it gets the fallback reply.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from intents import IntentMatcher
+
+# === Route Kinds ===
+REPLY = "reply"            # target: Reply
+FORM_START = "form_start"  # target: FormStep that opens the flow
+FORM_STEP = "form_step"    # target: FormStep for the field the user is answering
+HANDLER = "handler"        # target: handler function registered by the server
+
+# prebuilt: whatever the server's `prebuild(text, quick_replies)` made of the reply at compile time
+# (app.py: the serialized Send API message), so sending it does not rebuild the payload
+Reply = namedtuple("Reply", "text quick_replies prebuilt", defaults=(None,))
+# field: where the answer is stored (None when opening a flow); reply: what to send next and
+# next_state: where to move (both None on the last field, which sends `done` instead)
+FormStep = namedtuple("FormStep", "category field reply next_state done")
+
+# === Quick Reply Sets ===
+MAIN_MENU = [{"title": "Services", "payload": "services"},
+             {"title": "FAQs", "payload": "faq"},
+             {"title": "Support", "payload": "support"},
+             {"title": "Sales", "payload": "sales"},
+             {"title": "Contact Us", "payload": "contact"},
+             {"title": "Page Info", "payload": "page_info"}]
+BACK_TO_MAIN = [{"title": "Back to Main Menu", "payload": "start"}]
+BACK_TO_FAQ = [{"title": "Back to FAQs", "payload": "faq"}] + BACK_TO_MAIN
+BACK_TO_SALES = [{"title": "Back to Sales", "payload": "sales"}] + BACK_TO_MAIN
+URGENCY = [{"title": "Urgent", "payload": "urgent"},
+           {"title": "Not Urgent", "payload": "not_urgent"}]
+
+# Commands that drop any in-progress conversation state before dispatch
+RESET_KEYWORDS = frozenset(['start', 'get_started', 'welcome_message', 'back to main menu'])
+
+# === Static Replies ===
+# name: (keywords, text template, quick replies); templates are filled from the business variables
+STATIC_REPLIES = {
+    "welcome": (['hi', 'hello', 'start', 'get_started', 'welcome_message'],
+                "Hey there! Welcome to {business_name}! How can I help?", MAIN_MENU),
+    "services": (['services', 'service'],
+                 "We offer automated chatbots for businesses! How can we assist you?",
+                 [{"title": "Learn More", "payload": "learn_more"}] + BACK_TO_MAIN),
+    "learn_more": (['learn_more', 'learn more'],
+                   "Learn more about our services: We provide 24/7 customer support, inventory management, and "
+                   "scheduling solutions for businesses like {business_name}. Visit {product_catalog_link} for "
+                   "details or contact us at {support_email}!", BACK_TO_MAIN),
+    "faq": (['faq', 'faqs'],
+            "Here are some FAQs:\n1. What services do you offer?\n2. How much does it cost?\n3. Shipping info?",
+            [{"title": "Services", "payload": "services_info"},
+             {"title": "Cost", "payload": "cost"},
+             {"title": "Shipping", "payload": "shipping"}] + BACK_TO_MAIN),
+    "services_info": (['services_info', 'what services do you offer'],
+                      "We offer automated chatbots for businesses, providing 24/7 customer support, inventory "
+                      "management, and scheduling solutions.", BACK_TO_FAQ),
+    "cost": (['cost', 'how much does it cost'],
+             "Our chatbot setup starts at {base_price}. Subscription plans available.", BACK_TO_FAQ),
+    "shipping": (['shipping', 'ship', 'shipping info'],
+                 "Shipping takes {shipping_days} days. Free over {free_shipping_threshold}!", BACK_TO_FAQ),
+    "support": (['support', 'help'],
+                "Let’s solve your issue! What’s the problem?",
+                [{"title": "Order Issue", "payload": "order_issue"},
+                 {"title": "Technical Issue", "payload": "tech_issue"}] + BACK_TO_MAIN),
+    "contact": (['contact', 'contact us'],
+                "Email: {support_email}\nPhone: {support_phone}", BACK_TO_MAIN),
+    "sales": (['sales'],
+              "Interested in our products? What can I help with?",
+              [{"title": "Products", "payload": "products"},
+               {"title": "Offers", "payload": "offers"},
+               {"title": "Lead Capture", "payload": "lead"}] + BACK_TO_MAIN),
+    "products": (['products'], "Check our products: {product_catalog_link}", BACK_TO_SALES),
+    "offers": (['offers'], "Get 20% off with code {promo_code}!", BACK_TO_SALES),
+}
+
+FALLBACK_REPLY = Reply("Sorry, I didn’t understand that. Try selecting an option or type 'start'.", MAIN_MENU)
+
+# === Form Flows ===
+# category: (trigger keywords, [(state, field, prompt, quick replies)], completion text)
+# Each prompt asks for the field stored when the user answers in that state.
+FORMS = {
+    "Order Issue": (['order_issue', 'order issue'], [
+        ("order_number", "order_number", "Please provide your order number.", None),
+        ("order_name", "name", "Please provide your name.", None),
+        ("order_email", "email", "Please provide your email address.", None),
+        ("order_phone", "phone", "Please provide your phone number.", None),
+        ("order_urgency", "urgency", "How urgent is this? (Urgent/Not Urgent)", URGENCY),
+        ("order_business", "business_name", "Please provide your business name.", None),
+        ("order_website", "website", "Please provide your website (if applicable).", None),
+    ], "Thank you! A team member will follow up soon regarding your order issue."),
+    "Technical Issue": (['tech_issue', 'technical_issue', 'technical issues'], [
+        ("tech_name", "name", "Please provide your name.", None),
+        ("tech_email", "email", "Please provide your email address.", None),
+        ("tech_phone", "phone", "Please provide your phone number.", None),
+        ("tech_urgency", "urgency", "How urgent is this? (Urgent/Not Urgent)", URGENCY),
+        ("tech_business", "business_name", "Please provide your business name.", None),
+        ("tech_website", "website", "Please provide your website (if applicable).", None),
+        ("tech_description", "issue_description", "Please describe your technical issue.", None),
+    ], "Thank you! A team member will follow up soon regarding your technical issue."),
+    "Lead Capture": (['lead'], [
+        ("lead_name", "name", "Please provide your name.", None),
+        ("lead_email", "email", "Please provide your email address.", None),
+        ("lead_phone", "phone", "Please provide your phone number.", None),
+        ("lead_business", "business_name", "Please provide your business name.", None),
+        ("lead_website", "website", "Please provide your website (if applicable).", None),
+    ], "Thank you! We’ll reach out soon with more information."),
+}
+
+# === Dynamic Handlers ===
+# handler name: keywords that trigger it; app.py supplies the implementations
+HANDLER_KEYWORDS = {
+    "inventory_menu": ['inventory'],
+    "inventory_check": ['check_basic', 'check_pro', 'check_enterprise'],
+    "schedule": ['schedule'],
+    "page_info": ['page_info'],
+}
+# handler name: payload prefix that triggers it (quick replies built at runtime, e.g. check_<product id>)
+HANDLER_PREFIXES = {
+    "inventory_check": "check_",
+}
+# conversation state: handler that consumes the next message
+HANDLER_STATES = {
+    "waiting_product": "inventory_check",
+    "waiting_schedule_date": "schedule_date",
+    "waiting_schedule_time": "schedule_time",
+}
+
+# === Free-Text Intents ===
+# keyword: other ways users say it. With every keyword above these are indexed by intents.IntentMatcher,
+# which routes free text that matches no keyword exactly as the keyword it most likely means.
+INTENT_PHRASES = {
+    "hi": ["hey", "hey there", "hello there", "good morning", "good afternoon", "good evening", "greetings"],
+    "services": ["what do you offer", "what do you do", "your services", "chatbot services"],
+    "learn_more": ["tell me more", "more information", "more info", "details"],
+    "faq": ["questions", "frequently asked questions", "common questions"],
+    "cost": ["price", "prices", "pricing", "how much", "how much is it", "what does it cost", "fees", "plans",
+             "subscription", "setup cost"],
+    "shipping": ["delivery", "deliver", "how long does shipping take", "shipping time", "when will it arrive"],
+    "support": ["i need help", "customer support", "customer service", "assistance", "problem"],
+    "contact": ["email", "phone", "phone number", "call you", "talk to a person", "speak to someone", "reach you",
+                "human", "agent", "real person"],
+    "sales": ["buy", "purchase", "i want to buy", "sales team"],
+    "products": ["catalog", "product list", "what do you sell", "product"],
+    "offers": ["discount", "promo", "promo code", "coupon", "deals", "deal"],
+    "inventory": ["stock", "in stock", "availability", "available products"],
+    "order issue": ["problem with my order", "my order", "order problem", "where is my order", "wrong order",
+                    "refund", "return", "order"],
+    "technical issues": ["bug", "not working", "broken", "error", "technical problem", "tech support", "crash"],
+    "lead": ["sign up", "get in touch", "interested", "quote", "request a quote"],
+    "check_basic": ["basic chatbot", "basic plan", "basic"],
+    "check_pro": ["pro chatbot", "pro plan", "pro"],
+    "check_enterprise": ["enterprise chatbot", "enterprise plan", "enterprise"],
+    "schedule": ["book", "book an appointment", "appointment", "consultation", "schedule a call", "meeting",
+                 "book a call"],
+    "page_info": ["who are you", "page info", "about the page"],
+}
+
+# Texts the handlers fill in at runtime (shared by app.py and asgi_app.py)
+INVENTORY_STATUS = "{product}: {quantity} available ({availability}), Price: {price}"
+INVENTORY_ERROR = "Sorry, couldn’t check inventory. Try again later."
+INVENTORY_PROMPT = "Which product would you like to check? Pick one or type its name."
+INVENTORY_UNKNOWN = "Sorry, I couldn’t find that product. Pick one of these:"
+# Offered by the inventory menu until the product catalog has loaded from the inventory service
+DEFAULT_PRODUCT_CHOICES = [{"title": "Basic Chatbot", "payload": "check_basic"},
+                           {"title": "Pro Chatbot", "payload": "check_pro"},
+                           {"title": "Enterprise Chatbot", "payload": "check_enterprise"}]
+SCHEDULE_PROMPT = "When would you like to schedule a consultation? Enter a date (YYYY-MM-DD)."
+SCHEDULE_PICK_DATE = "When would you like to schedule a consultation? Pick a date or enter one (YYYY-MM-DD)."
+SCHEDULE_NO_DATES = "No free slots in the next {days} days. Enter a later date (YYYY-MM-DD) to check it."
+SCHEDULE_SLOTS = "Available slots on {date}: {slots}. Pick a time (HH:MM)."
+MAX_QUICK_REPLIES = 13  # Messenger's limit per message
+SCHEDULE_NO_SLOTS = "No slots available on that date. Try another."
+SCHEDULE_BAD_DATE = "Invalid date or error. Use YYYY-MM-DD."
+SCHEDULE_BOOKED = "Appointment booked for {date}. Anything else?"
+SCHEDULE_FAILED = "Couldn’t book. Slot unavailable or invalid time. Try again."
+PAGE_INFO = "Page Info:\nName: {name}\nAbout: {about}"
+PAGE_INFO_ERROR = "Error fetching page info."
+PAGE_INFO_DENIED = "Bot lacks necessary permissions or token is invalid to fetch page info."
+
+
+def date_choices(available, limit):
+    """Quick replies for the first `limit` dates with a free slot in a /scheduling/available range."""
+    days = [day for day, slots in sorted(available.items()) if slots][:min(limit, MAX_QUICK_REPLIES - 1)]
+    return [{"title": datetime.strptime(day, "%Y-%m-%d").strftime("%a %d %b"), "payload": day}
+            for day in days] + BACK_TO_MAIN
+
+
+def time_choices(slots):
+    """Quick replies for a date's free slots (as many as fit next to Back to Main Menu)."""
+    return [{"title": slot, "payload": slot} for slot in slots[:MAX_QUICK_REPLIES - 1]] + BACK_TO_MAIN
+
+
+# === Compilation ===
+class DialogueTable:
+    """Compiled keyword and state maps; resolve() is two dict lookups and a few prefix checks at most."""
+
+    def __init__(self, keywords, states, fallback=FALLBACK_REPLY, intents=None, prefixes=()):
+        self.keywords = keywords
+        self.states = states
+        self.fallback = (REPLY, fallback)
+        self.intents = intents
+        self.prefixes = prefixes  # ((prefix, route), ...), tried after keywords and states
+
+    def resolve(self, message, state=None):
+        route = self.keywords.get(message)
+        if route is None and state is not None:
+            route = self.states.get(state)
+        if route is None:
+            for prefix, prefixed in self.prefixes:
+                if message.startswith(prefix):
+                    return prefixed
+        return route or self.fallback
+
+    def match_intent(self, message):
+        """(keyword, route) for free text the intent matcher recognises, else None."""
+        keyword = self.intents.match(message) if self.intents is not None else None
+        if keyword is None:
+            return None
+        return keyword, self.keywords[keyword]
+
+    def route(self, message, state=None):
+        """(message, kind, target): resolve(), then free text the fallback would get goes through match_intent().
+
+        A matched message is replaced by its keyword, which is what handlers expect (e.g. "check_pro").
+        """
+        route = self.resolve(message, state)
+        if route is self.fallback:
+            intent = self.match_intent(message)
+            if intent is not None:
+                message, route = intent
+        return (message,) + route
+
+
+def intent_phrases():
+    """{phrase: keyword} for every routed keyword and INTENT_PHRASES; the keywords come first."""
+    keywords = [keyword for keyword_list, _, _ in STATIC_REPLIES.values() for keyword in keyword_list]
+    keywords += [keyword for keyword_list, _, _ in FORMS.values() for keyword in keyword_list]
+    keywords += [keyword for keyword_list in HANDLER_KEYWORDS.values() for keyword in keyword_list]
+    phrases = {keyword: keyword for keyword in keywords}
+    for keyword, extra in INTENT_PHRASES.items():
+        if keyword not in phrases:
+            raise ValueError(f"Intent phrases given for unknown keyword '{keyword}'")
+        for phrase in extra:
+            phrases.setdefault(phrase, keyword)
+    return phrases
+
+
+_intents = None
+
+
+def intent_matcher():
+    """The IntentMatcher over intent_phrases(); the same for every table, so it is built once."""
+    global _intents
+    if _intents is None:
+        _intents = IntentMatcher(intent_phrases())
+    return _intents
+
+
+def _add_keyword(table, keyword, route):
+    if keyword in table:
+        raise ValueError(f"Keyword '{keyword}' is routed twice")
+    table[keyword] = route
+
+
+def compile_routes(variables, handlers, prebuild=None):
+    """Build the DialogueTable for one set of business variables and handler functions."""
+    def make_reply(text, quick_replies):
+        return Reply(text, quick_replies, prebuild(text, quick_replies) if prebuild else None)
+
+    keywords = {}
+    states = {}
+    for keyword_list, template, quick_replies in STATIC_REPLIES.values():
+        reply = make_reply(template.format(**variables), quick_replies)
+        for keyword in keyword_list:
+            _add_keyword(keywords, keyword, (REPLY, reply))
+
+    for category, (keyword_list, fields, done_text) in FORMS.items():
+        done = make_reply(done_text, BACK_TO_MAIN)
+        for index, (state, field, _, _) in enumerate(fields):
+            if index + 1 < len(fields):
+                next_state, _, prompt, quick_replies = fields[index + 1]
+                step = FormStep(category, field, make_reply(prompt, quick_replies), next_state, done)
+            else:
+                step = FormStep(category, field, None, None, done)
+            if state in states:
+                raise ValueError(f"State '{state}' is routed twice")
+            states[state] = (FORM_STEP, step)
+        first_state, _, prompt, quick_replies = fields[0]
+        start = FormStep(category, None, make_reply(prompt, quick_replies), first_state, done)
+        for keyword in keyword_list:
+            _add_keyword(keywords, keyword, (FORM_START, start))
+
+    for name, keyword_list in HANDLER_KEYWORDS.items():
+        for keyword in keyword_list:
+            _add_keyword(keywords, keyword, (HANDLER, handlers[name]))
+    for state, name in HANDLER_STATES.items():
+        if state in states:
+            raise ValueError(f"State '{state}' is routed twice")
+        states[state] = (HANDLER, handlers[name])
+    prefixes = tuple((prefix, (HANDLER, handlers[name])) for name, prefix in HANDLER_PREFIXES.items())
+    return DialogueTable(keywords, states, make_reply(*FALLBACK_REPLY[:2]), intent_matcher(), prefixes)
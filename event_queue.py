@@ -0,0 +1,123 @@
+# === Imports ===
+import logging
+import queue
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+# === Webhook Event Queue ===
+class EventQueue:
+    """Worker pool that drains webhook messaging events off the request path.
+
+    Every sender is pinned to one worker (by a stable hash of the sender id), so a
+    single user's events are always handled one at a time and in arrival order.
+    """
+
+    def __init__(self, handler, workers=4, maxsize=10000):
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        per_worker = max(1, int(maxsize) // self.workers)
+        self._queues = [queue.Queue(per_worker) for _ in range(self.workers)]
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._latency_last = 0.0
+
+    def start(self):
+        with self._start_lock:
+            if self._threads:
+                return
+            for index, q in enumerate(self._queues):
+                thread = threading.Thread(target=self._run, args=(q,), name=f"webhook-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            logger.info("Started %d webhook workers", self.workers)
+
+    def _shard(self, sender_id):
+        return self._queues[zlib.crc32(str(sender_id).encode("utf-8")) % self.workers]
+
+    def submit(self, sender_id, *args, **kwargs):
+        """Queue an event for sender_id; returns False when that sender's worker queue is full."""
+        if not self._threads:
+            self.start()
+        try:
+            self._shard(sender_id).put_nowait((time.monotonic(), sender_id, args, kwargs))
+        except queue.Full:
+            with self._stats_lock:
+                self.rejected += 1
+            return False
+        with self._stats_lock:
+            self.enqueued += 1
+        return True
+
+    def _run(self, q):
+        while True:
+            item = q.get()
+            if item is _STOP:
+                q.task_done()
+                break
+            queued_at, sender_id, args, kwargs = item
+            failed = False
+            try:
+                self.handler(sender_id, *args, **kwargs)
+            except Exception:
+                failed = True
+                logger.exception("Webhook worker failed to process event for sender_id: %s", sender_id)
+            finally:
+                q.task_done()
+            latency = time.monotonic() - queued_at
+            with self._stats_lock:
+                self.processed += 1
+                self.failed += failed
+                self._latency_total += latency
+                self._latency_last = latency
+                if latency > self._latency_max:
+                    self._latency_max = latency
+
+    def depth(self):
+        return sum(q.qsize() for q in self._queues)
+
+    def join(self, timeout=None):
+        """Wait until every queued event has been handled; returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.depth() or any(q.unfinished_tasks for q in self._queues):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def stop(self, timeout=None):
+        for q in self._queues:
+            q.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def stats(self):
+        with self._stats_lock:
+            processed = self.processed
+            return {
+                "workers": self.workers,
+                "depth": self.depth(),
+                "depth_per_worker": [q.qsize() for q in self._queues],
+                "enqueued": self.enqueued,
+                "processed": processed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "drain_latency_ms": {
+                    "avg": round(self._latency_total / processed * 1000, 3) if processed else 0.0,
+                    "max": round(self._latency_max * 1000, 3),
+                    "last": round(self._latency_last * 1000, 3),
+                },
+            }
@@ -0,0 +1,311 @@
+"""Shared outbound HTTP client: pooled keep-alive connections, timeouts, retries and circuit breakers.
+
+One HttpClient is created per process. It reuses TCP/TLS connections per host,
+applies connect/read timeouts to every call, retries transient failures with
+jittered exponential backoff, and trips a per-host circuit breaker when a
+downstream keeps failing so callers fail fast instead of stalling the webhook.
+
+AsyncHttpClient applies the same rules on an httpx.AsyncClient for the asyncio
+server (asgi_app.py); httpx is only needed there.
+
+Under an active trace (tracing.py) both clients time every attempt as a span
+and send the trace id in the X-Trace-Id header.
+"""
+# === Imports ===
+import asyncio
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+import tracing
+
+try:
+    import httpx
+except ImportError:  # only AsyncHttpClient needs it
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+RETRY_STATUSES = frozenset([502, 503, 504])
+
+# "client" is the HttpClient's name, telling apart clients that call the same host
+OUTBOUND_SECONDS = metrics.histogram("http_client_request_seconds", "Latency of outbound HTTP calls, per attempt.",
+                                     ("client", "host", "method", "status"))
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without touching the network while a host's circuit is open."""
+
+
+# === Circuit Breaker ===
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures; lets one probe through after `reset_timeout`."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning("Circuit opened after %d consecutive failures", self.failures)
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def release(self):
+        """End a call that got no answer either way (cancelled, or failed before reaching the host)."""
+        with self._lock:
+            self._probing = False
+
+
+# === Per-Host Stats ===
+class HostStats:
+    __slots__ = ("requests", "errors", "retries", "short_circuited", "latency_total", "latency_max")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.short_circuited = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "short_circuited": self.short_circuited,
+            "latency_ms": {
+                "avg": round(self.latency_total / self.requests * 1000, 3) if self.requests else 0.0,
+                "max": round(self.latency_max * 1000, 3),
+            },
+        }
+
+
+# === Client ===
+class _HostTracker:
+    """Per-host circuit breakers and stats shared by the sync and async clients."""
+
+    def __init__(self, failure_threshold, reset_timeout, name):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _host_state(self, host):
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+                self._stats[host] = HostStats()
+            return self._breakers[host], self._stats[host]
+
+    def _short_circuit(self, stats, host):
+        with self._lock:
+            stats.short_circuited += 1
+        return CircuitOpenError(f"Circuit open for {host}")
+
+    def _count_retry(self, stats, attempt):
+        with self._lock:
+            stats.retries += 1
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    def _record(self, stats, started, error, host, method, status="error"):
+        latency = time.monotonic() - started
+        OUTBOUND_SECONDS.observe(latency, self.name, host, method, status)
+        with self._lock:
+            stats.requests += 1
+            stats.errors += error
+            stats.latency_total += latency
+            if latency > stats.latency_max:
+                stats.latency_max = latency
+
+    def stats(self):
+        with self._lock:
+            return {host: dict(self._stats[host].as_dict(), circuit=self._breakers[host].state)
+                    for host in self._stats}
+
+
+class HttpClient(_HostTracker):
+    def __init__(self, connect_timeout=3.05, read_timeout=10.0, retries=2, backoff=0.2, pool_size=20,
+                 failure_threshold=5, reset_timeout=30.0, name="default"):
+        super().__init__(failure_threshold, reset_timeout, name)
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        # One urllib3 pool per host, each keeping up to pool_size idle keep-alive connections
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, url, **kwargs):
+        method = method.upper()
+        parts = urlsplit(url)
+        host = parts.netloc
+        breaker, stats = self._host_state(host)
+        kwargs["headers"] = tracing.headers(kwargs.get("headers"))
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                raise self._short_circuit(stats, host)
+            span = tracing.span(f"{method} {host}", path=parts.path, attempt=attempt)
+            started = time.monotonic()
+            try:
+                with span:
+                    response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                self._record(stats, started, True, host, method)
+                breaker.record_failure()
+                retryable = method in IDEMPOTENT_METHODS or isinstance(e, requests.exceptions.ConnectTimeout)
+                if not retryable or attempt >= self.retries:
+                    raise
+                logger.warning("%s %s failed (%s), retrying", method, host, type(e).__name__)
+            except BaseException:
+                # Without this a half-open breaker would keep waiting for this probe's outcome forever
+                breaker.release()
+                raise
+            else:
+                span.attrs["status"] = response.status_code
+                failed = response.status_code >= 500
+                self._record(stats, started, failed, host, method, str(response.status_code))
+                if failed:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if not (response.status_code in RETRY_STATUSES and method in IDEMPOTENT_METHODS
+                        and attempt < self.retries):
+                    return response
+                logger.warning("%s %s returned %d, retrying", method, host, response.status_code)
+            attempt += 1
+            time.sleep(self._count_retry(stats, attempt))
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+# === Async Client ===
+class AsyncHttpClient(_HostTracker):
+    """HttpClient for asyncio code: one httpx.AsyncClient, same timeouts, retries and breakers.
+
+    Failures raise httpx.HTTPError (or CircuitOpenError while a host's circuit is open).
+    Create it inside the running event loop and close it with aclose().
+    """
+
+    def __init__(self, connect_timeout=3.05, read_timeout=10.0, retries=2, backoff=0.2, pool_size=20,
+                 failure_threshold=5, reset_timeout=30.0, name="default"):
+        if httpx is None:
+            raise RuntimeError("AsyncHttpClient requires httpx (pip install httpx)")
+        super().__init__(failure_threshold, reset_timeout, name)
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.client = httpx.AsyncClient(timeout=self.timeout, limits=httpx.Limits(
+            max_connections=None, max_keepalive_connections=None))
+        self._gates = {}
+
+    def _gate(self, host):
+        # At most pool_size calls in flight per host, waiting here rather than in httpcore's
+        # pool, whose scheduling cost grows with every queued request and open connection
+        gate = self._gates.get(host)
+        if gate is None:
+            gate = self._gates[host] = asyncio.Semaphore(self.pool_size)
+        return gate
+
+    async def request(self, method, url, **kwargs):
+        method = method.upper()
+        parts = urlsplit(url)
+        host = parts.netloc
+        breaker, stats = self._host_state(host)
+        kwargs["headers"] = tracing.headers(kwargs.get("headers"))
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                raise self._short_circuit(stats, host)
+            # The span includes any wait for the host's gate: the conversation waits for it too
+            span = tracing.span(f"{method} {host}", path=parts.path, attempt=attempt)
+            try:
+                with span:
+                    async with self._gate(host):
+                        started = time.monotonic()
+                        response = await self.client.request(method, url, **kwargs)
+            except httpx.HTTPError as e:
+                self._record(stats, started, True, host, method)
+                breaker.record_failure()
+                retryable = method in IDEMPOTENT_METHODS or isinstance(e, httpx.ConnectTimeout)
+                if not retryable or attempt >= self.retries:
+                    raise
+                logger.warning("%s %s failed (%s), retrying", method, host, type(e).__name__)
+            except BaseException:
+                # Cancelled (e.g. while waiting for the gate): free the half-open probe for the next call
+                breaker.release()
+                raise
+            else:
+                span.attrs["status"] = response.status_code
+                failed = response.status_code >= 500
+                self._record(stats, started, failed, host, method, str(response.status_code))
+                if failed:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if not (response.status_code in RETRY_STATUSES and method in IDEMPOTENT_METHODS
+                        and attempt < self.retries):
+                    return response
+                logger.warning("%s %s returned %d, retrying", method, host, response.status_code)
+            attempt += 1
+            await asyncio.sleep(self._count_retry(stats, attempt))
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def aclose(self):
+        await self.client.aclose()
@@ -0,0 +1,121 @@
+"""Typo-tolerant intent matching for free-text messages.
+
+IntentMatcher maps a message such as "how much does setup cost?" or "shiping
+time" to the dialogue keyword it most likely means ("cost", "shipping"). It is
+built once from phrases (the dialogue keywords plus dialogue.INTENT_PHRASES):
+
+  - phrases are split into word tokens and stop words are dropped
+  - an inverted index maps each token to the phrases containing it, and each
+    token is weighted by its inverse document frequency (rarer words count more)
+  - a deletion index (every token of 4+ letters under each of its one-letter
+    deletions) finds vocabulary words one edit away from a misspelt token
+    (insertion, deletion, substitution or swap of neighbouring letters)
+
+A phrase scores the IDF weight of its tokens found in the message, over the
+weight of all its tokens; typo matches count TYPO_WEIGHT of a word. Among the
+phrases scoring at least `min_score`, the one matching the most weight wins
+(so "enterprise chatbot stock" is check_enterprise rather than inventory), then
+the higher score, then the phrase listed first. Matching costs a few dict
+lookups per message token.
+"""
+# === Imports ===
+import math
+import re
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset("a an and are can could do does i im is it me my of on please the to what would you "
+                       "your with want need some".split())
+TYPO_WEIGHT = 0.8
+MIN_TYPO_LENGTH = 4
+MAX_TOKENS = 32  # Only the start of very long messages is considered
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def _deletions(token):
+    return {token[:index] + token[index + 1:] for index in range(len(token))}
+
+
+def _within_one_edit(a, b):
+    """Optimal string alignment distance <= 1 (adjacent swaps count as one edit)."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diffs = [index for index in range(len(a)) if a[index] != b[index]]
+        return len(diffs) == 1 or (len(diffs) == 2 and diffs[1] == diffs[0] + 1
+                                   and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]])
+    if len(a) > len(b):
+        a, b = b, a
+    index = 0
+    while index < len(a) and a[index] == b[index]:
+        index += 1
+    return a[index:] == b[index + 1:]
+
+
+class IntentMatcher:
+    def __init__(self, phrases, min_score=0.6):
+        """`phrases`: {phrase: keyword}; several phrases may share a keyword."""
+        self.min_score = min_score
+        self._keywords = []  # per phrase id
+        postings = {}
+        for phrase, keyword in phrases.items():
+            tokens = set(tokenize(phrase.replace("_", " ")))
+            if not tokens:
+                continue
+            for token in tokens:
+                postings.setdefault(token, []).append(len(self._keywords))
+            self._keywords.append(keyword)
+        count = len(self._keywords)
+        self._idf = {token: math.log((1 + count) / (1 + len(ids))) + 1 for token, ids in postings.items()}
+        self._postings = {token: tuple(ids) for token, ids in postings.items()}
+        self._weights = [0.0] * count  # per phrase id: total token weight
+        for token, ids in postings.items():
+            for phrase_id in ids:
+                self._weights[phrase_id] += self._idf[token]
+        self._near = {}  # one-letter deletion (or the token itself) -> vocabulary tokens
+        for token in postings:
+            if len(token) >= MIN_TYPO_LENGTH:
+                for key in _deletions(token) | {token}:
+                    self._near.setdefault(key, []).append(token)
+
+    def __len__(self):
+        return len(self._keywords)
+
+    def _vocabulary_tokens(self, token):
+        """[(vocabulary token, quality)] for a message token: itself, or the words one edit away."""
+        if token in self._postings:
+            return [(token, 1.0)]
+        if len(token) < MIN_TYPO_LENGTH - 1:
+            return []
+        candidates = set()
+        for key in _deletions(token) | {token}:
+            candidates.update(self._near.get(key, ()))
+        return [(candidate, TYPO_WEIGHT) for candidate in candidates if _within_one_edit(token, candidate)]
+
+    def scores(self, text):
+        """{phrase id: matched weight} for every phrase sharing a (possibly misspelt) word with `text`."""
+        matched = {}
+        seen = set()
+        for token in tokenize(text)[:MAX_TOKENS]:
+            for word, quality in self._vocabulary_tokens(token):
+                if word in seen:
+                    continue
+                seen.add(word)
+                weight = self._idf[word] * quality
+                for phrase_id in self._postings[word]:
+                    matched[phrase_id] = matched.get(phrase_id, 0.0) + weight
+        return matched
+
+    def match(self, text):
+        """The keyword `text` most likely means, or None when no phrase scores min_score."""
+        best = None
+        best_rank = (0.0, 0.0)
+        for phrase_id, weight in self.scores(text).items():
+            score = weight / self._weights[phrase_id]
+            if score >= self.min_score and (weight, score) > best_rank:
+                best, best_rank = phrase_id, (weight, score)
+        return None if best is None else self._keywords[best]
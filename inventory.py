@@ -1,46 +1,136 @@
 from flask import Flask, request, jsonify
 import os
+from inventory_store import (InventoryStore, DEFAULT_PRODUCTS, ProductNotFound, InsufficientStock,
+                             ReservationNotFound)
+import metrics
+import tracing
+from logging_setup import configure_logging
 
 app = Flask(__name__)
+metrics.instrument_flask(app, "inventory")
+tracing.instrument_flask(app, "inventory")
+configure_logging()
 
-# 🔹 Inventory Data (In-memory; use a DB in production)
-inventory = {
-    "chatbot_basic": {"name": "Basic Chatbot", "quantity": 10, "price": 199},
-    "chatbot_pro": {"name": "Pro Chatbot", "quantity": 5, "price": 499},
-    "chatbot_enterprise": {"name": "Enterprise Chatbot", "quantity": 3, "price": 999}
-}
+# 🔹 Inventory Data (SQLite file shared by every worker process; seeded on first start)
+INVENTORY_DB_PATH = os.environ.get("INVENTORY_DB_PATH", "inventory.db")
+RESERVATION_TTL = int(os.environ.get("RESERVATION_TTL", 900))  # Seconds before an uncommitted hold lapses
+inventory = InventoryStore(INVENTORY_DB_PATH, seed=DEFAULT_PRODUCTS, reservation_ttl=RESERVATION_TTL)
+
+MAX_PAGE_SIZE = 200
+MAX_POLL_TIMEOUT = 30  # Seconds a change-feed request may wait
+
+def product_status(product):
+    return {
+        "product": product["name"],
+        "quantity": product["quantity"],
+        "price": product["price"],
+        "available": product["quantity"] > 0
+    }
+
+def conditional(payload, version):
+    """JSON response tagged with the store version; answers 304 when If-None-Match still matches."""
+    response = jsonify(payload)
+    response.set_etag(f"v{version}")
+    return response.make_conditional(request)
 
 # ✅ Get Inventory Status
 @app.route('/inventory/<product_id>', methods=['GET'])
 def get_inventory(product_id):
-    if product_id in inventory:
-        return jsonify({
-            "product": inventory[product_id]["name"],
-            "quantity": inventory[product_id]["quantity"],
-            "price": inventory[product_id]["price"],
-            "available": inventory[product_id]["quantity"] > 0
-        }), 200
+    product = inventory.get(product_id)
+    if product is not None:
+        return conditional(product_status(product), product["version"])
     return jsonify({"error": "Product not found"}), 404
 
+# ✅ Multi-Get (?ids=a,b,c) or Paginated Listing (?limit=N&after=<last product_id>)
+@app.route('/inventory', methods=['GET'])
+def list_inventory():
+    # Read the version first: a change racing the query can only make the ETag older, never newer
+    version = inventory.version()
+    if "ids" in request.args:
+        product_ids = [product_id for product_id in request.args["ids"].split(",") if product_id]
+        if len(product_ids) > MAX_PAGE_SIZE:
+            return jsonify({"error": f"At most {MAX_PAGE_SIZE} ids per request"}), 400
+        found = inventory.get_many(product_ids)
+        return conditional({
+            "products": {product_id: product_status(product) for product_id, product in found.items()},
+            "missing": [product_id for product_id in product_ids if product_id not in found],
+            "version": version
+        }, version)
+    try:
+        limit = int(request.args.get("limit", 50))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+    products = inventory.list(after=request.args.get("after"), limit=limit)
+    return conditional({
+        "products": [dict(product_status(product), product_id=product["id"]) for product in products],
+        "next": products[-1]["id"] if len(products) == limit else None,
+        "total": inventory.count(),
+        "version": version
+    }, version)
+
 # ✅ Update Inventory (e.g., after a sale)
 @app.route('/inventory/<product_id>', methods=['POST'])
 def update_inventory(product_id):
-    if product_id not in inventory:
-        return jsonify({"error": "Product not found"}), 404
-
     data = request.json
     quantity_change = data.get('quantity_change', 0)  # Positive for adding, negative for removing
 
-    if inventory[product_id]["quantity"] + quantity_change < 0:
+    try:
+        product = inventory.adjust(product_id, quantity_change)
+    except ProductNotFound:
+        return jsonify({"error": "Product not found"}), 404
+    except InsufficientStock:
         return jsonify({"error": "Insufficient stock"}), 400
 
-    inventory[product_id]["quantity"] += quantity_change
     return jsonify({
-        "product": inventory[product_id]["name"],
-        "new_quantity": inventory[product_id]["quantity"],
+        "product": product["name"],
+        "new_quantity": product["quantity"],
         "message": "Inventory updated"
     }), 200
 
+# ✅ Change Feed (long-poll: ?since=<version>&timeout=<seconds>)
+# Returns as soon as any product changes after `since`; clients pass the returned version back in.
+@app.route('/inventory/changes', methods=['GET'])
+def inventory_changes():
+    try:
+        since = int(request.args.get("since", 0))
+        timeout = min(float(request.args.get("timeout", 0)), MAX_POLL_TIMEOUT)
+    except ValueError:
+        return jsonify({"error": "since must be an integer and timeout a number"}), 400
+    if timeout > 0:
+        inventory.wait_for_change(since, timeout)
+    version, products = inventory.changes_since(since)
+    return jsonify({
+        "version": version,
+        "changes": [dict(product_status(product), product_id=product["id"], updated_at=product["updated_at"])
+                    for product in products]
+    }), 200
+
+# ✅ Apply Many Quantity Changes Atomically ({"changes": [{"product_id": ..., "quantity_change": ...}]})
+@app.route('/inventory/batch', methods=['POST'])
+def batch_update_inventory():
+    data = request.json or {}
+    changes = data.get('changes')
+    if not isinstance(changes, list) or not changes:
+        return jsonify({"error": "changes must be a non-empty list"}), 400
+    if len(changes) > MAX_PAGE_SIZE:
+        return jsonify({"error": f"At most {MAX_PAGE_SIZE} changes per request"}), 400
+    try:
+        updated = inventory.apply_batch([(change['product_id'], change.get('quantity_change', 0))
+                                         for change in changes])
+    except (KeyError, TypeError):
+        return jsonify({"error": "Each change needs a product_id"}), 400
+    except ProductNotFound as e:
+        return jsonify({"error": "Product not found", "product_id": str(e)}), 404
+    except InsufficientStock as e:
+        return jsonify({"error": "Insufficient stock", "product_id": str(e)}), 400
+    return jsonify({
+        "message": "Inventory updated",
+        "products": {product_id: {"product": product["name"], "new_quantity": product["quantity"]}
+                     for product_id, product in updated.items()}
+    }), 200
+
 # ✅ Add New Product (Admin Use)
 @app.route('/inventory', methods=['POST'])
 def add_product():
@@ -53,8 +143,38 @@ def add_product():
     if not all([product_id, name, quantity, price]):
         return jsonify({"error": "Missing required fields"}), 400
 
-    inventory[product_id] = {"name": name, "quantity": quantity, "price": price}
-    return jsonify({"message": "Product added", "product": inventory[product_id]}), 201
+    product = inventory.add(product_id, name, quantity, price)
+    return jsonify({"message": "Product added", "product": {
+        "name": product["name"], "quantity": product["quantity"], "price": product["price"]}}), 201
+
+# ✅ Reserve Stock for a Checkout ({"quantity": n, "ttl": seconds})
+@app.route('/inventory/<product_id>/reserve', methods=['POST'])
+def reserve_inventory(product_id):
+    data = request.json or {}
+    quantity = data.get('quantity', 1)
+    if not isinstance(quantity, int) or quantity <= 0:
+        return jsonify({"error": "quantity must be a positive integer"}), 400
+    try:
+        reservation = inventory.reserve(product_id, quantity, ttl=data.get('ttl'))
+    except ProductNotFound:
+        return jsonify({"error": "Product not found"}), 404
+    except InsufficientStock:
+        return jsonify({"error": "Insufficient stock"}), 400
+    return jsonify({"message": "Stock reserved", "reservation": reservation}), 201
+
+# ✅ Commit or Release a Reservation
+@app.route('/inventory/reservations/<reservation_id>/<action>', methods=['POST'])
+def finish_reservation(reservation_id, action):
+    if action not in ("commit", "release"):
+        return jsonify({"error": "Unknown action"}), 404
+    try:
+        if action == "commit":
+            reservation = inventory.commit(reservation_id)
+        else:
+            reservation = inventory.release(reservation_id)
+    except ReservationNotFound:
+        return jsonify({"error": "Reservation not found or no longer pending"}), 404
+    return jsonify({"message": f"Reservation {reservation['status']}", "reservation": reservation}), 200
 
 # ✅ Run Flask Server for Local Testing or Render Deployment
 if __name__ == '__main__':
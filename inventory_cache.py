@@ -0,0 +1,170 @@
+"""Bot-side read-through cache for inventory lookups, kept fresh by the inventory change feed.
+
+Lookups are served from memory for up to `ttl` seconds. A background watcher
+long-polls GET /inventory/changes on the inventory service and overwrites
+cached entries the moment stock changes, so the TTL only bounds staleness
+while the feed is unreachable. The feed's first batch lists every product,
+which also fills the optional ProductCatalog (catalog.py); later batches keep
+its names current.
+"""
+# === Imports ===
+import logging
+import threading
+import time
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class InventoryCache:
+    def __init__(self, http, base_url, ttl=30.0, watch=True, poll_timeout=25.0, catalog=None, feed_http=None):
+        self.http = http
+        # The change feed's long polls idle for up to poll_timeout seconds; a client of their own keeps
+        # them out of the lookups' latency stats and circuit breaker
+        self.feed_http = feed_http or http
+        self.base_url = base_url
+        self.ttl = ttl
+        self.watch = watch
+        self.poll_timeout = poll_timeout
+        self.catalog = catalog
+        self._entries = {}  # product_id -> (status or None for unknown products, fetched_at)
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._stopped = threading.Event()
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.feed_updates = 0
+        self._served_age_total = 0.0
+        self._served_age_max = 0.0
+        self._propagation_total = 0.0
+        self._propagation_max = 0.0
+
+    def get(self, product_id):
+        """Stock status dict for product_id, None if the service doesn't know it; raises RequestException."""
+        found, status = self.peek(product_id)
+        if found:
+            return status
+        response = self.http.get(f"{self.base_url}/inventory/{product_id}")
+        return self.put(product_id, response)
+
+    def peek(self, product_id):
+        """(True, status) when a fresh entry is cached, else (False, None) and the caller fetches and put()s it."""
+        if self.watch and self._watcher is None:
+            self._start_watcher()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(product_id)
+            if entry is not None and now - entry[1] < self.ttl:
+                age = now - entry[1]
+                self.hits += 1
+                self._served_age_total += age
+                if age > self._served_age_max:
+                    self._served_age_max = age
+                return True, entry[0]
+            self.misses += 1
+        return False, None
+
+    def put(self, product_id, response):
+        """Cache and return the status from a GET /inventory/<id> response (requests or httpx)."""
+        if response.status_code == 200:
+            status = response.json()
+        elif response.status_code == 404:
+            status = None
+        else:
+            raise requests.exceptions.HTTPError(f"Inventory service returned {response.status_code}",
+                                                response=response)
+        with self._lock:
+            self._entries[product_id] = (status, time.monotonic())
+        if status is not None and self.catalog is not None:
+            self.catalog.update([(product_id, status["product"])])
+        return status
+
+    def invalidate(self, product_id=None):
+        with self._lock:
+            if product_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(product_id, None)
+
+    # === Change Feed Watcher ===
+    def start(self):
+        """Start watching the change feed now rather than on the first lookup (fills the catalog early)."""
+        if self.watch:
+            self._start_watcher()
+
+    def _start_watcher(self):
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = threading.Thread(target=self._watch, name="inventory-feed", daemon=True)
+        self._watcher.start()
+
+    def _watch(self):
+        backoff = 1.0
+        while not self._stopped.is_set():
+            try:
+                self.poll_changes(self.poll_timeout)
+                backoff = 1.0
+                continue
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.warning("Inventory change feed unavailable, retrying in %.0fs: %s", backoff, str(e))
+            except Exception:
+                # A malformed batch or a bug must not end the watcher: entries would silently go stale
+                logger.exception("Inventory change feed failed, retrying in %.0fs", backoff)
+            self._stopped.wait(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    def poll_changes(self, timeout=0):
+        """Apply one batch from the change feed; the first call (no version yet) loads every product."""
+        since = self.version if self.version is not None else 0
+        response = self.feed_http.get(f"{self.base_url}/inventory/changes",
+                                      params={"since": since, "timeout": timeout if self.version is not None else 0},
+                                      timeout=(self.feed_http.timeout[0], timeout + 10))
+        response.raise_for_status()
+        body = response.json()
+        now = time.monotonic()
+        wall_now = time.time()
+        changed = []
+        with self._lock:
+            for change in body["changes"]:
+                product_id = change.pop("product_id")
+                changed.append((product_id, change))
+                updated_at = change.pop("updated_at", None)
+                self._entries[product_id] = (change, now)
+                if self.version is not None and updated_at:
+                    lag = max(0.0, wall_now - updated_at)
+                    self._propagation_total += lag
+                    if lag > self._propagation_max:
+                        self._propagation_max = lag
+                    self.feed_updates += 1
+            self.version = body["version"]
+        if self.catalog is not None:
+            self.catalog.update((product_id, change["product"]) for product_id, change in changed)
+        return len(body["changes"])
+
+    def stop(self):
+        self._stopped.set()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "served_age_ms": {
+                    "avg": round(self._served_age_total / self.hits * 1000, 3) if self.hits else 0.0,
+                    "max": round(self._served_age_max * 1000, 3),
+                },
+                "feed_version": self.version,
+                "feed_http": self.feed_http.stats() if self.feed_http is not self.http else None,
+                "feed_updates": self.feed_updates,
+                # Time from a change committing in the inventory service to this cache seeing it
+                "propagation_ms": {
+                    "avg": round(self._propagation_total / self.feed_updates * 1000, 3) if self.feed_updates else 0.0,
+                    "max": round(self._propagation_max * 1000, 3),
+                },
+            }
@@ -0,0 +1,309 @@
+"""Durable, concurrency-safe inventory backed by SQLite.
+
+Stock changes are single conditional UPDATEs (or short BEGIN IMMEDIATE
+transactions), so they stay atomic across threads and across processes sharing
+the database file; a sale can never take quantity below what is on hand.
+
+Reservations hold stock for a checkout: reserve() moves units from available
+to reserved, commit() takes them off the shelf, release() (or expiry) returns
+them. Lapsed holds are released before any read or sale, so stock held by an
+abandoned checkout is available again as soon as its reservation expires.
+
+Every product change bumps a store-wide version (via triggers, inside the same
+statement) and stamps it on the product row; this drives ETags and lets
+clients ask for what changed since a version.
+"""
+# === Imports ===
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRODUCTS = {
+    "chatbot_basic": {"name": "Basic Chatbot", "quantity": 10, "price": 199},
+    "chatbot_pro": {"name": "Pro Chatbot", "quantity": 5, "price": 499},
+    "chatbot_enterprise": {"name": "Enterprise Chatbot", "quantity": 3, "price": 999}
+}
+
+
+PRODUCT_COLUMNS = "id, name, quantity, reserved, price, version, updated_at"
+
+
+class InventoryError(Exception):
+    pass
+
+
+class ProductNotFound(InventoryError):
+    pass
+
+
+class InsufficientStock(InventoryError):
+    pass
+
+
+class ReservationNotFound(InventoryError):
+    pass
+
+
+class InventoryStore:
+    def __init__(self, path="inventory.db", seed=None, reservation_ttl=900):
+        self.path = path
+        self.reservation_ttl = reservation_ttl
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS products (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                quantity INTEGER NOT NULL CHECK (quantity >= 0),
+                reserved INTEGER NOT NULL DEFAULT 0 CHECK (reserved >= 0 AND reserved <= quantity),
+                price REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS reservations (
+                id TEXT PRIMARY KEY,
+                product_id TEXT NOT NULL,
+                quantity INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                status TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS reservations_pending ON reservations (status, expires_at);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+        """)
+        columns = [col[1] for col in conn.execute("PRAGMA table_info(products)")]
+        if "version" not in columns:
+            conn.execute("ALTER TABLE products ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        if "updated_at" not in columns:
+            conn.execute("ALTER TABLE products ADD COLUMN updated_at REAL NOT NULL DEFAULT 0")
+        for event in ("INSERT", "UPDATE OF name, quantity, reserved, price"):
+            trigger = f"products_version_{event.split()[0].lower()}"
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            conn.execute(f"""
+                CREATE TRIGGER {trigger} AFTER {event} ON products BEGIN
+                    UPDATE meta SET value = value + 1 WHERE key = 'version';
+                    UPDATE products SET version = (SELECT value FROM meta WHERE key = 'version'),
+                                        updated_at = (julianday('now') - 2440587.5) * 86400.0
+                    WHERE id = NEW.id;
+                END""")
+        self._changed = threading.Condition()
+        if seed and conn.execute("SELECT COUNT(*) FROM products").fetchone()[0] == 0:
+            for product_id, product in seed.items():
+                self.add(product_id, product["name"], product["quantity"], product["price"])
+
+    def _conn(self):
+        # sqlite3 connections are per thread; each thread opens its own to the shared file
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA busy_timeout=30000")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_to_product(row):
+        product_id, name, quantity, reserved, price, version, updated_at = row
+        return {"id": product_id, "name": name, "quantity": quantity - reserved, "reserved": reserved,
+                "on_hand": quantity, "price": int(price) if price == int(price) else price, "version": version,
+                "updated_at": updated_at}
+
+    def version(self):
+        """Store-wide version; increases on every product change."""
+        return self._conn().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def get(self, product_id):
+        self._release_expired()
+        row = self._conn().execute(f"SELECT {PRODUCT_COLUMNS} FROM products WHERE id = ?",
+                                   (product_id,)).fetchone()
+        return self._row_to_product(row) if row else None
+
+    def get_many(self, product_ids):
+        """{product_id: product} for the ids that exist, read in one consistent query."""
+        product_ids = list(dict.fromkeys(product_ids))
+        self._release_expired()
+        placeholders = ",".join("?" * len(product_ids))
+        rows = self._conn().execute(f"SELECT {PRODUCT_COLUMNS} FROM products WHERE id IN ({placeholders})",
+                                    product_ids).fetchall() if product_ids else []
+        return {row[0]: self._row_to_product(row) for row in rows}
+
+    def list(self, after=None, limit=50):
+        """Products ordered by id, starting after the `after` id (keyset pagination)."""
+        self._release_expired()
+        rows = self._conn().execute(f"SELECT {PRODUCT_COLUMNS} FROM products WHERE id > ? ORDER BY id LIMIT ?",
+                                    (after or "", limit)).fetchall()
+        return [self._row_to_product(row) for row in rows]
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def add(self, product_id, name, quantity, price):
+        """Create or replace a product's details and on-hand quantity."""
+        self._conn().execute(
+            "INSERT INTO products (id, name, quantity, price) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET name = excluded.name, quantity = excluded.quantity + reserved, "
+            "price = excluded.price",
+            (product_id, name, quantity, price))
+        self._notify()
+        return self.get(product_id)
+
+    def adjust(self, product_id, quantity_change):
+        """Atomically add (positive) or sell (negative) stock; raises InsufficientStock instead of overselling."""
+        self._release_expired()
+        cursor = self._conn().execute(
+            "UPDATE products SET quantity = quantity + ?1 WHERE id = ?2 AND quantity - reserved + ?1 >= 0",
+            (quantity_change, product_id))
+        if cursor.rowcount == 0:
+            if self.get(product_id) is None:
+                raise ProductNotFound(product_id)
+            raise InsufficientStock(product_id)
+        self._notify()
+        return self.get(product_id)
+
+    def apply_batch(self, changes):
+        """Apply [(product_id, quantity_change), ...] all-or-nothing; raises on the first change that can't apply."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._expire_locked(conn)
+            for product_id, quantity_change in changes:
+                cursor = conn.execute(
+                    "UPDATE products SET quantity = quantity + ?1 WHERE id = ?2 AND quantity - reserved + ?1 >= 0",
+                    (quantity_change, product_id))
+                if cursor.rowcount == 0:
+                    exists = conn.execute("SELECT 1 FROM products WHERE id = ?", (product_id,)).fetchone()
+                    raise InsufficientStock(product_id) if exists else ProductNotFound(product_id)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._notify()
+        return self.get_many([product_id for product_id, _ in changes])
+
+    # === Reservations ===
+    def reserve(self, product_id, quantity, ttl=None):
+        if quantity <= 0:
+            raise ValueError("quantity must be positive")
+        reservation_id = uuid.uuid4().hex
+        expires_at = time.time() + (ttl or self.reservation_ttl)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._expire_locked(conn)
+            cursor = conn.execute(
+                "UPDATE products SET reserved = reserved + ?1 WHERE id = ?2 AND quantity - reserved >= ?1",
+                (quantity, product_id))
+            if cursor.rowcount == 0:
+                exists = conn.execute("SELECT 1 FROM products WHERE id = ?", (product_id,)).fetchone()
+                raise InsufficientStock(product_id) if exists else ProductNotFound(product_id)
+            conn.execute("INSERT INTO reservations (id, product_id, quantity, expires_at, status) "
+                         "VALUES (?, ?, ?, ?, 'pending')", (reservation_id, product_id, quantity, expires_at))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._notify()
+        return {"reservation_id": reservation_id, "product_id": product_id, "quantity": quantity,
+                "expires_at": expires_at}
+
+    def commit(self, reservation_id):
+        """Turn a pending reservation into a sale."""
+        return self._finish(reservation_id, "committed",
+                            "UPDATE products SET quantity = quantity - ?1, reserved = reserved - ?1 WHERE id = ?2")
+
+    def release(self, reservation_id):
+        """Return a pending reservation's units to available stock."""
+        return self._finish(reservation_id, "released",
+                            "UPDATE products SET reserved = reserved - ?1 WHERE id = ?2")
+
+    def _finish(self, reservation_id, status, update_sql):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._expire_locked(conn)
+            row = conn.execute("SELECT product_id, quantity FROM reservations WHERE id = ? AND status = 'pending'",
+                               (reservation_id,)).fetchone()
+            if row is None:
+                raise ReservationNotFound(reservation_id)
+            product_id, quantity = row
+            conn.execute(update_sql, (quantity, product_id))
+            conn.execute("UPDATE reservations SET status = ? WHERE id = ?", (status, reservation_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._notify()
+        return {"reservation_id": reservation_id, "product_id": product_id, "quantity": quantity,
+                "status": status}
+
+    def _expire_locked(self, conn):
+        """Release lapsed reservations; the caller holds the write lock (BEGIN IMMEDIATE). Returns how many."""
+        expired = conn.execute("SELECT id, product_id, quantity FROM reservations "
+                               "WHERE status = 'pending' AND expires_at <= ?", (time.time(),)).fetchall()
+        for reservation_id, product_id, quantity in expired:
+            conn.execute("UPDATE products SET reserved = reserved - ? WHERE id = ?", (quantity, product_id))
+            conn.execute("UPDATE reservations SET status = 'expired' WHERE id = ?", (reservation_id,))
+        if expired:
+            logger.info("Released %d expired reservations", len(expired))
+        return len(expired)
+
+    def _release_expired(self):
+        """Release lapsed reservations in a transaction of their own; reads only take the write lock when one is due."""
+        conn = self._conn()
+        due = conn.execute("SELECT 1 FROM reservations WHERE status = 'pending' AND expires_at <= ? LIMIT 1",
+                           (time.time(),)).fetchone()
+        if due is None or conn.in_transaction:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            released = self._expire_locked(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if released:
+            self._notify()
+
+    # === Change Feed ===
+    def changes_since(self, version, limit=500):
+        """(new version, products changed after `version`), oldest change first.
+
+        When more than `limit` products changed, the returned version is that of the last
+        product included, so the caller picks up the rest on its next call.
+        """
+        self._release_expired()
+        current = self.version()
+        rows = self._conn().execute(f"SELECT {PRODUCT_COLUMNS} FROM products WHERE version > ? "
+                                    "ORDER BY version LIMIT ?", (version, limit)).fetchall()
+        products = [self._row_to_product(row) for row in rows]
+        if len(products) == limit:
+            return products[-1]["version"], products
+        return max(current, version), products
+
+    def wait_for_change(self, version, timeout, poll_interval=0.5):
+        """Block until the store version passes `version` or `timeout` elapses.
+
+        Writers in this process wake waiters immediately; changes made by other
+        processes sharing the file are noticed within `poll_interval`.
+        """
+        deadline = time.monotonic() + timeout
+        while self.version() <= version:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            with self._changed:
+                self._changed.wait(min(remaining, poll_interval))
+        return True
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
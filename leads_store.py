@@ -0,0 +1,159 @@
+"""Local, queryable copy of every lead and issue row written to the Google Sheet.
+
+write_to_google_sheet() records each row here (one INSERT into a WAL-mode
+SQLite file) as well as queueing it for the sheet, so reporting no longer
+means downloading the whole tracker through the Sheets API.
+
+Queries filter by category, urgency, page and creation time and return rows
+oldest first, a page at a time (keyset pagination: "after the last id you
+saw"). Every index ends in (created_at, id), so a page is one index range scan
+however deep it is, with no sort. Exports read the same
+query from a connection of their own in chunks of `chunk_size` rows and yield
+them as NDJSON or CSV text, so memory stays flat whatever the table size.
+"""
+# === Imports ===
+import csv
+import datetime
+import io
+import json
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Sheet columns in sheet order (see write_to_google_sheet), then the page the row came from
+COLUMNS = ("sender_id", "category", "name", "order_number", "urgency", "website", "issue_description", "email",
+           "phone", "company", "created_at")
+FILTERS = ("category", "urgency", "page_id", "sender_id")
+EXPORT_FORMATS = ("ndjson", "csv")
+
+
+def parse_time_bound(value, end=False):
+    """ISO date or datetime -> string to compare created_at with; an `end` date is exclusive of the next day."""
+    if "T" not in value and " " not in value:
+        day = datetime.date.fromisoformat(value)
+        return (day + datetime.timedelta(days=1) if end else day).isoformat()
+    return datetime.datetime.fromisoformat(value).isoformat()
+
+
+class LeadStore:
+    def __init__(self, path="leads.db", chunk_size=500):
+        self.path = path
+        self.chunk_size = chunk_size
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS leads (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                {", ".join(f"{column} TEXT NOT NULL DEFAULT ''" for column in COLUMNS)},
+                page_id TEXT NOT NULL DEFAULT ''
+            );
+            CREATE INDEX IF NOT EXISTS leads_category ON leads (category, created_at);
+            CREATE INDEX IF NOT EXISTS leads_urgency ON leads (urgency, created_at);
+            CREATE INDEX IF NOT EXISTS leads_created_at ON leads (created_at);
+        """)
+        self._lock = threading.Lock()
+        self.added = 0
+        self.exported = 0
+
+    def add(self, row, page_id=""):
+        """Record one sheet row (a list in COLUMNS order); returns its id."""
+        with self._lock:
+            cursor = self._conn.execute(
+                f"INSERT INTO leads ({', '.join(COLUMNS)}, page_id) VALUES ({', '.join('?' * (len(COLUMNS) + 1))})",
+                [str(value) for value in row] + [page_id or ""])
+            self.added += 1
+            return cursor.lastrowid
+
+    @staticmethod
+    def _where(filters, after=None):
+        """SQL condition and parameters for {FILTERS name: value, "from": ..., "to": ...}; raises ValueError.
+
+        "from" is inclusive; "to" is exclusive, except that a date "to" includes that whole day.
+        """
+        clauses = []
+        params = []
+        for name in FILTERS:
+            if filters.get(name):
+                clauses.append(f"{name} = ?")
+                params.append(filters[name])
+        if filters.get("from"):
+            clauses.append("created_at >= ?")
+            params.append(parse_time_bound(filters["from"]))
+        if filters.get("to"):
+            clauses.append("created_at < ?")
+            params.append(parse_time_bound(filters["to"], end=True))
+        if after is not None:
+            # Keyset on (created_at, id), the order of every index, so no page needs a sort
+            clauses.append("(created_at, id) > (SELECT created_at, id FROM leads WHERE id = ?)")
+            params.append(after)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    @staticmethod
+    def _row_to_lead(row):
+        return dict(zip(("id",) + COLUMNS + ("page_id",), row))
+
+    def query(self, filters=None, after=None, limit=50):
+        """Matching rows oldest first, starting after the row with id `after`; raises ValueError for a bad date."""
+        where, params = self._where(filters or {}, after)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT id, {', '.join(COLUMNS)}, page_id FROM leads{where} "
+                                      f"ORDER BY created_at, id LIMIT ?", params + [limit]).fetchall()
+        return [self._row_to_lead(row) for row in rows]
+
+    def export(self, filters=None, fmt="ndjson"):
+        """Text chunks of every matching row as NDJSON lines or CSV (with a header), read `chunk_size` at a time.
+
+        Filters are checked before the first chunk, so a bad one raises ValueError here rather than mid-stream.
+        The rows come from one read transaction: rows added during the export are not included.
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+        where, params = self._where(filters or {})
+        return self._export(where, params, fmt)
+
+    def _export(self, where, params, fmt):
+        # A connection of its own: the export may outlive a request thread's turn and must not hold the write lock
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if fmt == "csv" else None
+        rows = 0
+        try:
+            conn.execute("BEGIN")
+            cursor = conn.execute(f"SELECT id, {', '.join(COLUMNS)}, page_id FROM leads{where} ORDER BY created_at, id",
+                                  params)
+            if writer is not None:
+                writer.writerow(("id",) + COLUMNS + ("page_id",))
+            while True:
+                chunk = cursor.fetchmany(self.chunk_size)
+                if not chunk:
+                    break
+                if writer is not None:
+                    writer.writerows(chunk)
+                else:
+                    for row in chunk:
+                        buffer.write(json.dumps(self._row_to_lead(row), ensure_ascii=False))
+                        buffer.write("\n")
+                rows += len(chunk)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if writer is not None and not rows:
+                yield buffer.getvalue()
+        finally:
+            conn.close()
+            self.exported += rows
+            logger.info("Lead export (%s) finished after %d rows", fmt, rows)
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM leads").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self):
+        return {"rows": self.count(), "added": self.added, "exported": self.exported}
@@ -0,0 +1,120 @@
+"""Process-wide logging configuration shared by the bot, inventory and scheduling services.
+
+    LOG_LEVEL        minimum level (default INFO)
+    LOG_FORMAT       "text" (default) or "json", one object per line
+    LOG_SAMPLE_RATE  fraction of DEBUG/INFO records kept (default 1.0); warnings and errors are never sampled
+    LOG_REDACT       "true" (default) masks email addresses and phone numbers in every record
+
+Sampling runs before a record is formatted, so dropped records cost almost
+nothing. Redaction runs on the records that are kept. Records logged under a
+trace (tracing.py) carry its id as `trace_id`, a field of the JSON output.
+"""
+# === Imports ===
+import datetime
+import json
+import logging
+import os
+import random
+import re
+
+import tracing
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+# Runs of 7-15 digits with the usual separators; dates, times and longer ids (page-scoped user ids) are left alone
+PHONE_PATTERN = re.compile(r"(?<![\w.:-])\+?\(?\d[\d ().-]{5,}\d(?![\w:])")
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+# Structured fields (logging `extra=`) that always hold contact details
+PII_FIELDS = frozenset(["email", "phone"])
+
+# Attributes every LogRecord has; anything else was passed with extra= and goes into the JSON object
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def _mask_phone(match):
+    text = match.group(0)
+    digits = sum(c.isdigit() for c in text)
+    if not 7 <= digits <= 15 or DATE_PATTERN.fullmatch(text.strip()):
+        return text
+    return "[phone]"
+
+
+def redact(text):
+    return PHONE_PATTERN.sub(_mask_phone, EMAIL_PATTERN.sub("[email]", text))
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+_EXC_FORMATTER = logging.Formatter()
+
+
+class RedactingFilter(logging.Filter):
+    """Renders the message once, with contact details masked, so handlers never see the raw values."""
+
+    def filter(self, record):
+        record.msg = redact(record.getMessage())
+        record.args = None
+        # Tracebacks too: both formatters print exc_text as is once it is set
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _EXC_FORMATTER.formatException(record.exc_info)
+        if record.exc_text:
+            record.exc_text = redact(record.exc_text)
+        if record.stack_info:
+            record.stack_info = redact(record.stack_info)
+        for field in PII_FIELDS:
+            if field in record.__dict__:
+                setattr(record, field, "[redacted]")
+        return True
+
+
+class TraceIdFilter(logging.Filter):
+    def filter(self, record):
+        trace_id = tracing.current_id()
+        if trace_id is not None:
+            record.trace_id = trace_id
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(
+                timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_text or record.exc_info:
+            entry["exc"] = record.exc_text or self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def configure_logging():
+    level = os.environ.get("LOG_LEVEL", "INFO").upper()
+    handler = logging.StreamHandler()
+    if os.environ.get("LOG_FORMAT", "text").lower() == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+    sample_rate = float(os.environ.get("LOG_SAMPLE_RATE", 1.0))
+    if sample_rate < 1.0:
+        handler.addFilter(SamplingFilter(sample_rate))
+    if os.environ.get("LOG_REDACT", "true").lower() == "true":
+        handler.addFilter(RedactingFilter())
+    handler.addFilter(TraceIdFilter())
+    root = logging.getLogger()
+    # Like logging.basicConfig: the first service imported in a process sets up the root handler
+    if not root.handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
@@ -0,0 +1,345 @@
+"""Outbound Send API dispatcher: coalesces replies into Graph batch requests.
+
+send() only queues a message. Worker threads take up to `max_batch` queued
+messages, at most one per recipient so each user's replies still arrive in
+order, and send them as a single POST to the Graph batch endpoint (a lone
+message goes straight to /{page_id}/messages). Busy periods therefore cost
+one HTTPS call per 50 messages instead of one per message.
+
+Messages for different pages (tenants) carry their own page id and token and
+never share a batch. Each page has a token bucket of its own that keeps its send
+rate under the Send API limit, which Meta applies per page: a busy page cannot
+slow the others down. Each call inside a batch counts against it, as it does on
+Meta's side. Calls that fail
+transiently inside an otherwise successful batch are retried on their own
+with backoff. Permanent errors (blocked user, bad payload) are logged and
+dropped.
+
+Each delivery is traced (tracing.py) as "outbound.deliver": a lone message
+under the trace id of the conversation that queued it, a batch under its own id
+with the ones it carries listed in its "traces" attribute.
+"""
+# === Imports ===
+import atexit
+import json
+import logging
+import threading
+import time
+from collections import deque
+from urllib.parse import quote_plus, urlencode
+
+import requests
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# Graph error codes that mean "try again later": unknown/service errors and the rate limits
+RETRYABLE_GRAPH_CODES = frozenset([1, 2, 4, 17, 32, 341, 613])
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def classify(status, body):
+    """'sent', 'retry' or 'failed' for one Send API result (HTTP status and decoded body)."""
+    if status is not None and status < 300:
+        return "sent"
+    if status is None or status >= 500 or status == 429:
+        return "retry"
+    error = body.get("error", {}) if isinstance(body, dict) else {}
+    if error.get("is_transient") or error.get("code") in RETRYABLE_GRAPH_CODES:
+        return "retry"
+    return "failed"
+
+
+# === Prebuilt Payloads ===
+def message_body(text, quick_replies=None):
+    """The "message" object of a Send API payload."""
+    message = {"text": text}
+    if quick_replies:
+        message["quick_replies"] = [
+            {"content_type": "text", "title": qr["title"], "payload": qr["payload"]} for qr in quick_replies
+        ]
+    return message
+
+
+class PrebuiltMessage:
+    """A reply serialized once, as JSON and as a batch form body; only the recipient id is spliced in."""
+    __slots__ = ("json_tail", "form_tail")
+
+    def __init__(self, text, quick_replies=None):
+        encoded = json.dumps(message_body(text, quick_replies), separators=(",", ":"))
+        self.json_tail = b'},"message":' + encoded.encode("utf-8") + b"}"
+        self.form_tail = "&message=" + quote_plus(encoded)
+
+    def json_body(self, recipient_id):
+        return b'{"recipient":{"id":' + json.dumps(recipient_id).encode("utf-8") + self.json_tail
+
+    def form_body(self, recipient_id):
+        return "recipient=" + quote_plus('{"id":' + json.dumps(recipient_id) + "}") + self.form_tail
+
+
+def json_body(recipient_id, payload):
+    """Serialized Send API request for a payload dict or PrebuiltMessage."""
+    if isinstance(payload, PrebuiltMessage):
+        return payload.json_body(recipient_id)
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+def form_body(recipient_id, payload):
+    """The same request form-encoded, as a call inside a batch."""
+    if isinstance(payload, PrebuiltMessage):
+        return payload.form_body(recipient_id)
+    return urlencode({key: json.dumps(value, separators=(",", ":")) for key, value in payload.items()})
+
+
+# === Rate Limiting ===
+class TokenBucket:
+    """Allows `rate` tokens per second on average, with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, n=1):
+        """Block until `n` tokens are available and take them."""
+        n = min(n, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                wait = (n - self.tokens) / self.rate
+                self.waited += wait
+            time.sleep(wait)
+
+
+# === Dispatcher ===
+class _Message:
+    __slots__ = ("recipient_id", "payload", "page", "attempts", "not_before", "trace_id")
+
+    def __init__(self, recipient_id, payload, page):
+        self.recipient_id = recipient_id
+        self.payload = payload
+        self.page = page  # (page id, access token)
+        self.attempts = 0
+        self.not_before = 0.0
+        self.trace_id = tracing.current_id()  # the conversation that queued it, for the delivery's trace
+
+
+class OutboundDispatcher:
+    def __init__(self, http, graph_url, page_id, access_token, max_batch=50, workers=2, rate=250.0,
+                 max_retries=3, backoff=0.5):
+        self.http = http
+        self.graph_url = graph_url.rstrip("/")
+        self.page_id = page_id
+        self.access_token = access_token
+        self.max_batch = max(1, min(50, int(max_batch)))  # Graph caps a batch at 50 calls
+        self.workers = max(1, int(workers))
+        self.rate = rate
+        self._buckets = {}  # page id -> TokenBucket
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._pending = deque()
+        self._busy = set()  # recipients with a message in flight
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._threads = []
+        self._closed = False
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.requests = 0
+        self.batches = 0
+        self.batched_messages = 0
+        atexit.register(self.close)
+
+    def send(self, recipient_id, payload, page_id=None, access_token=None):
+        """Queue a Send API payload (dict or PrebuiltMessage) for recipient_id, on the dispatcher's page
+        unless given; returns immediately."""
+        message = _Message(recipient_id, payload, (page_id or self.page_id, access_token or self.access_token))
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._pending.append(message)
+            if not self._threads and not closed:
+                for index in range(self.workers):
+                    thread = threading.Thread(target=self._run, name=f"outbound-{index}", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+            self._changed.notify()
+        if closed:
+            # Late sends during shutdown go out directly so they are not stranded
+            self._settle([message], self._deliver([message]), requeue=False)
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending) + len(self._busy)
+
+    def _take(self):
+        """Next batch (one page, one message per recipient, oldest first), or None once closed and drained."""
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                batch, blocked, wake_at = [], set(self._busy), None
+                for message in self._pending:
+                    if message.recipient_id in blocked:
+                        continue
+                    # A recipient's later messages wait behind one that is backing off
+                    blocked.add(message.recipient_id)
+                    if message.not_before > now:
+                        wake_at = message.not_before if wake_at is None else min(wake_at, message.not_before)
+                        continue
+                    if batch and message.page != batch[0].page:
+                        continue
+                    batch.append(message)
+                    if len(batch) == self.max_batch:
+                        break
+                if batch:
+                    taken = set(map(id, batch))
+                    self._pending = deque(m for m in self._pending if id(m) not in taken)
+                    self._busy.update(m.recipient_id for m in batch)
+                    return batch
+                if self._closed and not self._pending and not self._busy:
+                    return None
+                self._changed.wait(None if wake_at is None else wake_at - now)
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if batch is None:
+                return
+            # A lone message continues its conversation's trace; a batch gets its own, naming the ones it carries
+            traces = sorted({message.trace_id for message in batch if message.trace_id})
+            with tracing.trace("outbound.deliver", traces[0] if len(batch) == 1 and traces else None,
+                               messages=len(batch), traces=traces) as current:
+                with tracing.span("rate_limit"):
+                    self._bucket(batch[0].page[0]).acquire(len(batch))
+                try:
+                    outcomes = self._deliver(batch)
+                except Exception as e:
+                    logger.error("Outbound batch of %d failed unexpectedly: %s", len(batch), str(e))
+                    outcomes = ["retry"] * len(batch)
+                current.attrs["sent"] = outcomes.count("sent")
+            self._settle(batch, outcomes)
+
+    def _bucket(self, page_id):
+        with self._lock:
+            bucket = self._buckets.get(page_id)
+            if bucket is None:
+                bucket = self._buckets[page_id] = TokenBucket(self.rate, capacity=max(self.rate, self.max_batch))
+            return bucket
+
+    def _settle(self, batch, outcomes, requeue=True):
+        with self._lock:
+            retry = []
+            for message, outcome in zip(batch, outcomes):
+                if requeue:
+                    self._busy.discard(message.recipient_id)
+                if outcome == "sent":
+                    self.sent += 1
+                elif outcome == "retry" and requeue and message.attempts < self.max_retries:
+                    message.attempts += 1
+                    message.not_before = time.monotonic() + self.backoff * (2 ** (message.attempts - 1))
+                    retry.append(message)
+                    self.retries += 1
+                else:
+                    self.failed += 1
+                    logger.error("Dropping message for recipient %s after %d attempts (%s)",
+                                 message.recipient_id, message.attempts + 1, outcome)
+            # Back to the front, ahead of the same recipients' later messages
+            self._pending.extendleft(reversed(retry))
+            self._changed.notify_all()
+
+    def _deliver(self, batch):
+        """Send the batch; returns one outcome per message."""
+        with self._lock:
+            self.requests += 1
+            if len(batch) > 1:
+                self.batches += 1
+                self.batched_messages += len(batch)
+        page_id, access_token = batch[0].page
+        if len(batch) == 1:
+            url = f"{self.graph_url}/{page_id}/messages?access_token={access_token}"
+            try:
+                response = self.http.post(url, data=json_body(batch[0].recipient_id, batch[0].payload),
+                                          headers=JSON_HEADERS)
+            except requests.exceptions.RequestException as e:
+                logger.warning("Send API call failed: %s", str(e))
+                return ["retry"]
+            return [classify(response.status_code, _json_or_none(response.text))]
+
+        calls = [{"method": "POST", "relative_url": f"{page_id}/messages",
+                  "body": form_body(message.recipient_id, message.payload)}
+                 for message in batch]
+        try:
+            response = self.http.post(f"{self.graph_url}/", data={
+                "access_token": access_token, "include_headers": "false",
+                "batch": json.dumps(calls, separators=(",", ":"))})
+        except requests.exceptions.RequestException as e:
+            logger.warning("Graph batch of %d failed: %s", len(batch), str(e))
+            return ["retry"] * len(batch)
+        results = _json_or_none(response.text)
+        if response.status_code != 200 or not isinstance(results, list):
+            # The whole batch was refused (bad token, throttled, outage): every call shares the verdict
+            return [classify(response.status_code, results)] * len(batch)
+        outcomes = []
+        for index in range(len(batch)):
+            result = results[index] if index < len(results) else None
+            if result is None:
+                # Graph did not get to this call (the batch timed out part way)
+                outcomes.append("retry")
+            else:
+                outcomes.append(classify(result.get("code"), _json_or_none(result.get("body"))))
+        return outcomes
+
+    def flush(self, timeout=30.0):
+        """Wait until every queued message has been sent or dropped; False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while self._pending or self._busy:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+        return True
+
+    def close(self, timeout=30.0):
+        """Send what is still queued (for up to `timeout` seconds), then stop the workers; later calls do nothing."""
+        with self._lock:
+            if self._closed:
+                return
+        flushed = self.flush(timeout)
+        with self._lock:
+            self._closed = True
+            self._changed.notify_all()
+        if not flushed:
+            logger.warning("Outbound dispatcher closed with %d messages unsent", self.pending())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "in_flight": len(self._busy),
+                "sent": self.sent,
+                "failed": self.failed,
+                "retries": self.retries,
+                "requests": self.requests,
+                "batches": self.batches,
+                "avg_batch_size": round(self.batched_messages / self.batches, 2) if self.batches else 0.0,
+                "throttled_s": round(sum(bucket.waited for bucket in self._buckets.values()), 3),
+            }
+
+
+def _json_or_none(text):
+    try:
+        return json.loads(text) if text else None
+    except ValueError:
+        return None
@@ -1,26 +1,60 @@
 from flask import Flask, request, jsonify
 from datetime import datetime, timedelta
 import os
+import atexit
+from bookings import BookingIndex
+from booking_journal import BookingJournal
+from calendars import load_calendar
+import metrics
+import tracing
+from logging_setup import configure_logging
 
 app = Flask(__name__)
+metrics.instrument_flask(app, "scheduling")
+tracing.instrument_flask(app, "scheduling")
+configure_logging()
 
-# 🔹 Scheduling Data (In-memory; use DB in production)
-schedules = {}  # {customer_id: {"date": "YYYY-MM-DD HH:MM", "service": "Consultation", "status": "booked"}}
-AVAILABLE_SLOTS = ["09:00", "10:00", "11:00", "14:00", "15:00", "16:00"]  # Example hours
+# 🔹 Scheduling Data (in-memory index, rebuilt from its on-disk journal at startup)
+calendar = load_calendar(os.environ.get("SCHEDULING_CALENDAR", ""))  # weekday hours, slot length, blackouts, capacity
+# Booking journal (files <path>.snapshot and <path>.journal.N; empty path keeps bookings in memory only)
+SCHEDULING_JOURNAL_PATH = os.environ.get("SCHEDULING_JOURNAL_PATH", "bookings")
+SCHEDULING_FSYNC = os.environ.get("SCHEDULING_FSYNC", "true").lower() == "true"
+SCHEDULING_SNAPSHOT_EVERY = int(os.environ.get("SCHEDULING_SNAPSHOT_EVERY", 10000))  # Journal records per snapshot
+journal = BookingJournal(SCHEDULING_JOURNAL_PATH, fsync=SCHEDULING_FSYNC) if SCHEDULING_JOURNAL_PATH else None
+# date -> slot -> bookings, plus customer -> bookings
+schedules = BookingIndex(calendar, journal=journal, snapshot_every=SCHEDULING_SNAPSHOT_EVERY)
+atexit.register(schedules.close)
+MAX_RANGE_DAYS = 90
+
+def parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date()
 
 # ✅ Get Available Slots for a Date
 @app.route('/scheduling/available/<date>', methods=['GET'])
 def get_available_slots(date):
     try:
-        date_obj = datetime.strptime(date, "%Y-%m-%d")
-        available = []
-        for slot in AVAILABLE_SLOTS:
-            time_str = f"{date} {slot}"
-            if not any(schedule["date"] == time_str for schedule in schedules.values()):
-                available.append(slot)
-        return jsonify({"date": date, "available_slots": available}), 200
+        day = parse_date(date)
     except ValueError:
         return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
+    return jsonify({"date": date, "available_slots": schedules.free_slots(day)}), 200
+
+# ✅ Get Available Slots over a Range (?from=YYYY-MM-DD&to=YYYY-MM-DD, or &days=N; from defaults to today)
+@app.route('/scheduling/available', methods=['GET'])
+def get_available_range():
+    try:
+        start = parse_date(request.args["from"]) if "from" in request.args else datetime.now().date()
+        if "to" in request.args:
+            end = parse_date(request.args["to"])
+        else:
+            end = start + timedelta(days=int(request.args.get("days", 7)) - 1)
+    except ValueError:
+        return jsonify({"error": "Invalid range. Use from=YYYY-MM-DD and to=YYYY-MM-DD or days=N"}), 400
+    days = (end - start).days + 1
+    if not 1 <= days <= MAX_RANGE_DAYS:
+        return jsonify({"error": f"The range must cover between 1 and {MAX_RANGE_DAYS} days"}), 400
+    available = schedules.free_slots_range(start, end)
+    return jsonify({"from": start.isoformat(), "to": end.isoformat(), "days": days,
+                    "slot_minutes": calendar.slot_minutes, "available": available}), 200
 
 # ✅ Book an Appointment
 @app.route('/scheduling', methods=['POST'])
@@ -34,29 +68,37 @@ def book_appointment():
     if not all([customer_id, date, time]):
         return jsonify({"error": "Missing required fields"}), 400
 
-    if time not in AVAILABLE_SLOTS:
+    try:
+        day = parse_date(date)
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
+    if calendar.position(day, time) is None:
         return jsonify({"error": "Invalid time slot"}), 400
 
-    full_date = f"{date} {time}"
-    if any(schedule["date"] == full_date for schedule in schedules.values()):
+    booking = schedules.book(customer_id, day.isoformat(), time, service)
+    if booking is None:
         return jsonify({"error": "Slot already booked"}), 400
+    return jsonify({"message": "Appointment booked", "details": booking}), 201
 
-    schedules[customer_id] = {"date": full_date, "service": service, "status": "booked"}
-    return jsonify({"message": "Appointment booked", "details": schedules[customer_id]}), 201
-
-# ✅ Cancel an Appointment
+# ✅ Cancel an Appointment (all of the customer's bookings, or one with ?booking_id=)
 @app.route('/scheduling/<customer_id>', methods=['DELETE'])
 def cancel_appointment(customer_id):
-    if customer_id in schedules:
-        del schedules[customer_id]
-        return jsonify({"message": "Appointment canceled"}), 200
-    return jsonify({"error": "Appointment not found"}), 404
+    booking_id = request.args.get("booking_id")
+    bookings = schedules.for_customer(customer_id)
+    if booking_id is not None:
+        bookings = [booking for booking in bookings if booking["id"] == booking_id]
+    if not bookings:
+        return jsonify({"error": "Appointment not found"}), 404
+    for booking in bookings:
+        schedules.cancel(booking["id"])
+    return jsonify({"message": "Appointment canceled", "canceled": len(bookings)}), 200
 
 # ✅ View Customer’s Schedule
 @app.route('/scheduling/<customer_id>', methods=['GET'])
 def view_appointment(customer_id):
-    if customer_id in schedules:
-        return jsonify({"appointment": schedules[customer_id]}), 200
+    bookings = schedules.for_customer(customer_id)
+    if bookings:
+        return jsonify({"appointment": bookings[-1], "appointments": bookings}), 200
     return jsonify({"error": "No appointment found"}), 404
 
 # ✅ Run Flask Server for Local Testing or Render Deployment
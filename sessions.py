@@ -0,0 +1,325 @@
+"""Conversation session storage with idle expiry.
+
+A session is the per-sender state the dialogue needs between messages; it expires
+`ttl` seconds after it was last saved, i.e. after the user stops answering. Three
+backends share one interface (get / save / delete / purge_expired / stats):
+
+* MemorySessionStore - in-process LRU with TTL (single worker, the default); can be
+                       saved to a snapshot file on shutdown and reloaded on start
+* SQLiteSessionStore - file-backed, WAL mode, shared by workers on one host
+* RedisSessionStore  - any redis-py compatible client; FakeRedis for tests
+"""
+# === Imports ===
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+# === Session Record ===
+class Session:
+    """Fixed-field conversation state; serialized as a compact JSON array."""
+    __slots__ = ("state", "category", "data", "schedule_date")
+
+    def __init__(self, state, category=None, data=None, schedule_date=None):
+        self.state = state
+        self.category = category
+        self.data = data if data is not None else {}
+        self.schedule_date = schedule_date
+
+    def dumps(self):
+        return json.dumps([self.state, self.category, self.data, self.schedule_date], separators=(",", ":"))
+
+    @classmethod
+    def loads(cls, raw):
+        state, category, data, schedule_date = json.loads(raw)
+        return cls(state, category, data, schedule_date)
+
+    def __repr__(self):
+        return f"Session(state={self.state!r}, category={self.category!r})"
+
+
+# === In-Process LRU + TTL ===
+class MemorySessionStore:
+    def __init__(self, ttl=1800, max_sessions=100000, snapshot_path=None):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.snapshot_path = snapshot_path
+        self._sessions = OrderedDict()  # sender_id -> (last touched, Session), oldest first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        if snapshot_path and os.path.exists(snapshot_path):
+            self.load_snapshot()
+
+    def get(self, sender_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(sender_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            if now - entry[0] > self.ttl:
+                del self._sessions[sender_id]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def save(self, sender_id, session):
+        now = time.monotonic()
+        with self._lock:
+            self._sessions[sender_id] = (now, session)
+            self._sessions.move_to_end(sender_id)
+            self._purge_locked(now)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+
+    def delete(self, sender_id):
+        with self._lock:
+            self._sessions.pop(sender_id, None)
+
+    def _purge_locked(self, now):
+        # Entries are ordered by last save, so expired ones are always at the front
+        removed = 0
+        while self._sessions:
+            touched, _ = next(iter(self._sessions.values()))
+            if now - touched <= self.ttl:
+                break
+            self._sessions.popitem(last=False)
+            removed += 1
+        self.expired += removed
+        return removed
+
+    def purge_expired(self):
+        with self._lock:
+            return self._purge_locked(time.monotonic())
+
+    # === Snapshot ===
+    # One JSON line per session, oldest first: [sender_id, seconds since last save, Session.dumps()]
+    def save_snapshot(self):
+        """Write every live session to snapshot_path (atomically); returns how many were saved."""
+        now = time.monotonic()
+        with self._lock:
+            self._purge_locked(now)
+            entries = [(sender_id, now - touched, session.dumps())
+                       for sender_id, (touched, session) in self._sessions.items()]
+        tmp = f"{self.snapshot_path}.{os.getpid()}.tmp"  # per process: two processes saving never share one
+        with open(tmp, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        logger.info("Saved %d sessions to %s", len(entries), self.snapshot_path)
+        return len(entries)
+
+    def load_snapshot(self):
+        """Restore sessions saved by save_snapshot (keeping their idle time), then remove the file.
+
+        The file is first renamed to one only this process uses, so when two processes start on the same
+        snapshot exactly one of them restores it; the other starts empty.
+        """
+        now = time.monotonic()
+        loaded = 0
+        claimed = f"{self.snapshot_path}.{os.getpid()}.loading"
+        try:
+            os.replace(self.snapshot_path, claimed)
+        except FileNotFoundError:
+            return 0
+        with open(claimed, encoding="utf-8") as f, self._lock:
+            for line in f:
+                sender_id, idle, raw = json.loads(line)
+                if idle <= self.ttl:
+                    self._sessions[sender_id] = (now - idle, Session.loads(raw))
+                    loaded += 1
+        os.remove(claimed)
+        logger.info("Restored %d sessions from %s", loaded, self.snapshot_path)
+        return loaded
+
+    def close(self):
+        """Save a snapshot if configured; returns how many live sessions are lost (none when saved)."""
+        if self.snapshot_path:
+            self.save_snapshot()
+            return 0
+        with self._lock:
+            self._purge_locked(time.monotonic())
+            return len(self._sessions)
+
+    def stats(self):
+        return {"backend": "memory", "size": len(self._sessions), "hits": self.hits, "misses": self.misses,
+                "expired": self.expired, "evicted": self.evicted}
+
+
+# === SQLite (WAL) ===
+class SQLiteSessionStore:
+    def __init__(self, path="sessions.db", ttl=1800, purge_every=1000):
+        self.path = path
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sessions ("
+                           "sender_id TEXT PRIMARY KEY, record TEXT NOT NULL, touched REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_touched ON sessions (touched)")
+        self._lock = threading.Lock()
+        self._saves = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def get(self, sender_id):
+        with self._lock:
+            row = self._conn.execute("SELECT record FROM sessions WHERE sender_id = ? AND touched > ?",
+                                     (sender_id, time.time() - self.ttl)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return Session.loads(row[0])
+
+    def save(self, sender_id, session):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO sessions (sender_id, record, touched) VALUES (?, ?, ?)",
+                               (sender_id, session.dumps(), time.time()))
+            self._saves += 1
+            purge = self._saves % self.purge_every == 0
+        if purge:
+            self.purge_expired()
+
+    def delete(self, sender_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE sender_id = ?", (sender_id,))
+
+    def purge_expired(self):
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM sessions WHERE touched <= ?",
+                                         (time.time() - self.ttl,)).rowcount
+        self.expired += removed
+        return removed
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {"backend": "sqlite", "size": size, "hits": self.hits, "misses": self.misses,
+                "expired": self.expired}
+
+
+# === Redis ===
+class RedisSessionStore:
+    """Stores each session under `prefix + sender_id` with a server-side expiry of `ttl` seconds."""
+
+    def __init__(self, client, ttl=1800, prefix="session:"):
+        self.client = client
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, sender_id):
+        raw = self.client.get(self.prefix + sender_id)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return Session.loads(raw)
+
+    def save(self, sender_id, session):
+        self.client.set(self.prefix + sender_id, session.dumps(), ex=self.ttl)
+
+    def delete(self, sender_id):
+        self.client.delete(self.prefix + sender_id)
+
+    def purge_expired(self):
+        return 0  # Redis expires keys itself
+
+    def close(self):
+        close = getattr(self.client, "close", None)
+        if close:
+            close()
+
+    def stats(self):
+        return {"backend": "redis", "hits": self.hits, "misses": self.misses}
+
+
+class FakeRedis:
+    """Minimal in-memory subset of the redis-py client (get/set/delete) for tests and benchmarks."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key, time.monotonic())
+            return entry[0] if entry else None
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value if isinstance(value, bytes) else str(value).encode("utf-8"),
+                               time.monotonic() + ex if ex else None)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+
+# === Namespaces ===
+class NamespacedSessionStore:
+    """View of a shared store whose keys are prefixed with `namespace:`, one per tenant (see tenants.py)."""
+
+    def __init__(self, store, namespace):
+        self.store = store
+        self.prefix = f"{namespace}:"
+
+    def get(self, sender_id):
+        return self.store.get(self.prefix + sender_id)
+
+    def save(self, sender_id, session):
+        self.store.save(self.prefix + sender_id, session)
+
+    def delete(self, sender_id):
+        self.store.delete(self.prefix + sender_id)
+
+
+# === Factory ===
+def create_session_store(backend=None, ttl=None):
+    """Build the store selected by SESSION_BACKEND (memory, sqlite or redis)."""
+    backend = backend or os.environ.get("SESSION_BACKEND", "memory")
+    ttl = ttl if ttl is not None else int(os.environ.get("SESSION_TTL", 1800))
+    logger.info("Using %s session store (ttl=%ss)", backend, ttl)
+    if backend == "memory":
+        return MemorySessionStore(ttl=ttl, max_sessions=int(os.environ.get("SESSION_MAX", 100000)),
+                                  snapshot_path=os.environ.get("SESSION_SNAPSHOT_PATH", "sessions_snapshot.jsonl"))
+    if backend == "sqlite":
+        return SQLiteSessionStore(os.environ.get("SESSION_DB_PATH", "sessions.db"), ttl=ttl)
+    if backend == "redis":
+        try:
+            import redis
+        except ImportError:
+            raise ValueError("SESSION_BACKEND=redis requires the 'redis' package")
+        return RedisSessionStore(redis.Redis.from_url(os.environ.get("REDIS_URL", "redis://localhost:6379/0")),
+                                 ttl=ttl)
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
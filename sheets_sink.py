@@ -0,0 +1,346 @@
+# === Imports ===
+import atexit
+import json
+import logging
+import os
+import random
+import threading
+import time
+import types
+
+import metrics
+import tracing
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SECONDS = metrics.histogram("sheets_flush_seconds", "Time to flush buffered rows to Google Sheets.",
+                                  ("outcome",))
+
+
+# === Backends ===
+class GspreadBackend:
+    """Writes rows to a gspread Worksheet with a single append_rows call per batch."""
+
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+
+    def append_rows(self, rows):
+        self.worksheet.append_rows(rows)
+
+
+class RefusedError(Exception):
+    """What MemoryBackend raises for rows it refuses: carries an HTTP response status, like gspread's APIError."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.response = types.SimpleNamespace(status_code=status_code)
+
+
+class MemoryBackend:
+    """In-process stand-in for Google Sheets, used by tests and benchmarks."""
+
+    def __init__(self, latency=0.0, fail_times=0, error=None, reject=None):
+        self.rows = []
+        self.calls = 0
+        self.latency = latency
+        self.fail_times = fail_times
+        self.error = error or RuntimeError("RESOURCE_EXHAUSTED: Quota exceeded")
+        self.reject = reject  # reject(row) -> True for rows the sheet refuses outright, failing the whole call
+        self._lock = threading.Lock()
+
+    def append_rows(self, rows):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            if self.fail_times:
+                self.fail_times -= 1
+                raise self.error
+            if self.reject is not None and any(self.reject(row) for row in rows):
+                raise RefusedError("Invalid values in the request")
+            self.rows.extend(rows)
+
+
+def is_retryable(error):
+    """False only when Sheets refused the rows outright (an HTTP 4xx other than 429).
+
+    Quota (429) and server errors are retried, and so is anything without a status:
+    connection failures and timeouts mean the rows never got an answer.
+    """
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return status is None or status == 429 or not 400 <= status < 500
+
+
+# === Write-Behind Sink ===
+class SheetsSink:
+    """Buffers sheet rows and flushes them with append_rows on a size or time limit.
+
+    Rows that cannot be written (no backend, or retries exhausted) are appended to a
+    local JSON-lines spool. Each flush replays the spool first, `max_batch` rows per
+    call, and stops at the first transient failure. A batch Sheets refuses outright
+    (a non-retryable error) is split until the refusing rows are found; those go to a
+    quarantine file (`<spool>.rejected<ext>`) for a person to look at, so one bad
+    row cannot hold the spool, or the sheet, back.
+
+    With waiting=True the backend is still being set up elsewhere (see set_backend):
+    rows are held in memory until it arrives, and only rows beyond `max_held` are spooled.
+
+    close(timeout) bounds the final write: past the deadline no Sheets call or retry
+    is started, and whatever is left goes to the spool instead.
+    """
+
+    def __init__(self, backend, max_batch=50, max_delay=5.0, spool_path="sheets_spool.jsonl",
+                 max_retries=5, backoff=1.0, max_backoff=30.0, waiting=False, max_held=1000):
+        self.backend = backend
+        self.waiting = waiting and backend is None
+        self.max_held = int(max_held)
+        self.max_batch = max(1, int(max_batch))
+        self.max_delay = float(max_delay)
+        self.spool_path = spool_path
+        root, ext = os.path.splitext(spool_path)
+        self.rejected_path = f"{root}.rejected{ext}"
+        self.max_retries = int(max_retries)
+        self.backoff = float(backoff)
+        self.max_backoff = float(max_backoff)
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._spool_lock = threading.Lock()  # close() may spool while the flush thread is replaying
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+        self._closed = False
+        self._deadline = None  # monotonic time set by close(timeout); no Sheets call starts after it
+        self.rows_written = 0
+        self.rows_spooled = 0
+        self.rows_rejected = 0
+        self.flushes = 0
+        self.retries = 0
+        self.last_flush_seconds = 0.0
+        atexit.register(self.close)
+
+    def add(self, row):
+        with self._lock:
+            self._buffer.append(list(row))
+            closed = self._closed
+            if self._thread is None and not closed:
+                self._thread = threading.Thread(target=self._run, name="sheets-sink", daemon=True)
+                self._thread.start()
+            if len(self._buffer) >= self.max_batch and not self.waiting:
+                self._wakeup.notify()
+        if closed:
+            # Late writes during shutdown bypass the buffer so they are not stranded
+            self.flush()
+
+    def pending(self):
+        with self._lock:
+            return len(self._buffer)
+
+    def set_backend(self, backend):
+        """Install the backend once it is ready; held rows go out on the next flush."""
+        with self._lock:
+            self.backend = backend
+            self.waiting = False
+            self._wakeup.notify()
+
+    def stop_waiting(self):
+        """No backend is coming (e.g. credentials not configured); spool rows from now on."""
+        with self._lock:
+            self.waiting = False
+            self._wakeup.notify()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._closed and (self.waiting or len(self._buffer) < self.max_batch):
+                    self._wakeup.wait(self.max_delay)
+                if self._closed:
+                    return
+            self.flush()
+
+    def flush(self):
+        """Write everything buffered (and anything spooled earlier); returns the number of rows written."""
+        with self._flush_lock:
+            return self._flush_locked()
+
+    def _flush_locked(self):
+        with self._lock:
+            holding = self.waiting and not self._closed
+            if holding:
+                # Hold rows for the backend that is on its way; spool only the overflow
+                overflow = max(0, len(self._buffer) - self.max_held)
+                rows, self._buffer = self._buffer[:overflow], self._buffer[overflow:]
+            else:
+                rows, self._buffer = self._buffer, []
+        if holding:
+            self._spool(rows)
+            return 0
+        spooled = self._read_spool()
+        if not spooled and not rows:
+            return 0
+        if self.backend is None:
+            self._spool(rows)
+            return 0
+        started = time.monotonic()
+        written_before = self.rows_written
+        # Its own trace: the rows come from many conversations, none of them waiting on this write
+        with tracing.trace("sheets.flush", rows=len(rows), spooled=len(spooled)) as flush_trace:
+            replayed = 0
+            for start in range(0, len(spooled), self.max_batch):
+                chunk = spooled[start:start + self.max_batch]
+                done = self._write(chunk)
+                replayed += done
+                if done < len(chunk):
+                    break
+            if replayed:
+                self._drop_spooled(replayed)
+                logger.info("Replayed %d spooled rows to Google Sheet", replayed)
+            # New rows wait behind spooled ones that are still failing, keeping the sheet in order
+            done = self._write(rows) if rows and replayed == len(spooled) else 0
+            self._spool(rows[done:])
+            written = self.rows_written - written_before
+            flush_trace.attrs["written"] = written
+        outcome = "written" if replayed == len(spooled) and done == len(rows) else "spooled"
+        FLUSH_SECONDS.observe(time.monotonic() - started, outcome)
+        if written:
+            self.flushes += 1
+            self.last_flush_seconds = time.monotonic() - started
+            logger.info("Flushed %d rows to Google Sheet", written)
+        return written
+
+    def _write(self, rows):
+        """Append `rows`, splitting a batch Sheets refuses to quarantine only the rows it refuses.
+
+        Returns how many leading rows were dealt with (written or quarantined): fewer than
+        len(rows) when a transient failure outlasted the retries.
+        """
+        outcome = self._append_with_retry(rows)
+        if outcome == "written":
+            self.rows_written += len(rows)
+            return len(rows)
+        if outcome == "retry":
+            return 0
+        if len(rows) == 1:
+            self._quarantine(rows)
+            return 1
+        middle = len(rows) // 2
+        done = self._write(rows[:middle])
+        if done < middle:
+            return done
+        return middle + self._write(rows[middle:])
+
+    def _append_with_retry(self, rows):
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            if self._deadline is not None and time.monotonic() >= self._deadline:
+                logger.warning("Shutdown deadline reached, not writing %d rows to Google Sheet", len(rows))
+                return "retry"
+            try:
+                self.backend.append_rows(rows)
+                return "written"
+            except Exception as e:
+                if not is_retryable(e):
+                    logger.error("Google Sheet refused %d rows: %s", len(rows), str(e))
+                    return "rejected"
+                if attempt == self.max_retries:
+                    logger.error("Failed to write %d rows to Google Sheet: %s", len(rows), str(e))
+                    return "retry"
+                self.retries += 1
+                sleep_for = min(delay, self.max_backoff) * (0.5 + random.random() / 2)
+                if self._deadline is not None and time.monotonic() + sleep_for >= self._deadline:
+                    logger.error("Failed to write %d rows to Google Sheet before the shutdown deadline: %s",
+                                 len(rows), str(e))
+                    return "retry"
+                logger.warning("Google Sheets quota/transient error, retrying in %.1fs: %s", sleep_for, str(e))
+                time.sleep(sleep_for)
+                delay *= 2
+        return "retry"
+
+    def _spool(self, rows):
+        if not rows:
+            return
+        with self._spool_lock, open(self.spool_path, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.rows_spooled += len(rows)
+        logger.warning("Spooled %d rows to %s", len(rows), self.spool_path)
+
+    def _quarantine(self, rows):
+        with open(self.rejected_path, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.rows_rejected += len(rows)
+        logger.error("Quarantined %d rows the Google Sheet refused to %s", len(rows), self.rejected_path)
+
+    def _read_spool(self):
+        if self.backend is None:
+            return []
+        with self._spool_lock:
+            if not os.path.exists(self.spool_path):
+                return []
+            with open(self.spool_path, encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()]
+
+    def _drop_spooled(self, count):
+        """Remove the first `count` spooled rows (replayed); rows spooled since they were read stay."""
+        with self._spool_lock:
+            with open(self.spool_path, encoding="utf-8") as f:
+                rest = [line for line in f if line.strip()][count:]
+            if not rest:
+                os.remove(self.spool_path)
+                return
+            tmp_path = self.spool_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(rest)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.spool_path)
+
+    def close(self, timeout=None):
+        """Stop the flush thread and write out whatever is still buffered, within `timeout` seconds if given.
+
+        Returns how many rows went to the spool instead of the sheet while closing.
+        """
+        spooled_before = self.rows_spooled
+        with self._lock:
+            if self._closed:
+                return 0
+            self._closed = True
+            if timeout is not None:
+                self._deadline = time.monotonic() + timeout
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=self._remaining(self.max_delay + 1))
+        if self._flush_lock.acquire(timeout=self._remaining(-1)):
+            try:
+                self._flush_locked()
+            finally:
+                self._flush_lock.release()
+        else:
+            # The flush thread is still inside a Sheets call: keep the rest on disk rather than wait for it
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            self._spool(rows)
+        return self.rows_spooled - spooled_before
+
+    def _remaining(self, limit):
+        """Seconds to wait: `limit` (-1 means forever), cut short by the close deadline when there is one."""
+        if self._deadline is None:
+            return limit
+        remaining = max(0.0, self._deadline - time.monotonic())
+        return remaining if limit < 0 else min(limit, remaining)
+
+    def stats(self):
+        return {
+            "pending": self.pending(),
+            "waiting_for_backend": self.waiting,
+            "rows_written": self.rows_written,
+            "rows_spooled": self.rows_spooled,
+            "rows_rejected": self.rows_rejected,
+            "flushes": self.flushes,
+            "retries": self.retries,
+            "last_flush_ms": round(self.last_flush_seconds * 1000, 3),
+        }
@@ -0,0 +1,138 @@
+"""Admission control for the webhook and a graceful, deadline-bound shutdown.
+
+AdmissionGate bounds the webhook deliveries being handled at once. Past the
+limit, a delivery is refused on the spot (the webhook answers 503 and Meta
+redelivers it later), so a spike cannot pile up threads blocked on Graph or
+Sheets until memory runs out. Closing the gate refuses everything, which is
+how shutdown stops accepting work.
+
+Shutdown runs its steps in the order they were added (stop accepting, drain
+the event queue, send queued replies, flush sheet rows, persist sessions), all
+against one deadline: each step is passed the seconds left. A step returns
+how many items it had to give up on (or a dict with "dropped" and counts of its
+own, such as rows spooled to disk instead of written), and the run ends with a
+report of what each step dropped, which is logged and returned. It runs once; later calls
+return the same report.
+"""
+# === Imports ===
+import logging
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# === Admission Control ===
+class AdmissionGate:
+    def __init__(self, limit=0):
+        self.limit = int(limit)  # 0: unlimited
+        self.in_flight = 0
+        self.peak = 0
+        self.admitted = 0
+        self.shed = 0
+        self.closed = False
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+    def try_enter(self):
+        """Take a slot; False (count it as shed) when the gate is full or closed."""
+        with self._lock:
+            if self.closed or (self.limit and self.in_flight >= self.limit):
+                self.shed += 1
+                return False
+            self.in_flight += 1
+            self.admitted += 1
+            if self.in_flight > self.peak:
+                self.peak = self.in_flight
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+            if not self.in_flight:
+                self._idle.notify_all()
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+
+    def wait_idle(self, timeout=None):
+        """Block until nothing is in flight; returns how many still are when `timeout` runs out."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self.in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._idle.wait(remaining)
+            return self.in_flight
+
+    def stats(self):
+        with self._lock:
+            return {"limit": self.limit, "in_flight": self.in_flight, "peak": self.peak, "admitted": self.admitted,
+                    "shed": self.shed, "closed": self.closed}
+
+
+# === Graceful Shutdown ===
+class Shutdown:
+    def __init__(self, deadline=10.0):
+        self.deadline = float(deadline)
+        self._steps = []
+        self._report = {}
+        self._lock = threading.Lock()
+        self.started = None
+        self.finished = False
+
+    def add(self, name, step):
+        """step(seconds left) -> number of items dropped (None counts as 0), or a dict of counts with "dropped";
+        runs in the order added."""
+        self._steps.append((name, step))
+
+    def record(self, name, dropped, seconds=0.0):
+        """Report a step the caller ran itself (e.g. an event loop draining its own tasks)."""
+        if self.started is None:
+            self.started = time.monotonic() - seconds
+        self._report[name] = {"dropped": int(dropped), "seconds": round(seconds, 3), "error": None}
+
+    @property
+    def draining(self):
+        return self.started is not None
+
+    def run(self):
+        """Run every step (once) within the deadline and return the report: {step: {dropped, seconds, error}}."""
+        with self._lock:
+            if self.finished:
+                return self._report
+            if self.started is None:
+                self.started = time.monotonic()
+            deadline = self.started + self.deadline
+            for name, step in self._steps:
+                started = time.monotonic()
+                try:
+                    result, error = step(max(0.0, deadline - started)) or 0, None
+                except Exception as e:
+                    result, error = 0, f"{type(e).__name__}: {e}"
+                    logger.exception("Shutdown: %s failed", name)
+                counts = dict(result) if isinstance(result, dict) else {"dropped": result}
+                self._report[name] = dict(counts, dropped=counts.get("dropped") or 0,
+                                          seconds=round(time.monotonic() - started, 3), error=error)
+            self.finished = True
+        dropped = {name: result["dropped"] for name, result in self._report.items() if result["dropped"]}
+        failed = [name for name, result in self._report.items() if result["error"]]
+        if dropped or failed:
+            logger.warning("Shutdown finished in %.2fs, dropped %s, failed steps %s",
+                           time.monotonic() - self.started, dropped or "nothing", failed or "none")
+        else:
+            logger.info("Shutdown finished in %.2fs, nothing dropped", time.monotonic() - self.started)
+        return self._report
+
+    def install(self, signals=(signal.SIGTERM,)):
+        """Run on these signals, then exit. Only for servers that leave signal handling to the app."""
+        def handle(signum, frame):
+            logger.info("Received %s, shutting down (deadline %.0fs)", signal.Signals(signum).name, self.deadline)
+            self.run()
+            raise SystemExit(0)
+
+        for signum in signals:
+            signal.signal(signum, handle)
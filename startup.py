@@ -0,0 +1,100 @@
+"""Background initialization of slow external clients, with readiness tracking.
+
+Each step (open the Google Sheet, validate the Page token, ...) runs on its
+own daemon thread so importing the app and serving the first request never
+wait on Google or Graph. A step that raises is retried with exponential
+backoff; a step that raises Disabled (credentials not configured) is not.
+
+The service is ready once every step has finished its first attempt. A step
+that is still retrying after that is reported as failed but does not hold
+readiness back: the callers already degrade (Sheets rows are held and then
+spooled), and an instance that never turns ready would just be restarted.
+"""
+# === Imports ===
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Disabled(Exception):
+    """A step cannot run in this configuration; it is skipped rather than retried."""
+
+
+class _Step:
+    __slots__ = ("name", "init", "state", "error", "attempts", "seconds")
+
+    def __init__(self, name, init):
+        self.name = name
+        self.init = init
+        self.state = "pending"
+        self.error = None
+        self.attempts = 0
+        self.seconds = None
+
+
+class Startup:
+    def __init__(self, retry_interval=5.0, max_retry_interval=300.0):
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.started = time.monotonic()
+        self._steps = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def add(self, name, init):
+        """Run init() in the background now; its return value is ignored."""
+        step = _Step(name, init)
+        with self._lock:
+            self._steps[name] = step
+        threading.Thread(target=self._run, args=(step,), name=f"startup-{name}", daemon=True).start()
+
+    def _run(self, step):
+        delay = self.retry_interval
+        while True:
+            try:
+                step.init()
+            except Disabled as e:
+                self._finish(step, "disabled", str(e))
+                logger.warning("Startup: %s disabled: %s", step.name, str(e))
+                return
+            except Exception as e:
+                self._finish(step, "failed", f"{type(e).__name__}: {e}")
+                logger.error("Startup: %s failed (attempt %d), retrying in %.0fs: %s",
+                             step.name, step.attempts, delay, str(e))
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry_interval)
+            else:
+                self._finish(step, "ready", None)
+                logger.info("Startup: %s ready after %.2fs", step.name, step.seconds)
+                return
+
+    def _finish(self, step, state, error):
+        with self._lock:
+            step.attempts += 1
+            step.state = state
+            step.error = error
+            step.seconds = time.monotonic() - self.started
+            self._changed.notify_all()
+
+    def ready(self):
+        with self._lock:
+            return all(step.state != "pending" for step in self._steps.values())
+
+    def wait(self, timeout=None):
+        """Block until ready(); False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while any(step.state == "pending" for step in self._steps.values()):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {step.name: {"state": step.state, "attempts": step.attempts, "error": step.error,
+                                "seconds": round(step.seconds, 3) if step.seconds is not None else None}
+                    for step in self._steps.values()}
@@ -0,0 +1,116 @@
+"""Tenants: one bot process serving many Facebook Pages.
+
+Every webhook entry carries the id of the page it was sent to (entry.id).
+TenantRegistry maps that id to a Tenant holding the page's access token,
+business variables, spreadsheet and session namespace. Tenants are read from a
+JSON file (TENANTS_FILE), a list of objects such as:
+
+    [{"page_id": "1234", "page_token_env": "PAGE_1234_TOKEN", "spreadsheet_id": "1AbC...",
+      "variables": {"business_name": "Acme Bikes", "promo_code": "ACME10"}}]
+
+page_token can be given inline or, better, named by page_token_env. Variables
+left out fall back to the deployment's own (the BUSINESS_* environment). The
+deployment's own page is the default tenant; with no TENANTS_FILE it is the only
+one and every entry is routed to it, as before.
+
+RouteCache compiles the dialogue tables lazily, one per distinct set of
+variables, so tenants with the same values share a table.
+"""
+# === Imports ===
+import json
+import logging
+import os
+import threading
+
+import dialogue
+from sessions import NamespacedSessionStore
+
+logger = logging.getLogger(__name__)
+
+
+class Tenant:
+    __slots__ = ("page_id", "page_token", "variables", "spreadsheet_id", "sessions", "variables_key")
+
+    def __init__(self, page_id, page_token, variables, spreadsheet_id, sessions):
+        self.page_id = page_id
+        self.page_token = page_token
+        self.variables = variables
+        self.spreadsheet_id = spreadsheet_id
+        self.sessions = sessions
+        self.variables_key = tuple(sorted(variables.items()))
+
+    def __repr__(self):
+        return f"Tenant(page_id={self.page_id!r})"
+
+
+class TenantRegistry:
+    def __init__(self, default, tenants=()):
+        self.default = default
+        self._tenants = {tenant.page_id: tenant for tenant in tenants}
+
+    def get(self, page_id):
+        """The tenant for a webhook entry's page id; None for pages this deployment does not serve."""
+        if not self._tenants:
+            return self.default
+        tenant = self._tenants.get(page_id)
+        if tenant is None and page_id == self.default.page_id:
+            return self.default
+        return tenant
+
+    def __iter__(self):
+        if self.default.page_id not in self._tenants:
+            yield self.default
+        yield from self._tenants.values()
+
+    def __len__(self):
+        return len(self._tenants) + (self.default.page_id not in self._tenants)
+
+    def stats(self):
+        return {"tenants": len(self)}
+
+
+def load_tenants(path, default, sessions):
+    """Build the registry from the JSON file at `path` (empty or missing path: single tenant)."""
+    if not path:
+        return TenantRegistry(default)
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    tenants = []
+    for entry in entries:
+        page_id = str(entry["page_id"])
+        if page_id == default.page_id:
+            # The deployment's own page keeps its un-prefixed sessions
+            tenant_sessions = default.sessions
+        else:
+            tenant_sessions = NamespacedSessionStore(sessions, page_id)
+        token = entry.get("page_token") or os.environ.get(entry.get("page_token_env", ""), "")
+        if not token:
+            logger.warning("Tenant %s has no page token; its replies will not be sent", page_id)
+        variables = dict(default.variables, **entry.get("variables", {}))
+        tenants.append(Tenant(page_id, token, variables, entry.get("spreadsheet_id") or default.spreadsheet_id,
+                              tenant_sessions))
+    logger.info("Loaded %d tenants from %s", len(tenants), path)
+    return TenantRegistry(default, tenants)
+
+
+class RouteCache:
+    """Compiled DialogueTables keyed by tenant variables; each server keeps one for its own handlers."""
+
+    def __init__(self, handlers, prebuild=None):
+        self.handlers = handlers
+        self.prebuild = prebuild
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def get(self, tenant):
+        table = self._tables.get(tenant.variables_key)
+        if table is None:
+            with self._lock:
+                table = self._tables.get(tenant.variables_key)
+                if table is None:
+                    table = self._tables[tenant.variables_key] = dialogue.compile_routes(
+                        tenant.variables, self.handlers, self.prebuild)
+        return table
+
+    def __len__(self):
+        return len(self._tables)
@@ -0,0 +1,231 @@
+"""Lightweight per-conversation latency tracing.
+
+A trace is one unit of work, such as a webhook delivery, a queued event or a
+Sheets flush, identified by a trace id. trace() starts one and keeps it in a
+context variable. Code running under it (the same thread, asyncio tasks and
+asyncio.to_thread calls) adds timed spans with span(): every outbound HTTP
+call, every dialogue dispatch, and so on. With no trace active, span() is a
+shared no-op.
+
+The trace id travels to the inventory and scheduling services in the
+X-Trace-Id header (see headers(); HttpClient adds it). Those services adopt it
+through instrument_flask(), so their logs and response headers carry the same
+id. A trace continued elsewhere (e.g. by a queue worker) passes the id on to
+the trace() it starts there.
+
+Finished traces slower than the slow threshold are kept, newest last, in a
+ring buffer of `capacity` entries (slow_traces(); the bot serves it on
+/traces). Faster ones only update the counters in stats(). Module-level state,
+like metrics.py: one tracer per process, set up with configure().
+"""
+# === Imports ===
+import contextvars
+import datetime
+import logging
+import re
+import threading
+import time
+import uuid
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+TRACE_HEADER = "X-Trace-Id"
+MAX_SPANS = 200  # per trace; a runaway loop cannot grow one without bound
+_TRACE_ID_RE = re.compile(r"[0-9A-Za-z-]{1,64}")  # ids from a header are used only if they look like ids
+
+_current = contextvars.ContextVar("trace", default=None)
+_lock = threading.Lock()
+_config = {"enabled": True, "slow_seconds": 0.5}
+_slow = deque(maxlen=200)
+_counts = {"traces": 0, "slow": 0, "spans_dropped": 0}
+_max_seconds = 0.0
+
+
+def configure(enabled=True, slow_ms=500.0, capacity=200):
+    global _slow
+    _config["enabled"] = enabled
+    _config["slow_seconds"] = slow_ms / 1000.0
+    with _lock:
+        _slow = deque(_slow, maxlen=capacity)
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+# === Traces ===
+class Trace:
+    __slots__ = ("trace_id", "name", "attrs", "started", "started_at", "spans", "_token")
+
+    def __init__(self, name, trace_id=None, attrs=None):
+        self.trace_id = trace_id if trace_id and _TRACE_ID_RE.fullmatch(trace_id) else new_trace_id()
+        self.name = name
+        self.attrs = attrs or {}
+        self.spans = []  # (name, start offset, duration, attrs), in the order they finished
+        self._token = None
+
+    def __enter__(self):
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        _finish(self, time.perf_counter() - self.started)
+        return False
+
+    def as_dict(self, duration):
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": datetime.datetime.fromtimestamp(self.started_at).isoformat(),
+            "duration_ms": round(duration * 1000, 3),
+            "attrs": self.attrs,
+            "spans": [{"name": name, "offset_ms": round(offset * 1000, 3), "duration_ms": round(seconds * 1000, 3),
+                       "attrs": attrs} for name, offset, seconds, attrs in self.spans],
+        }
+
+
+class _NullContext:
+    """Stands in for a trace or span when tracing is off; shared, so a no-op costs no allocation."""
+    trace_id = None
+
+    @property
+    def attrs(self):
+        return {}  # writes go nowhere
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL = _NullContext()
+
+
+def trace(name, trace_id=None, **attrs):
+    """Context manager for a new trace (continuing `trace_id` if given); no-op while tracing is disabled."""
+    if not _config["enabled"]:
+        return _NULL
+    return Trace(name, trace_id, attrs)
+
+
+def _finish(current, duration):
+    global _max_seconds
+    slow = duration >= _config["slow_seconds"]
+    with _lock:
+        _counts["traces"] += 1
+        if duration > _max_seconds:
+            _max_seconds = duration
+        if slow:
+            _counts["slow"] += 1
+            _slow.append(current.as_dict(duration))
+    if slow:
+        logger.info("Slow trace %s %s: %.1fms", current.name, current.trace_id, duration * 1000)
+
+
+def current_id():
+    current = _current.get()
+    return current.trace_id if current is not None else None
+
+
+def headers(base=None):
+    """`base` headers plus X-Trace-Id when a trace is active (`base` itself, unchanged, otherwise)."""
+    current = _current.get()
+    if current is None:
+        return base
+    merged = dict(base) if base else {}
+    merged[TRACE_HEADER] = current.trace_id
+    return merged
+
+
+# === Spans ===
+class Span:
+    __slots__ = ("trace", "name", "attrs", "started")
+
+    def __init__(self, current, name, attrs):
+        self.trace = current
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ended = time.perf_counter()
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        spans = self.trace.spans
+        if len(spans) < MAX_SPANS:
+            spans.append((self.name, self.started - self.trace.started, ended - self.started, self.attrs))
+        else:
+            with _lock:
+                _counts["spans_dropped"] += 1
+        return False
+
+
+def span(name, **attrs):
+    """Context manager timing `name` within the current trace; the no-op context when there is none.
+
+    The entered object's `attrs` dict may be filled in before the span ends (e.g. a response status).
+    """
+    current = _current.get()
+    if current is None:
+        return _NULL
+    return Span(current, name, attrs)
+
+
+# === Reading ===
+def slow_traces(limit=50, min_ms=0.0, trace_id=None):
+    """Recorded slow traces, newest first, optionally only those at least `min_ms` long or with `trace_id`."""
+    with _lock:
+        traces = list(_slow)
+    traces.reverse()
+    if trace_id:
+        # Also the batched deliveries that carried a reply for it (see outbound.py)
+        traces = [t for t in traces if t["trace_id"] == trace_id or trace_id in t["attrs"].get("traces", ())]
+    if min_ms:
+        traces = [t for t in traces if t["duration_ms"] >= min_ms]
+    return traces[:limit]
+
+
+def stats():
+    with _lock:
+        return dict(_counts, enabled=_config["enabled"], slow_ms=_config["slow_seconds"] * 1000,
+                    buffered=len(_slow), capacity=_slow.maxlen, max_ms=round(_max_seconds * 1000, 3))
+
+
+# === Flask Services ===
+def instrument_flask(app, service):
+    """Trace requests to `app` that carry an X-Trace-Id, under that id, and echo it back.
+
+    Requests without one (health checks, the inventory feed's long polls) are not traced.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _start_trace():
+        trace_id = request.headers.get(TRACE_HEADER)
+        if trace_id:
+            g.trace = trace(f"{service} {request.method} {request.path}", trace_id).__enter__()
+
+    @app.teardown_request
+    def _end_trace(error=None):
+        current = g.pop("trace", None)
+        if current is not None:
+            current.__exit__(type(error) if error is not None else None, error, None)
+
+    @app.after_request
+    def _echo_trace_id(response):
+        current = g.get("trace")
+        if current is not None and current.trace_id is not None:
+            response.headers[TRACE_HEADER] = current.trace_id
+        return response
+
+    return app